@@ -0,0 +1,129 @@
+"""Compare sequential, threaded and asynchronous API requests.
+
+Starts a local HTTPS server with a self-signed certificate (generated by `openssl`) which answers
+every request after a fixed latency, then sends the same number of requests through
+`Connection` sequentially, through `Connection` from a thread pool, and through
+`AsyncConnection` concurrently.
+
+    python3 benchmarks/async_requests.py --requests 100 --latency-ms 50 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import http.server
+import pathlib
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from insights_nest.api.async_connection import AsyncConnection
+from insights_nest.api.connection import Connection
+
+BODY = b'{"total": 0, "count": 0, "page": 1, "per_page": 50, "results": []}'
+
+
+def create_certificate(directory: pathlib.Path) -> tuple[pathlib.Path, pathlib.Path]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            "-keyout", str(key), "-out", str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return cert, key
+
+
+def start_server(cert: pathlib.Path, key: pathlib.Path, latency: float) -> http.server.HTTPServer:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("localhost", 0), Handler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client_context(cert: pathlib.Path) -> ssl.SSLContext:
+    return ssl.create_default_context(cafile=str(cert))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50, help="server think time")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = create_certificate(pathlib.Path(directory))
+        server = start_server(cert, key, args.latency_ms / 1000)
+        port: int = server.server_address[1]
+
+        class BenchConnection(Connection):
+            HOST = "localhost"
+            PORT = port
+            PATH = "/api/inventory/v1"
+            CACHE = False
+
+            def _create_tls_context(self) -> ssl.SSLContext:
+                return client_context(cert)
+
+        class AsyncBenchConnection(AsyncConnection):
+            HOST = "localhost"
+            PORT = port
+            PATH = "/api/inventory/v1"
+            CACHE = False
+
+            def _create_tls_context(self) -> ssl.SSLContext:
+                return client_context(cert)
+
+        def sequential() -> None:
+            conn = BenchConnection()
+            for _ in range(args.requests):
+                conn.get("/hosts")
+
+        def threaded() -> None:
+            conn = BenchConnection()
+            with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+                list(pool.map(lambda _: conn.get("/hosts"), range(args.requests)))
+
+        async def concurrent_requests() -> None:
+            async with AsyncBenchConnection(concurrency=args.concurrency) as conn:
+                await asyncio.gather(*(conn.get("/hosts") for _ in range(args.requests)))
+
+        print(f"{'client':<12} {'seconds':>8} {'requests/s':>11}")
+        for name, run in (
+            ("sequential", sequential),
+            ("threads", threaded),
+            ("asyncio", lambda: asyncio.run(concurrent_requests())),
+        ):
+            now: float = time.perf_counter()
+            run()
+            seconds: float = time.perf_counter() - now
+            print(f"{name:<12} {seconds:>8.2f} {args.requests / seconds:>11.1f}")
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
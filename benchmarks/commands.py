@@ -0,0 +1,225 @@
+"""Measure end-to-end latency and resource usage of the client commands.
+
+Builds a stub insights-core egg (a zip with `insights.package_info` and an
+`insights.client.phase.v2` printing canned JSON), starts the local stand-in API server and runs
+every command repeatedly in a fresh process, reporting wall time (p50/p95), CPU time, peak RSS,
+bytes on the wire and, if `strace` is installed, the number of syscalls.
+
+    PYTHONPATH=. python3 benchmarks/commands.py --repeat 20 --latency-ms 30 --output results.json
+    PYTHONPATH=. python3 benchmarks/commands.py --compare results.json
+
+The egg is not updated during the runs (`--no-egg-update`).
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import zipfile
+from typing import Optional
+
+from insights_nest._devel import server
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+COMMANDS: dict[str, list[str]] = {
+    "status": ["status"],
+    "checkin": ["checkin"],
+    "scan-advisor": ["scan-advisor"],
+    "scan-compliance": ["scan-compliance"],
+    "version": ["version"],
+    "identity show": ["identity", "show"],
+}
+
+PHASE = textwrap.dedent(
+    """\
+    import io
+    import json
+    import os
+    import sys
+    import tarfile
+    import tempfile
+
+    MACHINE_ID = {machine_id!r}
+
+
+    def payload():
+        fd, path = tempfile.mkstemp(suffix=".tar.gz")
+        content = json.dumps({{"insights_id": MACHINE_ID}}).encode()
+        info = tarfile.TarInfo("insights-archive/facts.json")
+        info.size = len(content)
+        with os.fdopen(fd, "wb") as f, tarfile.open(fileobj=f, mode="w:gz") as archive:
+            archive.addfile(info, io.BytesIO(content))
+        return path
+
+
+    command = sys.argv[1]
+    if command == "help":
+        result = {{"commands": ["checkin", "advisor", "compliance"]}}
+    elif command == "checkin":
+        result = {{"insights_id": MACHINE_ID, "fqdn": "benchmark.example.org"}}
+    else:
+        content_type = "application/vnd.redhat.advisor.collection+tgz"
+        result = {{"payload": payload(), "content_type": content_type}}
+    print(json.dumps(result))
+    """
+)
+
+
+def build_egg(path: pathlib.Path, machine_id: str) -> None:
+    """Build the stub egg."""
+    with zipfile.ZipFile(path, "w") as egg:
+        egg.writestr(
+            "insights/__init__.py",
+            "package_info = {'VERSION': '3.0.0', 'RELEASE': '1', 'COMMIT': '0' * 40}\n",
+        )
+        egg.writestr("insights/client/__init__.py", "")
+        egg.writestr("insights/client/phase/__init__.py", "")
+        egg.writestr("insights/client/phase/v2.py", PHASE.format(machine_id=machine_id))
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def wire_bytes(textfile: pathlib.Path) -> tuple[float, float]:
+    """Sum the sent and received HTTP bytes of the metrics textfile."""
+    sent, received = 0.0, 0.0
+    if not textfile.exists():
+        return sent, received
+    for line in textfile.read_text().splitlines():
+        if line.startswith("insights_nest_http_sent_bytes_total"):
+            sent += float(line.rsplit(" ", 1)[1])
+        elif line.startswith("insights_nest_http_received_bytes_total"):
+            received += float(line.rsplit(" ", 1)[1])
+    return sent, received
+
+
+def run_once(argv: list[str], environment: dict[str, str]) -> dict[str, float]:
+    """Run the command in a new process, measuring it with `wait4(2)`."""
+    command = [sys.executable, str(ROOT / "insights_nest" / "__init__.py"), "--no-egg-update"]
+    # Not a pipe: nobody reads it while waiting, so a long output would block the command
+    with tempfile.TemporaryFile() as output:
+        now: float = time.perf_counter()
+        process = subprocess.Popen(
+            command + argv, env=environment, stdout=subprocess.DEVNULL, stderr=output
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        wall: float = time.perf_counter() - now
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        stderr: bytes = output.read()
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited with {process.returncode}: {stderr!r}")
+    return {"wall": wall, "cpu": usage.ru_utime + usage.ru_stime, "rss": usage.ru_maxrss}
+
+
+def count_syscalls(argv: list[str], environment: dict[str, str]) -> Optional[int]:
+    """Count syscalls of the command and its subprocesses with `strace -c`."""
+    strace: Optional[str] = shutil.which("strace")
+    if strace is None:
+        return None
+    with tempfile.NamedTemporaryFile("r") as summary:
+        subprocess.run(
+            [strace, "-f", "-c", "-o", summary.name, sys.executable]
+            + [str(ROOT / "insights_nest" / "__init__.py"), "--no-egg-update", *argv],
+            env=environment,
+            capture_output=True,
+        )
+        match = re.search(r"^-+.*\n\s*[\d.]+\s+[\d.]+\s+\d+\s+(\d+)", summary.read(), re.M)
+    return int(match.group(1)) if match else None
+
+
+def benchmark(argv: list[str], environment: dict[str, str], repeat: int, textfile: pathlib.Path):
+    sent, received = wire_bytes(textfile)
+    runs: list[dict[str, float]] = [run_once(argv, environment) for _ in range(repeat)]
+    sent_after, received_after = wire_bytes(textfile)
+
+    walls: list[float] = [run["wall"] for run in runs]
+    cpus: list[float] = [run["cpu"] for run in runs]
+    return {
+        "argv": argv,
+        "runs": repeat,
+        "wall_p50": percentile(walls, 0.5),
+        "wall_p95": percentile(walls, 0.95),
+        "cpu_p50": percentile(cpus, 0.5),
+        "max_rss_kib": max(run["rss"] for run in runs),
+        "sent_bytes": (sent_after - sent) / repeat,
+        "received_bytes": (received_after - received) / repeat,
+        "syscalls": count_syscalls(argv, environment),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0, help="server latency")
+    parser.add_argument("--command", action="append", choices=COMMANDS, help="default: all")
+    parser.add_argument("--output", type=pathlib.Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=pathlib.Path, help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = pathlib.Path(directory)
+        api, environment = server.start(
+            root, behavior=server.Behavior(latency=args.latency_ms / 1000)
+        )
+        machine_id: str = (root / "metadata" / "machine-id").read_text().strip()
+        build_egg(root / "stub.egg", machine_id)
+
+        textfile: pathlib.Path = root / "metrics.prom"
+        (root / "insights-nest.conf.d" / "benchmark.conf").write_text(
+            f"[metrics]\ntextfile = {textfile}\n\n[logging]\ninsights_nest = WARNING\n"
+            # Time the upload on every run, not the check-in of identical archives
+            "\n[network]\nupload_skip_age = 0\n"
+        )
+        environment = {
+            **os.environ,
+            **environment,
+            "EGG": str(root / "stub.egg"),
+            "PYTHONPATH": str(ROOT),
+        }
+
+        results: dict = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_ms": args.latency_ms,
+            "commands": {},
+        }
+        for name in args.command or COMMANDS:
+            results["commands"][name] = benchmark(
+                COMMANDS[name], environment, args.repeat, textfile
+            )
+        api.shutdown()
+
+    previous: dict = json.loads(args.compare.read_text())["commands"] if args.compare else {}
+    print(
+        f"{'command':<16} {'p50 ms':>8} {'p95 ms':>8} {'cpu ms':>8} {'rss MiB':>8} "
+        f"{'sent B':>8} {'recv B':>8} {'syscalls':>9} {'vs prev':>8}"
+    )
+    for name, result in results["commands"].items():
+        change: str = ""
+        if name in previous:
+            change = f"{(result['wall_p50'] / previous[name]['wall_p50'] - 1) * 100:+.1f}%"
+        print(
+            f"{name:<16} {result['wall_p50'] * 1000:>8.1f} {result['wall_p95'] * 1000:>8.1f} "
+            f"{result['cpu_p50'] * 1000:>8.1f} {result['max_rss_kib'] / 1024:>8.1f} "
+            f"{result['sent_bytes']:>8.0f} {result['received_bytes']:>8.0f} "
+            f"{result['syscalls'] if result['syscalls'] is not None else '-':>9} {change:>8}"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
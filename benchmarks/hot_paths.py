@@ -0,0 +1,312 @@
+"""Microbenchmarks of the pure-Python code on the path of every run.
+
+Each case is measured with synthetic inputs of realistic and extreme sizes: the time per call
+(the minimum and the median of several repeats, with the garbage collector disabled) and the
+memory allocated by one call (the peak and the retained size reported by `tracemalloc`).
+
+Times depend on the machine, so they are also stored relative to a fixed pure-Python
+calibration loop. Comparisons with a baseline use the relative times, and fail with exit code 1
+if any case got slower or allocates more than the tolerances allow.
+
+    PYTHONPATH=. python3 benchmarks/hot_paths.py --output baseline.json
+    PYTHONPATH=. python3 benchmarks/hot_paths.py --baseline baseline.json
+    PYTHONPATH=. python3 benchmarks/hot_paths.py --extreme --filter form.build
+
+`--extreme` adds the largest inputs (e.g. a 500 MB multipart body, 10k hosts), which need
+several GB of memory.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import uuid
+from typing import Callable, ContextManager, Iterator
+
+from insights_nest import config
+from insights_nest._core import egg
+from insights_nest.api import dto
+from insights_nest.api.connection import Response
+from insights_nest.api.form import Form
+from insights_nest.api.inventory import Host, Hosts
+
+KiB, MiB = 1024, 1024 * 1024
+
+MEMORY_NOISE: int = 64 * KiB
+"""Allocation differences below this size are never reported as regressions."""
+
+
+def _host() -> dict:
+    insights_id = str(uuid.uuid4())
+    return {
+        "insights_id": insights_id,
+        "subscription_manager_id": str(uuid.uuid4()),
+        "satellite_id": None,
+        "bios_uuid": str(uuid.uuid4()),
+        "ip_addresses": ["192.0.2.10", "2001:db8::10"],
+        "fqdn": f"{insights_id[:8]}.example.org",
+        "mac_addresses": ["52:54:00:12:34:56"],
+        "provider_id": None,
+        "provider_type": None,
+        "id": str(uuid.uuid4()),
+        "account": 1,
+        "org_id": 1,
+        "display_name": f"{insights_id[:8]}.example.org",
+        "ansible_host": None,
+        "facts": [{"namespace": "rhsm", "facts": {"ARCHITECTURE": "x86_64"}}],
+        "reporter": "puptoo",
+        "per_reporter_staleness": {"puptoo": {"stale_timestamp": "2026-01-01T00:00:00Z"}},
+        "stale_timestamp": "2026-01-01T00:00:00Z",
+        "stale_warning_timestamp": "2026-01-08T00:00:00Z",
+        "culled_timestamp": "2026-01-15T00:00:00Z",
+        "created": "2025-01-01T00:00:00Z",
+        "updated": "2025-12-31T00:00:00Z",
+        "groups": [],
+        "tags": [{"namespace": "insights-client", "key": "env", "value": "prod"}],
+        "system_profile": {"arch": "x86_64", "os_release": "9.4"},
+        "field_of_a_newer_api": True,
+    }
+
+
+def _hosts_body(count: int) -> bytes:
+    return json.dumps(
+        {
+            "total": count,
+            "count": count,
+            "page": 1,
+            "per_page": count,
+            "results": [_host() for _ in range(count)],
+        }
+    ).encode("utf-8")
+
+
+@contextlib.contextmanager
+def form_build(size: int) -> Iterator[Callable]:
+    form = Form()
+    form.add_field(field="metadata", content=b'{"display_name": "example.org"}')
+    form.add_file(
+        field="file",
+        filename="insights-archive.tar.gz",
+        content_type="application/vnd.redhat.advisor.collection+tgz",
+        content=os.urandom(size),
+    )
+    yield form.build
+
+
+@contextlib.contextmanager
+def dto_from_json() -> Iterator[Callable]:
+    host: dict = _host()
+    yield lambda: dto.from_json(Host, host)
+
+
+@contextlib.contextmanager
+def hosts_from_json(count: int) -> Iterator[Callable]:
+    data: dict = json.loads(_hosts_body(count))
+    # `Hosts.from_json` replaces the results in the dictionary it gets
+    yield lambda: Hosts.from_json({**data})
+
+
+@contextlib.contextmanager
+def response_json(count: int) -> Iterator[Callable]:
+    response = Response(
+        status=200,
+        headers={"Date": "Thu, 01 Jan 2026 00:00:00 GMT", "Content-Type": "application/json"},
+        data=_hosts_body(count),
+    )
+    yield lambda: response.is_json() and response.json()
+
+
+@contextlib.contextmanager
+def _configuration(files: int) -> Iterator[None]:
+    """Point the configuration module to a directory with the number of drop-in files."""
+    names = (
+        "CONFIGURATION_FILE_PATH",
+        "CONFIGURATION_DIRECTORY_PATH",
+        "RHSM_CONFIGURATION_FILE_PATH",
+        "SNAPSHOT_PATH",
+    )
+    original: dict[str, pathlib.Path] = {name: getattr(config, name) for name in names}
+    with tempfile.TemporaryDirectory() as directory:
+        root = pathlib.Path(directory)
+        (root / "insights-nest.conf.d").mkdir()
+        (root / "cache").mkdir(mode=0o700)
+        (root / "insights-nest.conf").write_text("[network]\nretries = 3\n")
+        (root / "rhsm.conf").write_text("[server]\nhostname = subscription.example.org\n")
+        for i in range(files):
+            (root / "insights-nest.conf.d" / f"{i:04}.conf").write_text(
+                f"# Drop-in {i}\n[network]\nread_timeout = {30 + i % 10}\n\n"
+                f"[logging]\ninsights_nest = {'DEBUG' if i % 2 else 'INFO'}\n"
+            )
+        config.CONFIGURATION_FILE_PATH = root / "insights-nest.conf"
+        config.CONFIGURATION_DIRECTORY_PATH = root / "insights-nest.conf.d"
+        config.RHSM_CONFIGURATION_FILE_PATH = root / "rhsm.conf"
+        config.SNAPSHOT_PATH = root / "cache" / "configuration.pickle"
+        try:
+            yield
+        finally:
+            for name, path in original.items():
+                setattr(config, name, path)
+            config.reload()
+
+
+@contextlib.contextmanager
+def config_parse(files: int) -> Iterator[Callable]:
+    with _configuration(files):
+        yield config._parse
+
+
+@contextlib.contextmanager
+def config_get(files: int) -> Iterator[Callable]:
+    """Load the configuration in a new process, i.e. from the snapshot."""
+    with _configuration(files):
+        config.reload()
+        yield config.reload
+
+
+@contextlib.contextmanager
+def format_subprocess_std(size: int) -> Iterator[Callable]:
+    line = "2026-01-01 00:00:00,000 insights.core.spec_factory DEBUG Executing: ls -la /var/log\n"
+    process = subprocess.CompletedProcess(
+        args=["python3"], returncode=1, stdout=line * 10, stderr=line * (size // len(line))
+    )
+    yield lambda: egg._format_subprocess_std(process)
+
+
+def cases(*, extreme: bool) -> dict[str, Callable[[], ContextManager[Callable]]]:
+    """List the cases by their name, with the function preparing the measured call."""
+    listed: dict[str, Callable[[], ContextManager[Callable]]] = {"dto.from_json": dto_from_json}
+    for size in (1 * KiB, 1 * MiB, 50 * MiB) + ((500 * MiB,) if extreme else ()):
+        listed[f"form.build[{size // KiB} KiB]"] = lambda size=size: form_build(size)
+    for count in (1, 100, 1000) + ((10000,) if extreme else ()):
+        listed[f"Hosts.from_json[{count} hosts]"] = lambda count=count: hosts_from_json(count)
+        listed[f"Response.json[{count} hosts]"] = lambda count=count: response_json(count)
+    for files in (1, 100) + ((500,) if extreme else ()):
+        listed[f"config._parse[{files} files]"] = lambda files=files: config_parse(files)
+        listed[f"config.get[{files} files]"] = lambda files=files: config_get(files)
+    for size in (64 * KiB, 4 * MiB) + ((32 * MiB,) if extreme else ()):
+        listed[f"egg._format_subprocess_std[{size // KiB} KiB]"] = (
+            lambda size=size: format_subprocess_std(size)
+        )
+    return listed
+
+
+def calibrate() -> float:
+    """Measure a fixed pure-Python workload, to compare times measured on different machines."""
+    timer = timeit.Timer(lambda: sum(i * i for i in range(100_000)))
+    return min(timer.repeat(repeat=7, number=5)) / 5
+
+
+def measure(call: Callable, *, repeat: int) -> dict[str, float]:
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    number = max(1, number // 4)
+    times: list[float] = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    gc.collect()
+    tracemalloc.start()
+    result = call()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+    }
+
+
+def compare(
+    results: dict[str, dict],
+    baseline: dict[str, dict],
+    *,
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> dict[str, list[str]]:
+    """Find regressions of the results against the baseline.
+
+    :returns: Descriptions of the regressions by the case name.
+    """
+    regressions: dict[str, list[str]] = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        previous: dict = baseline[name]
+        found: list[str] = []
+        if result["relative"] > previous["relative"] * (1 + time_tolerance):
+            found.append(f"time {result['relative'] / previous['relative'] - 1:+.0%}")
+        growth: int = result["peak_bytes"] - previous["peak_bytes"]
+        if growth > MEMORY_NOISE and growth > previous["peak_bytes"] * memory_tolerance:
+            found.append(f"peak memory {growth / KiB:+.0f} KiB")
+        if found:
+            regressions[name] = found
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--extreme", action="store_true", help="include the largest inputs")
+    parser.add_argument("--filter", default="", help="run only cases containing the text")
+    parser.add_argument("--output", type=pathlib.Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=pathlib.Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--time-tolerance", type=float, default=0.25, help="allowed slowdown (default: 25 %%)"
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.10,
+        help="allowed growth of peak memory (default: 10 %%)",
+    )
+    args = parser.parse_args()
+
+    calibration: float = calibrate()
+    results: dict[str, dict] = {}
+    print(f"{'case':<40} {'min us':>11} {'median us':>11} {'relative':>9} {'peak KiB':>10}")
+    for name, prepare in cases(extreme=args.extreme).items():
+        if args.filter not in name:
+            continue
+        with prepare() as call:
+            result: dict = measure(call, repeat=args.repeat)
+        result["relative"] = result["min"] / calibration
+        results[name] = result
+        print(
+            f"{name:<40} {result['min'] * 1e6:>11.1f} {result['median'] * 1e6:>11.1f} "
+            f"{result['relative']:>9.4f} {result['peak_bytes'] / KiB:>10.0f}"
+        )
+
+    if args.output:
+        report: dict = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "calibration": calibration,
+            "cases": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare(
+            results,
+            json.loads(args.baseline.read_text())["cases"],
+            time_tolerance=args.time_tolerance,
+            memory_tolerance=args.memory_tolerance,
+        )
+        for name, found in regressions.items():
+            print(f"Regression in {name}: {', '.join(found)}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
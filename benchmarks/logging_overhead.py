@@ -0,0 +1,94 @@
+"""Measure the overhead of hot-path log statements.
+
+Compares eagerly formatted (f-string) and lazily formatted (%-style) debug statements with the
+debug level turned off and on, written either directly into a slow sink or through the queue
+used by `insights_nest.log`.
+
+    python3 benchmarks/logging_overhead.py --iterations 20000 --sink-delay-us 50
+"""
+
+import argparse
+import logging
+import time
+import timeit
+
+from insights_nest import log
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "insights-nest/0.0.0",
+    "X-Request-Id": "0b9a2c3e-1111-2222-3333-444455556666",
+}
+
+
+class SlowSink(logging.Handler):
+    """Handler simulating a slow destination, e.g. journald under load."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def eager(logger: logging.Logger) -> None:
+    logger.debug(f"Request GET example.org:443/api/inventory/v1/hosts (headers={HEADERS})")
+
+
+def lazy(logger: logging.Logger) -> None:
+    logger.debug(
+        "Request %s %s:%s%s (headers=%s)", "GET", "example.org", 443, "/api/inventory/v1", HEADERS
+    )
+
+
+def measure(iterations: int, delay: float, *, queued: bool, debug: bool) -> dict[str, float]:
+    sink = SlowSink(delay)
+    sink.setFormatter(logging.Formatter(log.FORMAT, style="{"))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    if queued:
+        log.configure({}, handler=sink)
+    else:
+        log.shutdown()
+        root.addHandler(sink)
+
+    logger = logging.getLogger("insights_nest.bench")
+    logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+    results: dict[str, float] = {}
+    for statement in (eager, lazy):
+        seconds: float = timeit.timeit(lambda: statement(logger), number=iterations)
+        results[statement.__name__] = seconds / iterations * 1e6
+
+    log.shutdown()
+    root.handlers.clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument(
+        "--sink-delay-us", type=float, default=50, help="time spent writing one record"
+    )
+    args = parser.parse_args()
+
+    delay: float = args.sink_delay_us / 1e6
+    print(f"{'handler':<8} {'debug':<6} {'eager (us/call)':>16} {'lazy (us/call)':>16}")
+    for queued in (False, True):
+        for debug in (False, True):
+            results = measure(args.iterations, delay, queued=queued, debug=debug)
+            print(
+                f"{'queue' if queued else 'direct':<8} {'on' if debug else 'off':<6} "
+                f"{results['eager']:>16.2f} {results['lazy']:>16.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import argparse
 import logging
 import sys
+import time
 
+from insights_nest import config
+from insights_nest import log
+from insights_nest import metrics
 from insights_nest._core import egg
+from insights_nest.api import connection
+from insights_nest.api import throttle
 
-import insights_nest._cmd.abstract
+from insights_nest._cmd.abstract import AbstractCommand
+from insights_nest._cmd.agent import AgentCommand
 from insights_nest._cmd.checkin import CheckinCommand
+from insights_nest._cmd.diagnose import DiagnoseCommand
+from insights_nest._cmd.egg import EggCommand
+from insights_nest._cmd.fleet import FleetCommand
 from insights_nest._cmd.identity import IdentityCommand
 from insights_nest._cmd.playbook_verifier import VerifyPlaybookCommand
 from insights_nest._cmd.register import RegisterCommand
@@ -16,15 +26,10 @@ from insights_nest._cmd.unregister import UnregisterCommand
 from insights_nest._cmd.version import VersionCommand
 
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="[{levelname:<7}] {module}:{lineno} {message}\033[0m",
-    style="{",
-)
 logger = logging.getLogger(__name__)
 
 
-def main():
+def _create_parser() -> tuple[argparse.ArgumentParser, dict[str, AbstractCommand]]:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--no-egg-update",
@@ -39,7 +44,7 @@ def main():
         help=argparse.SUPPRESS,
     )
 
-    commands: dict[str, insights_nest._cmd.abstract.AbstractCommand] = {}
+    commands: dict[str, AbstractCommand] = {}
 
     subparsers = parser.add_subparsers(dest="command")
     for subcommand in [
@@ -49,18 +54,31 @@ def main():
         RegisterCommand,
         UnregisterCommand,
         VersionCommand,
+        EggCommand,
         # collection
         CheckinCommand,
         AdvisorScanCommand,
         ComplianceScanCommand,
         # apps
         VerifyPlaybookCommand,
+        # fleet
+        FleetCommand,
+        # modes
+        AgentCommand,
+        # support
+        DiagnoseCommand,
         #
         # --support
-        # --diagnosis
     ]:
         commands[subcommand.NAME] = subcommand.create(subparsers)
 
+    return parser, commands
+
+
+def main():
+    log.configure(config.get().logging.levels)
+
+    parser, commands = _create_parser()
     args = parser.parse_args()
 
     if args.command not in commands.keys():
@@ -71,8 +89,67 @@ def main():
             print(f"Unknown command: {args.command}")
             sys.exit(1)
 
-    if not args.no_egg_update:
-        _: egg.EggUpdateResult = egg.update(force=args.force_egg_update)
+    _run(commands[args.command], args)
+
+
+def run(argv: list[str]) -> int:
+    """Run a command in this process, as if it was passed on the command line.
+
+    :param argv: Command line arguments, e.g. `["checkin"]`.
+    :returns: Exit status of the command.
+    """
+    parser, commands = _create_parser()
+    args = parser.parse_args(argv)
+    try:
+        _run(commands[args.command], args)
+    except SystemExit as exc:
+        return _exit_status(exc)
+    except Exception:
+        logger.exception("Command '%s' failed.", " ".join(argv))
+        return 1
+    return 0
+
+
+def _exit_status(exc: SystemExit) -> int:
+    return exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+
+
+def _run(command: AbstractCommand, args: argparse.Namespace) -> None:
+    status: int = 1
+    connection.set_budget(config.get().network.budget)
+    try:
+        egg_update: bool = command.EGG_UPDATE and not config.get().egg.prefetch
+        if egg_update and not args.no_egg_update:
+            with metrics.timer(phase="egg_update"):
+                update_result: egg.EggUpdateResult = egg.update(force=args.force_egg_update)
+            metrics.set_state(
+                "egg_update_result",
+                update_result.name,
+                [result.name for result in egg.EggUpdateResult],
+                label="result",
+            )
+
+        with metrics.timer("command_duration_seconds", command=args.command):
+            command.run(args)
+        status = 0
+    except SystemExit as exc:
+        status = _exit_status(exc)
+        raise
+    finally:
+        _record_command(args.command, status)
+
+
+def _record_command(command: str, status: int) -> None:
+    """Record the result of the command and write the metrics out."""
+    metrics.set_gauge("command_exit_status", status, command=command)
+    result: str = "success" if status == 0 else "failure"
+    metrics.inc("command_runs_total", command=command, result=result)
+    if status == 0:
+        metrics.set_gauge("last_success_timestamp_seconds", time.time(), command=command)
+    throttle.log_summary()
+    # The agent runs many commands in one process, each summarizes its own transfers
+    throttle.reset()
+    metrics.write()
 
 
 if __name__ == "__main__":
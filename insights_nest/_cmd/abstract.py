@@ -4,6 +4,8 @@ import argparse
 class AbstractCommand:
     NAME: str
     HELP: str
+    EGG_UPDATE: bool = True
+    """Update the egg before the command is run."""
 
     @classmethod
     def create(cls, subparsers) -> "AbstractCommand":
@@ -0,0 +1,63 @@
+import argparse
+import logging
+import socket
+import time
+from typing import Optional
+
+import insights_nest
+from insights_nest import config
+from insights_nest import log
+from insights_nest._cmd import abstract
+from insights_nest._core import scheduler
+from insights_nest._core import system
+
+logger = logging.getLogger(__name__)
+
+MAXIMAL_SLEEP: float = 60.0
+"""Longest sleep between two checks, so configuration changes are noticed quickly."""
+
+
+class AgentCommand(abstract.AbstractCommand):
+    NAME = "agent"
+    HELP = "run scheduled tasks"
+    EGG_UPDATE = False
+
+    @classmethod
+    def create(cls, subparsers) -> "AgentCommand":
+        parser = subparsers.add_parser(cls.NAME, help=cls.HELP)
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="run the tasks that are due and exit (e.g. when started by a timer)",
+        )
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        machine_id: Optional[str] = system.get_machine_id()
+        seed: str = machine_id if machine_id is not None else socket.getfqdn()
+        agent = scheduler.Scheduler(seed)
+
+        while True:
+            if config.changed():
+                logger.info("Configuration has changed, reloading it.")
+                previous: config.Configuration = config.get()
+                config.reload()
+                log.configure(config.get().logging.levels)
+                restart: list[str] = config.restart_required(previous, config.get())
+                if restart:
+                    logger.warning(
+                        "Changes of %s only take effect after the agent is restarted.",
+                        ", ".join(restart),
+                    )
+
+            next_run: float = agent.run_pending(scheduler.get_tasks(), self._run_task)
+            if args.once:
+                return
+
+            delay: float = min(max(next_run - time.time(), 0.0), MAXIMAL_SLEEP)
+            logger.debug("Sleeping for %.0f seconds.", delay)
+            time.sleep(delay)
+
+    @staticmethod
+    def _run_task(task: scheduler.Task) -> bool:
+        return insights_nest.run(task.argv) == 0
@@ -4,7 +4,7 @@ import sys
 
 from insights_nest.api import inventory
 from insights_nest._cmd import abstract
-from insights_nest._core import egg
+from insights_nest._core import facts
 from insights_nest._core import system
 
 
@@ -23,7 +23,7 @@ class CheckinCommand(abstract.AbstractCommand):
             sys.exit(1)
 
         try:
-            canonical_facts: dict = egg.Egg().run("checkin")
+            canonical_facts: dict = facts.get_canonical_facts()
         except RuntimeError:
             logging.error("Check-in failed.")
             print("Check-in failed.")
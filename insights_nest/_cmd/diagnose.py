@@ -0,0 +1,28 @@
+import argparse
+import dataclasses
+import json
+import sys
+
+from insights_nest._cmd import abstract
+from insights_nest._core import diagnosis
+
+
+class DiagnoseCommand(abstract.AbstractCommand):
+    NAME = "diagnose"
+    HELP = "diagnose connectivity to Insights and the egg"
+    EGG_UPDATE = False
+
+    @classmethod
+    def create(cls, subparsers) -> "DiagnoseCommand":
+        parser = subparsers.add_parser(cls.NAME, help=cls.HELP)
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            help="seconds each phase of a probe may take (default: connect_timeout)",
+        )
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        report: diagnosis.Report = diagnosis.diagnose(timeout=args.timeout)
+        print(json.dumps({**dataclasses.asdict(report), "ok": report.ok}, indent=2))
+        sys.exit(0 if report.ok else 1)
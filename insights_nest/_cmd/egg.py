@@ -0,0 +1,100 @@
+import argparse
+import json
+import pathlib
+import sys
+from typing import Optional
+
+from insights_nest._cmd import abstract
+from insights_nest._core import egg
+
+
+class EggCommand(abstract.AbstractCommand):
+    NAME = "egg"
+    HELP = "manage the insights-core egg"
+    EGG_UPDATE = False
+
+    commands: dict[str, abstract.AbstractCommand] = {}
+    parser = None
+
+    @classmethod
+    def create(cls, root_parser) -> "EggCommand":
+        cls.commands = {}
+
+        cls.parser = root_parser.add_parser(cls.NAME, help=cls.HELP)
+        subparsers = cls.parser.add_subparsers(dest="subcommand")
+        for subcommand in [
+            EggPrefetchCommand,
+            EggRollbackCommand,
+            EggVersionsCommand,
+        ]:
+            cls.commands[subcommand.NAME] = subcommand.create(subparsers)
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        if args.subcommand is None:
+            type(self).parser.print_help()  # type: ignore
+            sys.exit(0)
+
+        if args.subcommand not in type(self).commands.keys():
+            print(f"Unknown command: {args.subcommand}")
+            sys.exit(1)
+
+        type(self).commands[args.subcommand].run(args)
+
+
+class EggPrefetchCommand(abstract.AbstractCommand):
+    NAME = "prefetch"
+    HELP = "download, verify and activate a new egg"
+
+    @classmethod
+    def create(cls, egg_parser) -> "EggPrefetchCommand":
+        parser = egg_parser.add_parser(cls.NAME, help=cls.HELP)
+        parser.add_argument("--force", action="store_true", help="download the egg even if known")
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        result: egg.EggUpdateResult = egg.update(force=args.force)
+        print(result.value)
+        sys.exit(0 if result.ok else 1)
+
+
+class EggRollbackCommand(abstract.AbstractCommand):
+    NAME = "rollback"
+    HELP = "activate the previous egg"
+
+    @classmethod
+    def create(cls, egg_parser) -> "EggRollbackCommand":
+        _ = egg_parser.add_parser(cls.NAME, help=cls.HELP)
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        version: Optional[pathlib.Path] = egg.rollback()
+        if version is None:
+            print("There is no previous egg to roll back to.")
+            sys.exit(1)
+        print(f"Rolled back to egg {version.name}.")
+
+
+class EggVersionsCommand(abstract.AbstractCommand):
+    NAME = "versions"
+    HELP = "list staged eggs"
+
+    @classmethod
+    def create(cls, egg_parser) -> "EggVersionsCommand":
+        parser = egg_parser.add_parser(cls.NAME, help=cls.HELP)
+        parser.add_argument(abstract.FORMAT_FLAG, **abstract.FORMAT_FLAG_ARGS)
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        current: Optional[pathlib.Path] = egg.current_version()
+        versions: list[dict] = [
+            {"version": version.name, "active": version == current}
+            for version in egg.versions()
+        ]
+
+        if args.format == "json":
+            print(json.dumps(versions))
+            sys.exit(0)
+
+        for version in versions:
+            print(f"{'*' if version['active'] else ' '} {version['version']}")
@@ -0,0 +1,110 @@
+import argparse
+import pathlib
+import sys
+
+from insights_nest._cmd import abstract
+from insights_nest._core import fleet
+
+
+class FleetCommand(abstract.AbstractCommand):
+    NAME = "fleet"
+    HELP = "change many Inventory hosts at once"
+    EGG_UPDATE = False
+
+    commands: dict[str, abstract.AbstractCommand] = {}
+    parser = None
+
+    @classmethod
+    def create(cls, root_parser) -> "FleetCommand":
+        cls.commands = {}
+
+        cls.parser = root_parser.add_parser(cls.NAME, help=cls.HELP)
+        subparsers = cls.parser.add_subparsers(dest="subcommand")
+        for subcommand in [
+            FleetSetNamesCommand,
+            FleetDeleteCommand,
+        ]:
+            cls.commands[subcommand.NAME] = subcommand.create(subparsers)
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        if args.subcommand is None:
+            type(self).parser.print_help()  # type: ignore
+            sys.exit(0)
+
+        if args.subcommand not in type(self).commands.keys():
+            print(f"Unknown command: {args.subcommand}")
+            sys.exit(1)
+
+        type(self).commands[args.subcommand].run(args)
+
+
+def _add_arguments(parser: argparse.ArgumentParser, source: str) -> None:
+    parser.add_argument(
+        "--from", dest="source", type=pathlib.Path, required=True, metavar="CSV", help=source
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=16, help="maximal number of requests in flight"
+    )
+    parser.add_argument(
+        "--journal",
+        type=pathlib.Path,
+        help="record of finished changes, to resume an interrupted run (default: CSV.journal)",
+    )
+
+
+def _run(args: argparse.Namespace, changes: list[fleet.Change]) -> None:
+    journal: pathlib.Path = args.journal or args.source.with_name(args.source.name + ".journal")
+    summary: fleet.Summary = fleet.run(changes, jobs=args.jobs, journal=journal)
+    print(
+        f"Changed {summary.changed} of {summary.total} hosts in {summary.seconds:.1f} s "
+        f"({summary.rate:.0f} hosts/s)."
+    )
+    if summary.skipped:
+        print(f"{summary.skipped} hosts were changed by a previous run.")
+    if summary.missing:
+        print(f"{summary.missing} hosts were not found.")
+    if summary.failed:
+        print(f"{summary.failed} hosts failed, run the command again to retry them.")
+        sys.exit(1)
+
+
+class FleetSetNamesCommand(abstract.AbstractCommand):
+    NAME = "set-names"
+    HELP = "set display and Ansible names of hosts"
+
+    @classmethod
+    def create(cls, fleet_parser) -> "FleetSetNamesCommand":
+        parser = fleet_parser.add_parser(cls.NAME, help=cls.HELP)
+        _add_arguments(
+            parser,
+            "CSV file with columns 'id' (Insights UUID), 'display_name' and/or 'ansible_name'",
+        )
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        try:
+            changes: list[fleet.Change] = fleet.read_names(args.source)
+        except (OSError, ValueError) as exc:
+            print(f"Could not read the names: {exc}")
+            sys.exit(1)
+        _run(args, changes)
+
+
+class FleetDeleteCommand(abstract.AbstractCommand):
+    NAME = "delete"
+    HELP = "delete hosts from Inventory"
+
+    @classmethod
+    def create(cls, fleet_parser) -> "FleetDeleteCommand":
+        parser = fleet_parser.add_parser(cls.NAME, help=cls.HELP)
+        _add_arguments(parser, "CSV file with column 'id' (Insights UUID)")
+        return cls()
+
+    def run(self, args: argparse.Namespace) -> None:
+        try:
+            changes: list[fleet.Change] = fleet.read_deletions(args.source)
+        except (OSError, ValueError) as exc:
+            print(f"Could not read the hosts: {exc}")
+            sys.exit(1)
+        _run(args, changes)
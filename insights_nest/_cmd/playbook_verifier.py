@@ -1,10 +1,14 @@
 import argparse
+import dataclasses
+import json
 import logging
+import pathlib
 import subprocess
 import sys
 
 from insights_nest._cmd import abstract
 from insights_nest._core import egg
+from insights_nest._core import playbooks
 
 
 class VerifyPlaybookCommand(abstract.AbstractCommand):
@@ -13,11 +17,24 @@ class VerifyPlaybookCommand(abstract.AbstractCommand):
 
     @classmethod
     def create(cls, subparsers) -> "VerifyPlaybookCommand":
-        _ = subparsers.add_parser(cls.NAME, help=cls.HELP)
+        parser = subparsers.add_parser(cls.NAME, help=cls.HELP)
+        parser.add_argument(
+            "playbooks",
+            nargs="*",
+            metavar="PLAYBOOK",
+            help="paths to playbooks, '-' for the standard input; results are JSON lines",
+        )
+        parser.add_argument(
+            "--jobs", type=int, default=1, help="number of Core processes verifying in parallel"
+        )
         return cls()
 
     def run(self, args: argparse.Namespace) -> None:
         """Run the playbook verifier via the Core."""
+        if args.playbooks:
+            self._run_batch(args)
+            return
+
         # FIXME The app has no tests and doesn't include any example playbook that would have signature.
         #  This has not been tested end-to-end.
         try:
@@ -31,3 +48,28 @@ class VerifyPlaybookCommand(abstract.AbstractCommand):
             return
 
         print(output.stdout, file=sys.stderr)
+
+    def _run_batch(self, args: argparse.Namespace) -> None:
+        """Verify the playbooks in as few Core processes as possible."""
+        contents: list[tuple[str, bytes]] = []
+        for name in args.playbooks:
+            try:
+                if name == "-":
+                    contents.append((name, sys.stdin.buffer.read()))
+                else:
+                    contents.append((name, pathlib.Path(name).read_bytes()))
+            except OSError as exc:
+                print(f"Could not read playbook {name}: {exc}", file=sys.stderr)
+                sys.exit(1)
+
+        try:
+            results: list[playbooks.Result] = playbooks.verify(contents, jobs=args.jobs)
+        except RuntimeError:
+            logging.error("Playbook Verifier failed.")
+            print("Playbook Verifier failed.", file=sys.stderr)
+            sys.exit(1)
+
+        for result in results:
+            print(json.dumps(dataclasses.asdict(result)))
+        if not all(result.verified for result in results):
+            sys.exit(1)
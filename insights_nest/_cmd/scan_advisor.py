@@ -3,9 +3,10 @@ import logging
 import os
 import pathlib
 import sys
+from typing import Optional
 
 from insights_nest._cmd import abstract
-from insights_nest._core import system, egg
+from insights_nest._core import system, egg, facts, upload
 from insights_nest.api import ingress
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,7 @@ class AdvisorScanCommand(abstract.AbstractCommand):
             sys.exit(1)
 
         try:
-            canonical_facts: dict = egg.Egg().run("checkin")
+            canonical_facts: dict = facts.get_canonical_facts()
         except RuntimeError:
             logger.error("Could not collect canonical facts.")
             print("Could not collect canonical facts.")
@@ -36,10 +37,12 @@ class AdvisorScanCommand(abstract.AbstractCommand):
         result = egg.Egg().run("advisor")
         payload_path = pathlib.Path(result["payload"])
 
-        ingress.Ingress().upload(
+        response: Optional[ingress.UploadResponse] = upload.upload(
             archive=payload_path,
             content_type=result["content_type"],
             facts=canonical_facts,
         )
+        if response is None:
+            print("The results did not change since the last upload, checked in instead.")
         if payload_path.exists():
             os.remove(payload_path)
@@ -3,9 +3,10 @@ import logging
 import os
 import pathlib
 import sys
+from typing import Optional
 
 from insights_nest._cmd import abstract
-from insights_nest._core import system, egg
+from insights_nest._core import system, egg, facts, upload
 from insights_nest.api import ingress
 
 
@@ -28,7 +29,7 @@ class ComplianceScanCommand(abstract.AbstractCommand):
             sys.exit(1)
 
         try:
-            canonical_facts: dict = egg.Egg().run("checkin")
+            canonical_facts: dict = facts.get_canonical_facts()
         except RuntimeError:
             logger.error("Could not collect canonical facts.")
             print("Could not collect canonical facts.")
@@ -37,10 +38,12 @@ class ComplianceScanCommand(abstract.AbstractCommand):
         result = egg.Egg().run("compliance")
         payload_path = pathlib.Path(result["payload"])
 
-        ingress.Ingress().upload(
+        response: Optional[ingress.UploadResponse] = upload.upload(
             archive=payload_path,
             content_type=result["content_type"],
             facts=canonical_facts,
         )
+        if response is None:
+            print("The results did not change since the last upload, checked in instead.")
         if payload_path.exists():
             os.remove(payload_path)
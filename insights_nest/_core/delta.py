@@ -0,0 +1,162 @@
+"""Deltas between two eggs.
+
+Consecutive egg releases differ in a few modules only. Since an egg is a zip archive, whose
+members are compressed independently, the unchanged members of the new egg can be copied from
+the old one byte for byte. A delta describes the new egg as a sequence of spans: spans copied
+from the old egg, and literal data carried in the delta itself (changed members, local headers
+with new timestamps, the central directory).
+
+The delta starts with `MAGIC`, followed by a JSON header on one line, followed by the literal
+data of all the spans:
+
+    {"source": "<sha256>", "target": "<sha256>", "size": 1234, "spans": [[0, 120], [-1, 80]]}
+
+Each span is `[offset, length]` copying from the old egg, or `[-1, length]` taking the next
+bytes of the literal data. The rebuilt egg is checked against the size and digest of the header;
+its authenticity is then verified by its GPG signature, like the one of a downloaded egg.
+"""
+
+import hashlib
+import io
+import json
+import struct
+import zipfile
+
+MAGIC = b"NESTDELTA1\n"
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+class DeltaError(Exception):
+    """The delta is malformed, or does not belong to the egg."""
+
+
+def _data_offset(archive: bytes, info: zipfile.ZipInfo) -> int:
+    """Get the offset of the compressed data of the member, after its local header."""
+    header = _LOCAL_HEADER.unpack_from(archive, info.header_offset)
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local header of member {info.filename}.")
+    name_length, extra_length = header[9], header[10]
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def _members(archive: bytes) -> list[tuple[zipfile.ZipInfo, int]]:
+    """List the members of the archive with offsets of their data, in the order of the file."""
+    with zipfile.ZipFile(io.BytesIO(archive)) as f:
+        infos: list[zipfile.ZipInfo] = sorted(f.infolist(), key=lambda i: i.header_offset)
+    return [(info, _data_offset(archive, info)) for info in infos]
+
+
+def create(source: bytes, target: bytes) -> bytes:
+    """Create a delta rebuilding the target egg from the source egg.
+
+    :raises zipfile.BadZipFile: One of the eggs is not a zip archive.
+    """
+    # Members with identical content have identical compressed data, if compressed the same way
+    candidates: dict[tuple[int, int, int], list[tuple[zipfile.ZipInfo, int]]] = {}
+    for info, offset in _members(source):
+        key = (info.CRC, info.compress_size, info.compress_type)
+        candidates.setdefault(key, []).append((info, offset))
+
+    spans: list[list[int]] = []
+    literal = bytearray()
+
+    def copy(offset: int, length: int) -> None:
+        if spans and spans[-1][0] >= 0 and sum(spans[-1]) == offset:
+            spans[-1][1] += length
+        elif length:
+            spans.append([offset, length])
+
+    def take(start: int, end: int) -> None:
+        literal.extend(target[start:end])
+        if spans and spans[-1][0] == -1:
+            spans[-1][1] += end - start
+        elif end > start:
+            spans.append([-1, end - start])
+
+    position: int = 0
+    for info, offset in _members(target):
+        data: bytes = target[offset : offset + info.compress_size]
+        for candidate, candidate_offset in candidates.get(
+            (info.CRC, info.compress_size, info.compress_type), []
+        ):
+            if source[candidate_offset : candidate_offset + info.compress_size] == data:
+                break
+        else:
+            continue
+
+        header: bytes = target[info.header_offset : offset]
+        if source[candidate.header_offset : candidate_offset] == header:
+            # Not even the timestamp has changed, copy the local header as well
+            take(position, info.header_offset)
+            copy(candidate.header_offset, candidate_offset - candidate.header_offset)
+        else:
+            take(position, offset)
+        copy(candidate_offset, info.compress_size)
+        position = offset + info.compress_size
+    take(position, len(target))
+
+    header_line: bytes = json.dumps(
+        {
+            "source": hashlib.sha256(source).hexdigest(),
+            "target": hashlib.sha256(target).hexdigest(),
+            "size": len(target),
+            "spans": spans,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return MAGIC + header_line + b"\n" + bytes(literal)
+
+
+def read_header(delta: bytes) -> dict:
+    """Parse the header of the delta.
+
+    :raises DeltaError: The delta is malformed.
+    """
+    if not delta.startswith(MAGIC):
+        raise DeltaError("The delta has an unknown format.")
+    end: int = delta.find(b"\n", len(MAGIC))
+    if end < 0:
+        raise DeltaError("The delta has no header.")
+    try:
+        header: dict = json.loads(delta[len(MAGIC) : end])
+        _ = header["source"], header["target"], int(header["size"]), list(header["spans"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise DeltaError(f"The delta header is malformed: {exc}") from exc
+    header["offset"] = end + 1
+    return header
+
+
+def apply(source: bytes, delta: bytes) -> bytes:
+    """Rebuild the target egg from the source egg and the delta.
+
+    :raises DeltaError: The delta is malformed or belongs to another egg, or the rebuilt egg
+        does not match the digest of the delta.
+    """
+    header: dict = read_header(delta)
+    if hashlib.sha256(source).hexdigest() != header["source"]:
+        raise DeltaError("The delta was created for a different egg.")
+
+    literal = memoryview(delta)[header["offset"] :]
+    position: int = 0
+    target = bytearray()
+    try:
+        for offset, length in header["spans"]:
+            if length < 0 or offset < -1:
+                raise DeltaError(f"Invalid span [{offset}, {length}].")
+            if offset == -1:
+                if position + length > len(literal):
+                    raise DeltaError("The delta is truncated.")
+                target += literal[position : position + length]
+                position += length
+            else:
+                if offset + length > len(source):
+                    raise DeltaError(f"Span [{offset}, {length}] is out of the source egg.")
+                target += source[offset : offset + length]
+    except (ValueError, TypeError) as exc:
+        raise DeltaError(f"The delta spans are malformed: {exc}") from exc
+
+    if len(target) != header["size"] or hashlib.sha256(target).hexdigest() != header["target"]:
+        raise DeltaError("The rebuilt egg does not match the delta.")
+    return bytes(target)
@@ -0,0 +1,210 @@
+"""Diagnosis of the connectivity to the Insights APIs and of the egg.
+
+All the APIs used by the client are probed at once (see `insights_nest.api.probe`), together
+with the check of the egg, so the diagnosis takes about as long as the slowest probe.
+"""
+
+import concurrent.futures
+import dataclasses
+import datetime
+import hashlib
+import logging
+import pathlib
+import ssl
+import time
+import zipfile
+from typing import Optional
+
+from insights_nest import config
+from insights_nest._core import egg
+from insights_nest.api import connection
+from insights_nest.api import ingress
+from insights_nest.api import insights
+from insights_nest.api import inventory
+from insights_nest.api import module_update_router
+from insights_nest.api import probe
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATE_WARNING_DAYS: float = 14.0
+"""Server certificates expiring sooner are reported."""
+CLOCK_SKEW_LIMIT: float = 60.0
+"""Larger differences between the local clock and the servers' are reported, in seconds."""
+
+
+@dataclasses.dataclass
+class Endpoint:
+    name: str
+    connection: type[connection.Connection]
+    endpoint: str
+    """Endpoint of the API requested by the probe; any response proves it is reachable."""
+
+
+def _endpoints() -> list[Endpoint]:
+    route: str = "/testing" if config.get().egg.canary else "/release"
+    return [
+        Endpoint("inventory", inventory.InventoryConnection, "/hosts?per_page=1"),
+        Endpoint("ingress", ingress.IngressConnection, "/upload"),
+        Endpoint(
+            "module-update-router",
+            module_update_router.ModuleUpdateRouterConnection,
+            "/channel?module=insights-core",
+        ),
+        Endpoint("static", insights.InsightsConnection, f"/static{route}/{egg.SIG_FILENAME}"),
+    ]
+
+
+@dataclasses.dataclass
+class EggCheck:
+    path: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    version: Optional[str] = None
+    """Version of the egg, as `VERSION-RELEASE+COMMIT` (like `Egg.version`)."""
+    intact: Optional[bool] = None
+    """Whether all the files of the egg match their checksums."""
+    signature: Optional[bool] = None
+    """Whether the GPG signature matches; `None` if there is no signature next to the egg."""
+    error: Optional[str] = None
+
+
+def check_egg() -> EggCheck:
+    """Check the egg that would be used, without running it."""
+    result = EggCheck()
+    try:
+        path: pathlib.Path = egg.Egg.discover_path()
+    except RuntimeError as exc:
+        result.error = str(exc)
+        return result
+    result.path = f"{path!s}"
+
+    try:
+        with path.open("rb") as f:
+            digest = hashlib.sha256()
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+                result.size = (result.size or 0) + len(chunk)
+        result.sha256 = digest.hexdigest()
+
+        with zipfile.ZipFile(path) as archive:
+            corrupted: Optional[str] = archive.testzip()
+        result.intact = corrupted is None
+        if corrupted is not None:
+            result.error = f"File {corrupted} of the egg is corrupted."
+
+        info: dict[str, str] = egg.read_package_info(path)
+        if "VERSION" in info:
+            result.version = info["VERSION"]
+            if "RELEASE" in info:
+                result.version += f"-{info['RELEASE']}"
+            if "COMMIT" in info:
+                result.version += f"+{info['COMMIT']}"
+        elif result.error is None:
+            result.error = "The egg does not contain insights/VERSION."
+    except zipfile.BadZipFile as exc:
+        result.intact = False
+        result.error = f"The egg is not a ZIP archive: {exc}"
+    except OSError as exc:
+        result.error = str(exc)
+
+    signature: pathlib.Path = path.with_name(egg.SIG_FILENAME)
+    if signature.exists():
+        result.signature = egg.verify_signature(path, signature)
+    return result
+
+
+@dataclasses.dataclass
+class Report:
+    time: str
+    seconds: float
+    endpoints: dict[str, probe.Probe]
+    egg: EggCheck
+    problems: list[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def _endpoint_problems(name: str, result: probe.Probe) -> list[str]:
+    problems: list[str] = []
+    if result.error is not None:
+        problems.append(f"{name}: {result.failed_phase} failed: {result.error}")
+    if result.status is not None and (result.status >= 500 or result.status in (401, 403)):
+        problems.append(f"{name}: the server answered with status {result.status}.")
+    if result.certificate is not None:
+        days: float = result.certificate.days_left
+        if days < 0:
+            problems.append(f"{name}: the server certificate has expired.")
+        elif days < CERTIFICATE_WARNING_DAYS:
+            problems.append(f"{name}: the server certificate expires in {days:.0f} days.")
+    if result.clock_skew is not None and abs(result.clock_skew) > CLOCK_SKEW_LIMIT:
+        relation: str = "behind" if result.clock_skew > 0 else "ahead of"
+        problems.append(
+            f"{name}: the local clock is {abs(result.clock_skew):.0f} s {relation} the server's."
+        )
+    return problems
+
+
+def _egg_problems(check: EggCheck) -> list[str]:
+    problems: list[str] = []
+    if check.error is not None:
+        problems.append(f"egg: {check.error}")
+    if check.signature is False:
+        problems.append("egg: the GPG signature does not match.")
+    return problems
+
+
+def diagnose(*, timeout: Optional[float] = None) -> Report:
+    """Probe all the APIs and check the egg, in parallel.
+
+    :param timeout: Seconds each phase of a probe may take; the connect timeout by default.
+    """
+    cfg: config.Network = config.get().network
+    timeout = timeout if timeout is not None else cfg.connect_timeout
+    endpoints: list[Endpoint] = _endpoints()
+
+    started: float = time.monotonic()
+    now: str = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    problems: list[str] = []
+    try:
+        context: ssl.SSLContext = connection.create_tls_context()
+    except (OSError, ssl.SSLError) as exc:
+        # Probe without the identity, the servers may still be reachable
+        problems.append(f"The identity certificate could not be loaded: {exc}")
+        context = ssl.create_default_context()
+        try:
+            context.load_verify_locations(cafile=f"{cfg.ca_certificates!s}")
+        except (OSError, ssl.SSLError):
+            pass
+
+    with concurrent.futures.ThreadPoolExecutor(
+        len(endpoints) + 1, thread_name_prefix="diagnosis"
+    ) as pool:
+        egg_check: concurrent.futures.Future = pool.submit(check_egg)
+        probes: dict[str, concurrent.futures.Future] = {}
+        for endpoint in endpoints:
+            cls: type[connection.Connection] = endpoint.connection
+            probes[endpoint.name] = pool.submit(
+                probe.probe,
+                cls.HOST,
+                cls.PORT,
+                f"{cls.PATH}{endpoint.endpoint}",
+                context=context,
+                timeout=timeout,
+            )
+
+        results: dict[str, probe.Probe] = {name: f.result() for name, f in probes.items()}
+        report = Report(
+            time=now,
+            seconds=0.0,
+            endpoints=results,
+            egg=egg_check.result(),
+            problems=problems,
+        )
+
+    for name, result in report.endpoints.items():
+        report.problems += _endpoint_problems(name, result)
+    report.problems += _egg_problems(report.egg)
+    report.seconds = round(time.monotonic() - started, 3)
+    return report
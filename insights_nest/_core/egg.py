@@ -1,4 +1,5 @@
 import enum
+import hashlib
 import json
 import logging
 import os.path
@@ -7,25 +8,41 @@ import shutil
 import subprocess
 import tempfile
 import time
+import zipfile
 from typing import Optional
 
 from insights_nest import config
+from insights_nest import metrics
+from insights_nest._core import delta
+from insights_nest._core import lock
+from insights_nest._core import resources
 from insights_nest.api import module_update_router
 from insights_nest.api import insights
 from insights_nest.api.connection import Response
 
 logger = logging.getLogger(__name__)
 
-UNTRUSTED_EGG_PATH: pathlib.Path = config.get().egg.egg_directory / "untrusted.egg"
-UNTRUSTED_SIG_PATH: pathlib.Path = config.get().egg.egg_directory / "untrusted.egg.asc"
-TRUSTED_EGG_PATH: pathlib.Path = config.get().egg.egg_directory / "current.egg"
-TRUSTED_SIG_PATH: pathlib.Path = config.get().egg.egg_directory / "current.egg.asc"
+EGG_FILENAME = "insights-core.egg"
+SIG_FILENAME = "insights-core.egg.asc"
 
-EGG_ETAG_PATH: pathlib.Path = config.get().egg.metadata_directory / ".insights-core.etag"
-SIG_ETAG_PATH: pathlib.Path = config.get().egg.metadata_directory / ".insights-core-gpg-sig.etag"
+VERSIONS_DIRECTORY: pathlib.Path = config.get().egg.egg_directory / "versions"
+"""Directory with staged, verified eggs. Each version is a directory with the egg and its
+signature."""
+CURRENT_LINK: pathlib.Path = config.get().egg.egg_directory / "current"
+"""Symbolic link to the active version."""
+TRUSTED_EGG_PATH: pathlib.Path = CURRENT_LINK / EGG_FILENAME
+TRUSTED_SIG_PATH: pathlib.Path = CURRENT_LINK / SIG_FILENAME
 
+UPDATE_RESULT_PATH: pathlib.Path = config.get().egg.egg_directory / ".egg-update.json"
 
-TEMPORARY_GPG_HOME_PARENT_DIRECTORY = pathlib.Path("/var/lib/insights/")
+LEGACY_EGG_PATH: pathlib.Path = config.get().egg.egg_directory / "current.egg"
+"""The active egg of older versions of the client, migrated into a staged version."""
+LEGACY_SIG_PATH: pathlib.Path = config.get().egg.egg_directory / "current.egg.asc"
+LEGACY_ETAG_PATH: pathlib.Path = config.get().egg.metadata_directory / ".insights-core.etag"
+"""ETag of the legacy egg, revalidated until the HTTP cache has validators of a newer egg."""
+
+
+TEMPORARY_GPG_HOME_PARENT_DIRECTORY: pathlib.Path = config.get().egg.egg_directory
 
 
 class EggUpdateResult(enum.Enum):
@@ -50,46 +67,225 @@ def _get_route() -> module_update_router.Route:
     return route
 
 
-def _update_egg(*, route: module_update_router.Route, force: bool = False) -> EggUpdateResult:
-    """Update the egg binary."""
+def _update_egg(
+    *, route: module_update_router.Route, directory: pathlib.Path, force: bool = False
+) -> EggUpdateResult:
+    """Download the egg binary into the directory, if there is a newer one.
+
+    The validators of the latest downloaded egg are kept by the HTTP cache. They are only sent
+    if there is an active egg, so a missing egg is always downloaded.
+    """
+    revalidate: bool = TRUSTED_EGG_PATH.exists() and not force
+    if force:
+        logger.debug("Force downloading the egg.")
+
     etag: Optional[str] = None
-    if os.path.exists(EGG_ETAG_PATH):
-        with open(EGG_ETAG_PATH, "r") as f:
-            etag = f.read()
+    if revalidate and LEGACY_ETAG_PATH.exists():
+        etag = LEGACY_ETAG_PATH.read_text().strip() or None
 
     logger.debug("Fetching the egg.")
-    egg: Response = insights.Insights().get_egg(route=route, etag=etag)
+    egg: Response = insights.Insights().get_egg(route=route, revalidate=revalidate, etag=etag)
+    if egg.status == 304:
+        logger.debug("The egg has not changed, we don't need to download anything.")
+        return EggUpdateResult.NO_UPDATE_NEEDED
+    # The HTTP cache has the validators of the new egg now
+    LEGACY_ETAG_PATH.unlink(missing_ok=True)
 
-    new_etag: str = egg.headers.get("Etag", "")
-    if etag == new_etag:
-        logger.debug("Etag matches, we don't need to download anything.")
-        if not force:
-            return EggUpdateResult.NO_UPDATE_NEEDED
-        logger.debug("Force downloading the egg anyway.")
+    metrics.inc("egg_downloads_total", kind="full")
+    path: pathlib.Path = directory / EGG_FILENAME
+    logger.debug("Saving the egg into %s (size is %d bytes).", path, len(egg.data))
+    with path.open("wb") as f:
+        f.write(egg.data)
 
-    logger.debug(f"Updating egg etag {EGG_ETAG_PATH!s}: {etag} -> {new_etag}.")
-    with EGG_ETAG_PATH.open("w") as f:
-        f.write(new_etag)
+    return EggUpdateResult.UPDATE_SUCCESS
 
-    logger.debug(f"Saving the egg into {UNTRUSTED_EGG_PATH!s} (size is {len(egg.data)} bytes).")
-    with UNTRUSTED_EGG_PATH.open("wb") as f:
-        f.write(egg.data)
+
+def _update_egg_from_delta(
+    *, route: module_update_router.Route, directory: pathlib.Path
+) -> Optional[EggUpdateResult]:
+    """Rebuild the new egg in the directory from the active egg and a delta, if there is one.
+
+    :returns: The result, or `None` if the whole egg has to be downloaded instead.
+    """
+    with TRUSTED_EGG_PATH.open("rb") as f:
+        source: bytes = f.read()
+    digest: str = hashlib.sha256(source).hexdigest()
+
+    logger.debug("Fetching the egg delta from %s.", digest)
+    try:
+        response: Response = insights.Insights().get_egg_delta(route=route, digest=digest)
+    except Exception as exc:
+        logger.debug("Could not fetch the egg delta: %s", exc)
+        return None
+    if response.status == 304:
+        logger.debug("The egg has not changed, we don't need to download anything.")
+        return EggUpdateResult.NO_UPDATE_NEEDED
+    if response.status != 200:
+        logger.debug("There is no egg delta from %s (status %d).", digest, response.status)
+        return None
+
+    try:
+        target: bytes = delta.apply(source, response.data)
+    except delta.DeltaError as exc:
+        logger.warning("Could not apply the egg delta, downloading the whole egg: %s", exc)
+        return None
+
+    metrics.inc("egg_downloads_total", kind="delta")
+    metrics.inc("egg_download_saved_bytes_total", max(len(target) - len(response.data), 0))
+    logger.info(
+        "Rebuilt the egg from a delta of %d bytes instead of downloading %d bytes.",
+        len(response.data),
+        len(target),
+    )
+    path: pathlib.Path = directory / EGG_FILENAME
+    with path.open("wb") as f:
+        f.write(target)
 
     return EggUpdateResult.UPDATE_SUCCESS
 
 
-def _update_egg_signature(*, route: module_update_router.Route):
-    """Update the egg binary signature."""
+def _update_egg_signature(*, route: module_update_router.Route, directory: pathlib.Path):
+    """Download the egg binary signature into the directory."""
     logger.debug("Fetching the egg signature.")
     signature: Response = insights.Insights().get_egg_signature(route=route)
 
+    path: pathlib.Path = directory / SIG_FILENAME
     logger.debug(
-        f"Saving the egg signature into {UNTRUSTED_SIG_PATH!s} (size is {len(signature.data)} bytes)."
+        "Saving the egg signature into %s (size is %d bytes).", path, len(signature.data)
     )
-    with UNTRUSTED_SIG_PATH.open("wb") as f:
+    with path.open("wb") as f:
         f.write(signature.data)
 
 
+def versions() -> list[pathlib.Path]:
+    """List the staged egg versions, from the oldest to the newest."""
+    if not VERSIONS_DIRECTORY.is_dir():
+        return []
+    return sorted(
+        path
+        for path in VERSIONS_DIRECTORY.iterdir()
+        if path.is_dir() and not path.name.startswith(".")
+    )
+
+
+def current_version() -> Optional[pathlib.Path]:
+    """Get the directory of the active egg version."""
+    if not TRUSTED_EGG_PATH.exists():
+        return None
+    return CURRENT_LINK.resolve()
+
+
+def read_package_info(path: pathlib.Path) -> dict[str, str]:
+    """Read the version of the egg from its `insights/VERSION`, `RELEASE` and `COMMIT` files.
+
+    Unlike `Egg.version`, the egg is not run.
+
+    :returns: The values found, by the keys of `insights.package_info`.
+    :raises zipfile.BadZipFile: The egg is not a ZIP archive.
+    """
+    with zipfile.ZipFile(path) as archive:
+        names: set[str] = set(archive.namelist())
+        return {
+            key: archive.read(f"insights/{key}").decode("utf-8").strip()
+            for key in ("VERSION", "RELEASE", "COMMIT")
+            if f"insights/{key}" in names
+        }
+
+
+def _stage(directory: pathlib.Path) -> pathlib.Path:
+    """Turn a verified download into a staged version.
+
+    Versions are named by the time they were staged and the digest of the egg, so they sort
+    chronologically and an already staged egg is not staged again.
+    """
+    with (directory / EGG_FILENAME).open("rb") as f:
+        digest: str = hashlib.sha256(f.read()).hexdigest()
+
+    for version in versions():
+        if version.name.endswith(f"-{digest[:16]}"):
+            logger.debug("The egg is already staged as %s.", version)
+            shutil.rmtree(directory)
+            return version
+
+    version = VERSIONS_DIRECTORY / f"{time.time_ns()}-{digest[:16]}"
+    os.rename(directory, version)
+    logger.debug("Staged the egg as %s.", version)
+    return version
+
+
+def _switch(version: pathlib.Path) -> None:
+    """Atomically point the `current` link to a staged version."""
+    link: pathlib.Path = CURRENT_LINK.with_name(f".{CURRENT_LINK.name}.{os.getpid()}")
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.relative_to(CURRENT_LINK.parent))
+    os.replace(link, CURRENT_LINK)
+
+
+def activate(version: pathlib.Path) -> None:
+    """Atomically switch the active egg, together with its signature, to a staged version."""
+    _switch(version)
+    logger.info("Activated egg %s.", version.name)
+
+
+def rollback() -> Optional[pathlib.Path]:
+    """Activate the newest staged version older than the active one.
+
+    The validators of the newest egg are kept in the HTTP cache, so the rolled back egg is
+    used until a new egg is released.
+
+    :returns: The activated version, or `None` if there is no older version.
+    """
+    current: Optional[pathlib.Path] = current_version()
+    older: list[pathlib.Path] = [
+        version for version in versions() if current is None or version.name < current.name
+    ]
+    if not older:
+        return None
+
+    _switch(older[-1])
+    logger.info("Rolled back to egg %s.", older[-1].name)
+    return older[-1]
+
+
+def _prune() -> None:
+    """Remove the oldest staged versions, keeping the configured number of them."""
+    current: Optional[pathlib.Path] = current_version()
+    staged: list[pathlib.Path] = [version for version in versions() if version != current]
+    keep: int = max(config.get().egg.keep_versions - 1, 0)
+    for version in staged[: max(len(staged) - keep, 0)]:
+        logger.debug("Removing old egg %s.", version)
+        shutil.rmtree(version, ignore_errors=True)
+
+
+def _migrate_legacy() -> None:
+    """Stage the active egg of an older version of the client as the first version.
+
+    The egg was verified when it was activated, and it is verified again before it is staged.
+    If the signature does not match, the egg is left in place and a new one is downloaded.
+    """
+    if TRUSTED_EGG_PATH.exists() or not LEGACY_EGG_PATH.exists():
+        return
+    logger.info("Migrating the egg %s into a staged version.", LEGACY_EGG_PATH)
+
+    VERSIONS_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    incoming = pathlib.Path(tempfile.mkdtemp(dir=VERSIONS_DIRECTORY, prefix=".incoming-"))
+    try:
+        shutil.copyfile(LEGACY_EGG_PATH, incoming / EGG_FILENAME)
+        shutil.copyfile(LEGACY_SIG_PATH, incoming / SIG_FILENAME)
+    except OSError as exc:
+        logger.warning("Could not migrate the egg %s: %s", LEGACY_EGG_PATH, exc)
+        shutil.rmtree(incoming)
+        return
+    if not verify_signature(incoming / EGG_FILENAME, incoming / SIG_FILENAME):
+        logger.warning("The signature of %s does not match, not migrating it.", LEGACY_EGG_PATH)
+        shutil.rmtree(incoming)
+        return
+
+    activate(_stage(incoming))
+    LEGACY_EGG_PATH.unlink()
+    LEGACY_SIG_PATH.unlink()
+
+
 def _remove_gpg_home(home: str) -> None:
     """Clean GPG's temporary home directory."""
     shutdown_process = subprocess.run(
@@ -99,8 +295,8 @@ def _remove_gpg_home(home: str) -> None:
     )
     if shutdown_process.returncode != 0:
         logger.debug(
-            "Could not clean GPG's temporary home, "
-            f"'gpgconf' exited with code '{shutdown_process.returncode}'"
+            "Could not clean GPG's temporary home, 'gpgconf' exited with code '%d'",
+            shutdown_process.returncode,
         )
         return
 
@@ -117,7 +313,17 @@ def _format_subprocess_std(process: subprocess.CompletedProcess) -> str:
     )
 
 
-def _verify_egg_signature(egg: pathlib.Path, signature: pathlib.Path) -> bool:
+class _LazyStd:
+    """Standard output and error of a subprocess, formatted only when the record is emitted."""
+
+    def __init__(self, process: subprocess.CompletedProcess):
+        self.process = process
+
+    def __str__(self) -> str:
+        return _format_subprocess_std(self.process)
+
+
+def verify_signature(egg: pathlib.Path, signature: pathlib.Path) -> bool:
     """Verify the GPG signature of an egg.
 
     :returns bool: `True` if the signature matches.
@@ -131,7 +337,7 @@ def _verify_egg_signature(egg: pathlib.Path, signature: pathlib.Path) -> bool:
         text=True,
     )
     if import_process.returncode != 0:
-        logger.debug(f"Could not import the GPG key.\n{_format_subprocess_std(import_process)}")
+        logger.debug("Could not import the GPG key.\n%s", _LazyStd(import_process))
         _remove_gpg_home(home)
         return False
 
@@ -142,7 +348,7 @@ def _verify_egg_signature(egg: pathlib.Path, signature: pathlib.Path) -> bool:
     )
     if verify_process.returncode != 0:
         logger.debug(
-            f"Verification of the GPG signature failed.\n{_format_subprocess_std(verify_process)}"
+            "Verification of the GPG signature failed.\n%s", _LazyStd(verify_process)
         )
         _remove_gpg_home(home)
         return False
@@ -150,46 +356,109 @@ def _verify_egg_signature(egg: pathlib.Path, signature: pathlib.Path) -> bool:
     return True
 
 
+def _save_update_result(result: EggUpdateResult) -> None:
+    """Remember the result of the update for processes waiting for it."""
+    try:
+        with UPDATE_RESULT_PATH.open("w") as f:
+            json.dump({"result": result.name, "timestamp": time.time()}, f)
+    except OSError as exc:
+        logger.debug("Could not save the egg update result: %s", exc)
+
+
+def _load_update_result(*, since: float) -> Optional[EggUpdateResult]:
+    """Load the result of an update that finished after the timestamp."""
+    try:
+        with UPDATE_RESULT_PATH.open("r") as f:
+            data: dict = json.load(f)
+        if data["timestamp"] < since:
+            return None
+        return EggUpdateResult[data["result"]]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
 def update(*, force: bool = False) -> EggUpdateResult:
     """Update the egg to a new release.
 
+    Only one process updates the egg at a time. A process that has to wait for another one
+    reuses its result instead of downloading the egg again.
+
     :param force: Always download the egg, even if it already exists locally.
     """
+    requested: float = time.time()
+    with lock.Lock("egg-update") as update_lock:
+        if update_lock.contended and not force:
+            previous: Optional[EggUpdateResult] = _load_update_result(since=requested)
+            if previous is not None:
+                logger.info("The egg was updated by another process: %s", previous.value)
+                return previous
+
+        result: EggUpdateResult = _update(force=force)
+        _save_update_result(result)
+        return result
+
+
+def _update(*, force: bool = False) -> EggUpdateResult:
     logger.info("Updating the Egg.")
-    # 1. Fetch the egg and signature into `untrusted.egg`
+    # 1. Fetch the egg (or rebuild it from a delta) and signature into an incoming directory
     # 2. Verify the signature
-    # 3. Rename it as `current.egg`
+    # 3. Stage the directory as a new version
+    # 4. Point the `current` link to it
 
     route: module_update_router.Route = _get_route()
 
+    _migrate_legacy()
+    VERSIONS_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    incoming = pathlib.Path(tempfile.mkdtemp(dir=VERSIONS_DIRECTORY, prefix=".incoming-"))
+
+    rebuilt: bool = False
     try:
-        update_status: EggUpdateResult = _update_egg(route=route, force=force)
+        update_status: Optional[EggUpdateResult] = None
+        if TRUSTED_EGG_PATH.exists() and not force and config.get().egg.delta:
+            update_status = _update_egg_from_delta(route=route, directory=incoming)
+            rebuilt = update_status == EggUpdateResult.UPDATE_SUCCESS
+        if update_status is None:
+            update_status = _update_egg(route=route, directory=incoming, force=force)
     except Exception:
         logger.exception("Egg update failed.")
+        shutil.rmtree(incoming)
+        insights.Insights().forget_egg(route)
         return EggUpdateResult.FETCH_FAILED
 
     if update_status == EggUpdateResult.NO_UPDATE_NEEDED:
         logger.info("Local egg is already up to date.")
+        shutil.rmtree(incoming)
         return EggUpdateResult.NO_UPDATE_NEEDED
 
     try:
-        _update_egg_signature(route=route)
+        _update_egg_signature(route=route, directory=incoming)
     except Exception:
         logger.exception("Egg signature update failed.")
+        shutil.rmtree(incoming)
+        insights.Insights().forget_egg(route)
         return EggUpdateResult.FETCH_FAILED
 
-    ok: bool = _verify_egg_signature(UNTRUSTED_EGG_PATH, UNTRUSTED_SIG_PATH)
+    ok: bool = verify_signature(incoming / EGG_FILENAME, incoming / SIG_FILENAME)
+    if not ok and rebuilt:
+        logger.warning("The egg rebuilt from the delta is not signed, downloading the whole egg.")
+        try:
+            _update_egg(route=route, directory=incoming, force=True)
+        except Exception:
+            logger.exception("Egg update failed.")
+            shutil.rmtree(incoming)
+            insights.Insights().forget_egg(route)
+            return EggUpdateResult.FETCH_FAILED
+        ok = verify_signature(incoming / EGG_FILENAME, incoming / SIG_FILENAME)
     if not ok:
         logger.debug(
             "Cryptographic verification failed, removing both the egg and its signature."
         )
-        UNTRUSTED_EGG_PATH.unlink(missing_ok=True)
-        UNTRUSTED_SIG_PATH.unlink(missing_ok=True)
+        shutil.rmtree(incoming)
+        insights.Insights().forget_egg(route)
         return EggUpdateResult.VERIFICATION_FAILED
 
-    logger.debug("Moving the verified egg in place.")
-    shutil.move(UNTRUSTED_EGG_PATH, TRUSTED_EGG_PATH)
-    shutil.move(UNTRUSTED_SIG_PATH, TRUSTED_SIG_PATH)
+    activate(_stage(incoming))
+    _prune()
     return EggUpdateResult.UPDATE_SUCCESS
 
 
@@ -207,7 +476,7 @@ class Egg:
         :param path: Path to the egg file. If `None`, it is automatically discovered.
         """
         if path is None:
-            path = type(self)._discover_path()
+            path = type(self).discover_path()
         self.path = path
 
         logger.info(
@@ -227,14 +496,15 @@ class Egg:
         return ":".join(paths)
 
     @classmethod
-    def _discover_path(cls) -> pathlib.Path:
+    def discover_path(cls) -> pathlib.Path:
         """Get the path to the egg that should be used.
 
         If en `EGG` environment variable is set, the path it points to will be used as the egg.
         If it does not exist, `RuntimeError` will be raised.
 
         Otherwise,
-        - the CURRENT (the latest downloaded version) or
+        - the CURRENT (the latest downloaded version),
+        - the LEGACY (the egg of an older client, until the next update migrates it) or
         - the RPM (the egg shipped with the RPM package)
         will be used.
 
@@ -250,13 +520,15 @@ class Egg:
             raise RuntimeError("The ENV egg could not be found.")
 
         paths: dict[str, pathlib.Path] = {
-            "CURRENT": TRUSTED_EGG_PATH,
+            # Resolve the link, so the run is not affected by an egg activated in the meantime
+            "CURRENT": CURRENT_LINK.resolve() / EGG_FILENAME,
+            "LEGACY": LEGACY_EGG_PATH,
             "RPM": config.get().egg.metadata_directory / "rpm.egg",
         }
 
         for name, path in paths.items():
             if path.exists():
-                logger.debug(f"Using the {name} egg.")
+                logger.debug("Using the %s egg.", name)
                 return path
 
         raise RuntimeError("No egg found.")
@@ -289,7 +561,7 @@ class Egg:
         )
         if version_process.returncode != 0:
             logger.error(
-                f"Could not query for the egg version.\n{_format_subprocess_std(version_process)}"
+                "Could not query for the egg version.\n%s", _LazyStd(version_process)
             )
             raise RuntimeError("Could not query for the egg version.")
 
@@ -300,21 +572,29 @@ class Egg:
 
     def run(self, command: str) -> dict:
         """Run a specific Core command."""
-        logger.debug(f"Running Core command '{command}'.")
-
-        now: float = time.time()
-        run_process = subprocess.run(
-            ["python3", "-m", "insights.client.phase.v2", command],
-            env={"PYTHONPATH": self.pythonpath},
-            capture_output=True,
-            text=True,
-        )
-        delta: float = time.time() - now
+        logger.debug("Running Core command '%s'.", command)
+
+        with lock.Lock(f"core-{command}") as core_lock, resources.Governor(command) as governor:
+            now: float = time.time()
+            run_process = subprocess.run(
+                governor.command(["python3", "-m", "insights.client.phase.v2", command]),
+                env={"PYTHONPATH": self.pythonpath},
+                capture_output=True,
+                text=True,
+            )
+            delta: float = time.time() - now
+        metrics.set_gauge("core_exit_status", run_process.returncode, command=command)
+        metrics.set_gauge("phase_duration_seconds", delta, phase=f"core:{command}")
         if run_process.returncode != 0:
             logger.error("Could not run Core command.")
             raise RuntimeError("Could not run Core.")
 
-        logger.debug(f"Core command '{command}' took {delta * 100:.1f} ms.")
+        logger.debug(
+            "Core command '%s' took %.1f ms (waited %.1f ms for the lock).",
+            command,
+            delta * 1000,
+            core_lock.wait_time * 1000,
+        )
 
         return json.loads(run_process.stdout)
 
@@ -324,20 +604,52 @@ class Egg:
         :param app: An app module. E.g. `ansible.playbook_verifier`.
         :param argv: `argv` passed to the application.
         """
-        logger.debug(f"Running Core app '{app}'.")
-
-        now: float = time.time()
-        run_process = subprocess.run(
-            ["python3", "-m", f"insights.client.apps.{app}", *argv],
-            env={"PYTHONPATH": f"{self.path!s}"},
-            capture_output=True,
-            text=True,
-        )
-        delta: float = time.time() - now
+        logger.debug("Running Core app '%s'.", app)
+
+        with resources.Governor(f"app:{app}") as governor:
+            now: float = time.time()
+            run_process = subprocess.run(
+                governor.command(["python3", "-m", f"insights.client.apps.{app}", *argv]),
+                env={"PYTHONPATH": f"{self.path!s}"},
+                capture_output=True,
+                text=True,
+            )
+            delta: float = time.time() - now
+        metrics.set_gauge("core_exit_status", run_process.returncode, command=f"app:{app}")
+        metrics.set_gauge("phase_duration_seconds", delta, phase=f"core:app:{app}")
         if run_process.returncode != 0:
             logger.error("Could not run Core application.")
             raise RuntimeError("Could not run Core.")
 
-        logger.debug(f"Core application '{app}' took {delta * 100:.1f} ms.")
+        logger.debug("Core application '%s' took %.1f ms.", app, delta * 1000)
+
+        return run_process
+
+    def run_script(self, name: str, script: str, *, input: str) -> subprocess.CompletedProcess:
+        """Run a Python script with Core importable, e.g. to process many items in one run.
+
+        :param name: Name of the script, used in logs and metrics.
+        :param script: Source code of the script.
+        :param input: Standard input of the script.
+        """
+        logger.debug("Running Core script '%s'.", name)
+
+        with resources.Governor(f"script:{name}") as governor:
+            now: float = time.time()
+            run_process = subprocess.run(
+                governor.command(["python3", "-c", script]),
+                env={"PYTHONPATH": f"{self.path!s}"},
+                input=input,
+                capture_output=True,
+                text=True,
+            )
+            delta: float = time.time() - now
+        metrics.set_gauge("core_exit_status", run_process.returncode, command=f"script:{name}")
+        metrics.set_gauge("phase_duration_seconds", delta, phase=f"core:script:{name}")
+        if run_process.returncode != 0:
+            logger.error("Could not run Core script.\n%s", _LazyStd(run_process))
+            raise RuntimeError("Could not run Core.")
+
+        logger.debug("Core script '%s' took %.1f ms.", name, delta * 1000)
 
         return run_process
@@ -0,0 +1,277 @@
+"""Native collection of canonical facts.
+
+Check-ins only need the canonical facts identifying the host. Running Core to collect them takes
+seconds, while reading them here takes milliseconds. The facts are read from the same sources
+Core uses and serialized in the schema of Core's `checkin` command; whenever a fact cannot be
+collected reliably, Core is used instead.
+
+The output can be checked against Core with `python3 -m insights_nest._devel.facts`.
+"""
+
+import configparser
+import fcntl
+import json
+import logging
+import pathlib
+import socket
+import struct
+import subprocess
+import time
+import uuid
+from typing import Optional
+
+from insights_nest import config
+from insights_nest import metrics
+from insights_nest._core import egg
+
+logger = logging.getLogger(__name__)
+
+FIELDS: tuple[str, ...] = (
+    "insights_id",
+    "subscription_manager_id",
+    "satellite_id",
+    "bios_uuid",
+    "ip_addresses",
+    "fqdn",
+    "mac_addresses",
+    "provider_id",
+    "provider_type",
+)
+"""Canonical facts in the order Core emits them."""
+
+DMI_DIRECTORY = pathlib.Path("/sys/class/dmi/id")
+NET_DIRECTORY = pathlib.Path("/sys/class/net")
+PROC_NET_DIRECTORY = pathlib.Path("/proc/net")
+
+CLOUD_VENDORS: tuple[str, ...] = ("amazon", "microsoft", "google", "alibaba", "openstack")
+"""DMI vendors of cloud instances. Core asks the provider for its instance ID there."""
+
+RHSM_DEFAULT_HOSTNAME = "subscription.rhsm.redhat.com"
+
+_SIOCGIFADDR = 0x8915
+_IFF_UP, _IFF_LOOPBACK = 0x1, 0x8
+
+
+class Unsure(Exception):
+    """A fact cannot be collected the same way Core collects it."""
+
+
+def _read(path: pathlib.Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        raise Unsure(f"{path} is not readable: {exc}")
+
+
+def _valid_uuid(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return None
+    return value
+
+
+def _insights_id() -> Optional[str]:
+    return _valid_uuid(_read(config.get().egg.metadata_directory / "machine-id"))
+
+
+def _subscription_manager_id() -> Optional[str]:
+    """Read the consumer UUID from the subject of the RHSM identity certificate."""
+    certificate: pathlib.Path = config.get().network.identity_certificate
+    if not certificate.exists():
+        return None
+    # The standard library does not decode certificates loaded from files
+    try:
+        process = subprocess.run(
+            ["openssl", "x509", "-in", f"{certificate!s}", "-noout", "-subject"]
+            + ["-nameopt", "sep_multiline,utf8,lname"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise Unsure(f"Could not run openssl: {exc}")
+    if process.returncode != 0:
+        raise Unsure(f"Could not decode {certificate}: {process.stderr.strip()}")
+    for line in process.stdout.splitlines()[1:]:
+        key, _, value = line.strip().partition("=")
+        if key == "commonName":
+            return _valid_uuid(value)
+    raise Unsure(f"{certificate} has no common name.")
+
+
+def _satellite_id() -> None:
+    """Core reads the Satellite ID from the Satellite registration; that is not reproduced."""
+    rhsm_cfg = configparser.ConfigParser()
+    try:
+        with open(config.RHSM_CONFIGURATION_FILE_PATH) as f:
+            rhsm_cfg.read_file(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, configparser.Error) as exc:
+        raise Unsure(f"Could not read {config.RHSM_CONFIGURATION_FILE_PATH}: {exc}")
+    hostname: str = rhsm_cfg.get("server", "hostname", fallback="").strip()
+    if hostname and hostname != RHSM_DEFAULT_HOSTNAME:
+        raise Unsure(f"The host is registered to '{hostname}', possibly a Satellite.")
+    return None
+
+
+def _bios_uuid() -> Optional[str]:
+    """Read the system UUID in the format of `dmidecode -s system-uuid`, which Core runs."""
+    if not DMI_DIRECTORY.exists():
+        return None
+    value: Optional[str] = _read(DMI_DIRECTORY / "product_uuid")
+    if not value:
+        return None
+    if set(value.replace("-", "")) <= {"0"} or set(value.replace("-", "").lower()) <= {"f"}:
+        # dmidecode reports such UUIDs as 'Not Settable' or 'Not Present'
+        return None
+    return _valid_uuid(value.upper())
+
+
+def _interfaces() -> list[str]:
+    return [name for _, name in sorted(socket.if_nameindex())]
+
+
+def _interface_flags(name: str) -> int:
+    flags: Optional[str] = _read(NET_DIRECTORY / name / "flags")
+    return int(flags, 16) if flags else 0
+
+
+def _ip_addresses() -> list[str]:
+    """List the addresses like `hostname -I`, which Core runs.
+
+    IPv4 addresses come first, in the order of the interfaces, then global IPv6 addresses.
+    Loopback and interfaces which are down are skipped.
+    """
+    interfaces: list[str] = []
+    for name in _interfaces():
+        if _interface_flags(name) & (_IFF_UP | _IFF_LOOPBACK) == _IFF_UP:
+            interfaces.append(name)
+
+    ipv4: list[str] = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for name in interfaces:
+            request: bytes = struct.pack("256s", name.encode("utf-8")[:15])
+            try:
+                response: bytes = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, request)
+            except OSError:
+                continue
+            ipv4.append(socket.inet_ntoa(response[20:24]))
+
+    # The ioctl only reports the primary address of each interface
+    local: Optional[str] = _read(PROC_NET_DIRECTORY / "fib_trie")
+    if local is not None:
+        addresses: set[str] = set()
+        lines: list[str] = local.splitlines()
+        for previous, line in zip(lines, lines[1:]):
+            if "/32 host LOCAL" in line:
+                address: str = previous.strip().split()[-1]
+                if not address.startswith("127."):
+                    addresses.add(address)
+        if addresses != set(ipv4):
+            raise Unsure("Some interface has more than one IPv4 address.")
+
+    ipv6: list[str] = []
+    records: Optional[str] = _read(PROC_NET_DIRECTORY / "if_inet6")
+    by_interface: dict[str, list[str]] = {}
+    for record in (records or "").splitlines():
+        address, _, _, scope, _, name = record.split()
+        if scope != "00":
+            continue
+        by_interface.setdefault(name, []).append(
+            socket.inet_ntop(socket.AF_INET6, bytes.fromhex(address))
+        )
+    for name in interfaces:
+        ipv6.extend(by_interface.get(name, []))
+
+    return ipv4 + ipv6
+
+
+def _fqdn() -> str:
+    """Get the canonical name of the host like `hostname -f`, which Core runs."""
+    hostname: str = socket.gethostname()
+    try:
+        return socket.getaddrinfo(hostname, None, flags=socket.AI_CANONNAME)[0][3] or hostname
+    except OSError:
+        return hostname
+
+
+def _mac_addresses() -> list[str]:
+    """Read the hardware addresses of all interfaces, skipping empty ones."""
+    addresses: list[str] = []
+    for path in sorted(NET_DIRECTORY.glob("*/address")):
+        address: Optional[str] = _read(path)
+        if address and address != "00:00:00:00:00:00" and address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+def _check_provider() -> None:
+    """Core adds the instance ID of cloud instances; that is not reproduced."""
+    for name in ("sys_vendor", "bios_vendor", "chassis_vendor", "chassis_asset_tag"):
+        value: str = (_read(DMI_DIRECTORY / name) or "").lower()
+        if any(vendor in value for vendor in CLOUD_VENDORS):
+            raise Unsure(f"The host looks like a cloud instance ({name}: '{value}').")
+        if value == "7783-7084-3265-9085-8269-3286-77":
+            raise Unsure("The host looks like an Azure instance.")
+
+
+def collect() -> Optional[dict]:
+    """Collect the canonical facts natively.
+
+    :returns: The facts, or None if some of them cannot be collected the way Core does.
+    """
+    now: float = time.time()
+    try:
+        _check_provider()
+        facts: dict = {
+            "insights_id": _insights_id(),
+            "subscription_manager_id": _subscription_manager_id(),
+            "satellite_id": _satellite_id(),
+            "bios_uuid": _bios_uuid(),
+            "ip_addresses": _ip_addresses(),
+            "fqdn": _fqdn(),
+            "mac_addresses": _mac_addresses(),
+            "provider_id": None,
+            "provider_type": None,
+        }
+    except Unsure as exc:
+        logger.debug("Canonical facts cannot be collected natively: %s", exc)
+        return None
+
+    metrics.set_gauge("phase_duration_seconds", time.time() - now, phase="native:checkin")
+    # Core leaves out facts without a value
+    return {field: facts[field] for field in FIELDS if facts[field]}
+
+
+def get_canonical_facts() -> dict:
+    """Collect the canonical facts, natively if possible, with Core otherwise.
+
+    :raises RuntimeError: Core could not be run.
+    """
+    if config.get().egg.native_facts:
+        facts: Optional[dict] = collect()
+        if facts is not None:
+            metrics.inc("canonical_facts_total", source="native")
+            return facts
+
+    facts = egg.Egg().run("checkin")
+    metrics.inc("canonical_facts_total", source="core")
+    return facts
+
+
+def compare(native: dict, core: dict) -> list[str]:
+    """Describe differences between natively collected facts and output of Core."""
+    differences: list[str] = []
+    for field in sorted(set(native) | set(core)):
+        if native.get(field) != core.get(field):
+            differences.append(f"{field}: native {native.get(field)!r}, Core {core.get(field)!r}")
+    if not differences and json.dumps(native) != json.dumps(core):
+        differences.append(f"order: native {list(native)}, Core {list(core)}")
+    return differences
+
@@ -0,0 +1,271 @@
+"""Bulk changes of Inventory hosts, e.g. renaming or deleting thousands of them.
+
+Changes are sent concurrently over a pool of connections (see `AsyncConnection`). The number
+of requests in flight adapts to the server: it grows by one per round of successful requests,
+and halves whenever the server answers with 429 Too Many Requests (additive increase,
+multiplicative decrease).
+
+Finished changes are appended to a journal. An interrupted run started again with the same
+journal skips the hosts that were already changed, and retries the failed ones.
+"""
+
+import asyncio
+import csv
+import dataclasses
+import json
+import logging
+import pathlib
+import time
+from typing import Iterator, Optional
+
+from insights_nest import metrics
+from insights_nest.api import connection
+from insights_nest.api import inventory
+from insights_nest.api.connection import Response
+
+logger = logging.getLogger(__name__)
+
+NAME_COLUMNS: tuple[str, ...] = ("display_name", "ansible_name")
+"""Columns of the CSV files with names, named after the parameters of `update_host`."""
+
+PROGRESS_INTERVAL: float = 10.0
+"""Seconds between progress reports."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Change:
+    insights_id: str
+    """The Insights Inventory UUID of the host."""
+    names: Optional[dict[str, str]]
+    """Names to set, by the parameters of `update_host`. `None` deletes the host."""
+
+    @property
+    def key(self) -> str:
+        """Identify the change in the journal."""
+        if self.names is None:
+            return f"{self.insights_id}:delete"
+        return f"{self.insights_id}:{json.dumps(self.names, sort_keys=True)}"
+
+
+@dataclasses.dataclass
+class Summary:
+    total: int = 0
+    changed: int = 0
+    skipped: int = 0
+    """Number of changes done by a previous run, according to the journal."""
+    missing: int = 0
+    """Number of hosts which were not found."""
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Number of processed changes per second."""
+        done: int = self.changed + self.missing + self.failed
+        return done / self.seconds if self.seconds > 0 else 0.0
+
+
+def _read_csv(path: pathlib.Path) -> Iterator[dict[str, str]]:
+    """Read the rows of a CSV file with a header.
+
+    :raises ValueError: The file has no `id` column.
+    """
+    with path.open("r", newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or "id" not in reader.fieldnames:
+            raise ValueError(f"{path} has no 'id' column.")
+        for row in reader:
+            if (row.get("id") or "").strip():
+                yield row
+
+
+def read_names(path: pathlib.Path) -> list[Change]:
+    """Read new names of the hosts from a CSV file.
+
+    The file has an `id` column and one or more of the `NAME_COLUMNS`; empty cells keep the
+    name. All the rows of a host are merged into one change, later rows overriding earlier ones.
+
+    :raises ValueError: The file has no `id` column or no column with names.
+    """
+    names: dict[str, dict[str, str]] = {}
+    for row in _read_csv(path):
+        if not set(NAME_COLUMNS) & set(row):
+            raise ValueError(f"{path} has none of the columns {', '.join(NAME_COLUMNS)}.")
+        host: dict[str, str] = names.setdefault(row["id"].strip(), {})
+        for column in NAME_COLUMNS:
+            value: Optional[str] = row.get(column)
+            if value:
+                host[column] = value
+    return [Change(insights_id, host) for insights_id, host in names.items() if host]
+
+
+def read_deletions(path: pathlib.Path) -> list[Change]:
+    """Read the hosts to delete from a CSV file with an `id` column.
+
+    :raises ValueError: The file has no `id` column.
+    """
+    ids: dict[str, None] = {row["id"].strip(): None for row in _read_csv(path)}
+    return [Change(insights_id, None) for insights_id in ids]
+
+
+class Journal:
+    """Append-only record of finished changes, one JSON object per line."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+
+    def done(self) -> set[str]:
+        """Get the keys of the changes which succeeded in previous runs."""
+        keys: set[str] = set()
+        try:
+            with self.path.open("r") as f:
+                for line in f:
+                    try:
+                        entry: dict = json.loads(line)
+                    except ValueError:
+                        # The line may be cut short by an interrupted run
+                        continue
+                    if entry.get("result") in ("changed", "missing"):
+                        keys.add(entry["key"])
+        except FileNotFoundError:
+            pass
+        return keys
+
+    def record(self, change: Change, result: str, status: Optional[int]) -> None:
+        entry: dict = {"key": change.key, "result": result, "status": status, "time": time.time()}
+        with self.path.open("a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class AdaptiveLimit:
+    """Limit of concurrent operations with additive increase and multiplicative decrease.
+
+    :param maximum: The highest limit, also the initial one.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum: int = max(maximum, 1)
+        self.limit: float = float(self.maximum)
+        self._running: int = 0
+        self._decreased: float = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot.
+
+        :returns: The time the operation started, for `release`.
+        """
+        condition: asyncio.Condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._running < int(self.limit))
+            self._running += 1
+        return time.monotonic()
+
+    async def release(self, started: float, *, throttled: bool) -> None:
+        """Free the slot, adapting the limit to the outcome of the operation."""
+        condition: asyncio.Condition = self._get_condition()
+        async with condition:
+            self._running -= 1
+            if throttled:
+                # Operations started before the last decrease saw the old limit, do not
+                # decrease it again for them
+                if started > self._decreased:
+                    self.limit = max(self.limit / 2, 1.0)
+                    self._decreased = time.monotonic()
+                    logger.debug("Server is overloaded, lowering concurrency to %d.", self.limit)
+            else:
+                self.limit = min(self.limit + 1 / self.limit, float(self.maximum))
+            condition.notify_all()
+
+
+async def _apply(client: inventory.AsyncInventory, change: Change) -> Response:
+    if change.names is None:
+        return await client.delete_host(change.insights_id)
+    return await client.update_host(change.insights_id, **change.names)
+
+
+async def _run(changes: list[Change], *, jobs: int, journal: Journal, summary: Summary) -> None:
+    done: set[str] = journal.done()
+    pending: Iterator[Change] = iter(changes)
+    limit = AdaptiveLimit(jobs)
+    started: float = time.monotonic()
+    reported: float = started
+
+    async def worker(client: inventory.AsyncInventory) -> None:
+        nonlocal reported
+        for change in pending:
+            if change.key in done:
+                summary.skipped += 1
+                continue
+
+            # Respect Retry-After of earlier responses, even for new requests
+            wait: float = connection.backoff_until() - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            throttled_before: int = connection.too_many_requests()
+            slot: float = await limit.acquire()
+            status: Optional[int] = None
+            try:
+                response: Response = await _apply(client, change)
+                status = response.status
+            except (OSError, asyncio.TimeoutError) as exc:
+                logger.debug("Could not change host %s: %s", change.insights_id, exc)
+            finally:
+                throttled: bool = connection.too_many_requests() > throttled_before
+                await limit.release(slot, throttled=throttled)
+
+            if status is not None and 200 <= status < 300:
+                result: str = "changed"
+                summary.changed += 1
+            elif status == 404:
+                result = "missing"
+                summary.missing += 1
+            else:
+                result = "failed"
+                summary.failed += 1
+                logger.debug("Could not change host %s, status %s.", change.insights_id, status)
+            journal.record(change, result, status)
+            metrics.inc("fleet_changes_total", result=result)
+
+            now: float = time.monotonic()
+            if now - reported >= PROGRESS_INTERVAL:
+                reported = now
+                summary.seconds = now - started
+                logger.info(
+                    "%d of %d hosts processed, %.0f hosts/s, %d requests in flight allowed.",
+                    summary.changed + summary.missing + summary.failed + summary.skipped,
+                    summary.total,
+                    summary.rate,
+                    limit.limit,
+                )
+
+    async with inventory.AsyncInventoryConnection(concurrency=jobs) as pool:
+        client = inventory.AsyncInventory(pool)
+        await asyncio.gather(*(worker(client) for _ in range(jobs)))
+    summary.seconds = time.monotonic() - started
+
+
+def run(changes: list[Change], *, jobs: int, journal: pathlib.Path) -> Summary:
+    """Apply the changes, skipping those already done according to the journal.
+
+    :param jobs: Maximal number of requests in flight.
+    :param journal: Path to the journal; it is created if it does not exist.
+    """
+    summary = Summary(total=len(changes))
+    asyncio.run(_run(changes, jobs=max(jobs, 1), journal=Journal(journal), summary=summary))
+    logger.info(
+        "Changed %d hosts (%d not found, %d failed, %d done before) in %.1f s, %.0f hosts/s.",
+        summary.changed,
+        summary.missing,
+        summary.failed,
+        summary.skipped,
+        summary.seconds,
+        summary.rate,
+    )
+    return summary
@@ -0,0 +1,71 @@
+import fcntl
+import logging
+import os
+import pathlib
+import time
+from typing import Optional
+
+from insights_nest import config
+from insights_nest import metrics
+
+logger = logging.getLogger(__name__)
+
+LOCK_DIRECTORY: pathlib.Path = config.get().egg.egg_directory / ".locks"
+
+
+class Lock:
+    """Exclusive lock shared between processes, backed by `flock(2)`.
+
+    The lock is released automatically when the process exits, even if it crashes.
+
+    >>> with Lock("egg-update") as lock:
+    ...     if lock.contended:
+    ...         ...  # another process was holding the lock while we were waiting
+
+    :param name: Name of the lock, used as its file name.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path: pathlib.Path = LOCK_DIRECTORY / f"{name}.lock"
+        self.contended: bool = False
+        """Whether the lock was held by another process when we tried to acquire it."""
+        self.wait_time: float = 0.0
+        """Seconds spent waiting for the lock."""
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        """Acquire the lock, waiting for other processes to release it."""
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as exc:
+            # E.g. a read-only or full file system
+            logger.warning("Could not create lock %s, continuing without it: %s", self.path, exc)
+            return
+
+        now: float = time.monotonic()
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.contended = True
+            logger.info("Waiting for another process to release the lock '%s'.", self.name)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self.wait_time = time.monotonic() - now
+
+        metrics.set_gauge("lock_wait_seconds", self.wait_time, lock=self.name)
+        logger.debug("Acquired lock '%s' after %.1f ms.", self.name, self.wait_time * 1000)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "Lock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
@@ -0,0 +1,204 @@
+"""Verification of many Ansible playbooks at once.
+
+Playbooks are verified by Core's `ansible.playbook_verifier` app. Instead of starting Core once
+per playbook, the playbooks are sent as JSON lines to one Core process (or a few of them in
+parallel), which verifies them one after another.
+
+Successfully verified playbooks are remembered by the digest of their content, the fingerprint
+of the verification key and the version of the egg, so unchanged playbooks are not verified
+again until the key or the egg changes. Both are read from the egg file, Core is only started
+when some playbook has to be verified. The cache is ignored unless it is owned by us and
+nobody else can write to it, as it lets playbooks skip the verification.
+"""
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import time
+import zipfile
+from typing import Optional
+
+from insights_nest import config
+from insights_nest._core import egg
+
+logger = logging.getLogger(__name__)
+
+VERIFIED_CACHE_PATH: pathlib.Path = config.CACHE_DIRECTORY_PATH / "verified-playbooks.json"
+VERIFIED_CACHE_SIZE: int = 10_000
+"""Maximal number of remembered playbooks; the oldest ones are forgotten first."""
+
+PUBLIC_KEY_PATH = "insights/client/apps/ansible/playbook_verifier/public.gpg"
+"""Path to the playbook verification key within the egg."""
+
+_WORKER = """\
+import json, sys
+from insights.client.apps.ansible.playbook_verifier import loadPlaybookYaml, verify
+
+for line in sys.stdin:
+    request = json.loads(line)
+    try:
+        verify(loadPlaybookYaml(request["content"]))
+        result = {"index": request["index"], "verified": True, "error": None}
+    except (Exception, SystemExit) as exc:
+        result = {"index": request["index"], "verified": False, "error": str(exc) or repr(exc)}
+    print(json.dumps(result), flush=True)
+"""
+"""Script verifying playbooks received as JSON lines, reporting the results as JSON lines."""
+
+
+@dataclasses.dataclass
+class Result:
+    playbook: str
+    """Path to the playbook, or `-` for the standard input."""
+    sha256: str
+    verified: bool
+    cached: bool
+    """Whether the result was remembered from an earlier verification."""
+    error: Optional[str] = None
+
+
+def key_fingerprint(egg_path: pathlib.Path) -> str:
+    """Get the fingerprint of the verification key shipped in the egg.
+
+    If the egg has no key at the expected path, the digest of the whole egg is used.
+    """
+    try:
+        with zipfile.ZipFile(egg_path) as archive:
+            return hashlib.sha256(archive.read(PUBLIC_KEY_PATH)).hexdigest()
+    except (KeyError, OSError, zipfile.BadZipFile):
+        logger.debug("Could not read the verification key from %s.", egg_path)
+    with egg_path.open("rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def egg_version(egg_path: pathlib.Path) -> str:
+    """Get the version of the egg without running it.
+
+    If the egg does not contain its version, the digest of the whole egg is used.
+    """
+    try:
+        info: dict[str, str] = egg.read_package_info(egg_path)
+    except (OSError, zipfile.BadZipFile):
+        info = {}
+    if "VERSION" in info:
+        return "-".join(info.get(key, "") for key in ("VERSION", "RELEASE", "COMMIT"))
+    with egg_path.open("rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_cache() -> dict[str, float]:
+    try:
+        if not config.is_trusted(VERIFIED_CACHE_PATH.parent) or not config.is_trusted(
+            VERIFIED_CACHE_PATH
+        ):
+            logger.debug("Ignoring %s with unsafe owner.", VERIFIED_CACHE_PATH)
+            return {}
+        with VERIFIED_CACHE_PATH.open("r") as f:
+            return dict(json.load(f))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, TypeError) as exc:
+        logger.debug("Ignoring unreadable %s: %s", VERIFIED_CACHE_PATH, exc)
+        return {}
+
+
+def _save_cache(verified: dict[str, float]) -> None:
+    newest = sorted(verified.items(), key=lambda item: item[1])[-VERIFIED_CACHE_SIZE:]
+    try:
+        VERIFIED_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=VERIFIED_CACHE_PATH.parent, prefix=".verified.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(dict(newest), f)
+            os.replace(temporary, VERIFIED_CACHE_PATH)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError as exc:
+        logger.debug("Could not save %s: %s", VERIFIED_CACHE_PATH, exc)
+
+
+def _verify_batch(core: egg.Egg, batch: list[tuple[int, str]]) -> dict[int, dict]:
+    """Verify the playbooks in one Core process.
+
+    :param batch: Index and content of each playbook.
+    :returns: Results of the worker by the index of the playbook.
+    """
+    requests: str = "".join(
+        json.dumps({"index": index, "content": content}) + "\n" for index, content in batch
+    )
+    process = core.run_script("ansible.playbook_verifier", _WORKER, input=requests)
+    results: dict[int, dict] = {}
+    for line in process.stdout.splitlines():
+        try:
+            result: dict = json.loads(line)
+        except ValueError:
+            # Core may print other output, e.g. warnings
+            continue
+        if isinstance(result, dict) and "index" in result:
+            results[result["index"]] = result
+    return results
+
+
+def verify(playbooks: list[tuple[str, bytes]], *, jobs: int = 1) -> list[Result]:
+    """Verify the playbooks.
+
+    :param playbooks: Name and content of each playbook.
+    :param jobs: Maximal number of Core processes verifying the playbooks in parallel.
+    :returns: Results in the order of the playbooks.
+    :raises RuntimeError: Core could not be run.
+    """
+    egg_path: pathlib.Path = egg.Egg.discover_path()
+    context: str = f"{key_fingerprint(egg_path)}:{egg_version(egg_path)}"
+    digests: list[str] = [hashlib.sha256(content).hexdigest() for _, content in playbooks]
+    keys: list[str] = [f"{digest}:{context}" for digest in digests]
+
+    verified: dict[str, float] = _load_cache()
+    pending: list[tuple[int, str]] = []
+    outcomes: dict[int, dict] = {}
+    for index, (key, (name, content)) in enumerate(zip(keys, playbooks)):
+        if key in verified:
+            continue
+        try:
+            pending.append((index, content.decode("utf-8")))
+        except UnicodeDecodeError:
+            outcomes[index] = {"verified": False, "error": "The playbook is not valid UTF-8."}
+
+    jobs = max(1, min(jobs, len(pending)))
+    batches: list[list[tuple[int, str]]] = [pending[i::jobs] for i in range(jobs)]
+    if pending:
+        logger.debug("Verifying %d playbooks in %d Core processes.", len(pending), jobs)
+        core = egg.Egg(egg_path)
+        with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+            for batch_outcomes in pool.map(lambda batch: _verify_batch(core, batch), batches):
+                outcomes.update(batch_outcomes)
+
+    results: list[Result] = []
+    now: float = time.time()
+    for index, (key, digest, (name, _)) in enumerate(zip(keys, digests, playbooks)):
+        if key in verified and index not in outcomes:
+            verified[key] = now
+            results.append(Result(playbook=name, sha256=digest, verified=True, cached=True))
+            continue
+        outcome: dict = outcomes.get(
+            index, {"verified": False, "error": "The playbook was not verified."}
+        )
+        if outcome["verified"]:
+            verified[key] = now
+        results.append(
+            Result(
+                playbook=name,
+                sha256=digest,
+                verified=outcome["verified"],
+                cached=False,
+                error=outcome.get("error", None),
+            )
+        )
+
+    _save_cache(verified)
+    return results
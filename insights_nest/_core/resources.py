@@ -0,0 +1,203 @@
+"""Resource governance of Core runs.
+
+Core runs with a lower CPU and IO priority (`nice`, `ionice`), optionally with resource limits
+(`RLIMIT_AS`, `RLIMIT_CPU`), and optionally in a transient systemd scope, whose cgroup v2
+controllers limit its CPU bandwidth (`cpu.max`), memory (`memory.max`) and IO share
+(`io.weight`).
+
+Core is started through a small wrapper which lowers the priority, sets the limits, waits for
+Core and reports its resource usage: CPU time and peak RSS from `wait4(2)` and, in a scope, peak
+memory and throttled CPU time of the cgroup. The client itself runs a logging thread, so nothing
+is done in the forked child before `exec` (`preexec_fn` is not safe with threads).
+
+>>> with Governor("advisor") as governor:
+...     process = subprocess.run(governor.command(argv))
+>>> governor.usage
+{'cpu_seconds': 12.1, 'max_rss_bytes': 412041216}
+"""
+
+import json
+import logging
+import os
+import pathlib
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Optional
+
+from insights_nest import config
+from insights_nest import metrics
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = pathlib.Path("/sys/fs/cgroup")
+
+IO_CLASSES: dict[str, int] = {"realtime": 1, "best-effort": 2, "idle": 3}
+"""`ionice` scheduling classes by their names."""
+
+_WRAPPER = """\
+import json, os, resource, signal, subprocess, sys
+
+path, cgroup, argv = sys.argv[1], sys.argv[2] == "1", sys.argv[6:]
+nice, memory_limit, cpu_time_limit = (int(value) for value in sys.argv[3:6])
+if nice:
+    os.nice(nice)
+if memory_limit:
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+if cpu_time_limit:
+    # The soft limit sends SIGXCPU, the hard one a second later SIGKILL
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit, cpu_time_limit + 1))
+process = subprocess.Popen(argv)
+while True:
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+        break
+    except InterruptedError:
+        pass
+stats = {"cpu_seconds": usage.ru_utime + usage.ru_stime, "max_rss_bytes": usage.ru_maxrss * 1024}
+if os.WIFSIGNALED(status):
+    stats["signal"] = os.WTERMSIG(status)
+if cgroup:
+    try:
+        with open("/proc/self/cgroup") as f:
+            base = "/sys/fs/cgroup" + f.read().strip().rpartition(":")[2]
+        with open(base + "/cpu.stat") as f:
+            for line in f:
+                key, value = line.split()
+                if key == "throttled_usec":
+                    stats["throttled_seconds"] = int(value) / 1e6
+        with open(base + "/memory.peak") as f:
+            stats["memory_peak_bytes"] = int(f.read())
+    except (OSError, ValueError):
+        pass
+with open(path, "w") as f:
+    json.dump(stats, f)
+code = os.waitstatus_to_exitcode(status)
+sys.exit(128 - code if code < 0 else code)
+"""
+"""Script running Core within the limits and writing its resource usage as JSON into a file.
+
+The limits apply to the script too, which uses a negligible share of them.
+"""
+
+
+def _has_cgroup_v2() -> bool:
+    return (CGROUP_ROOT / "cgroup.controllers").exists()
+
+
+class Governor:
+    """Resource limits and usage report of one Core run.
+
+    :param name: Name of the run, e.g. the Core command. Used in logs and metrics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limits: config.Resources = config.get().resources
+        self.usage: dict[str, float] = {}
+        """Resource usage of the run, filled in once the run finishes."""
+        self._report: Optional[pathlib.Path] = None
+
+    def __enter__(self) -> "Governor":
+        fd, path = tempfile.mkstemp(prefix="insights-nest-usage.", suffix=".json")
+        os.close(fd)
+        self._report = pathlib.Path(path)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._report is None:
+            return
+        try:
+            with self._report.open("r") as f:
+                self.usage = json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.debug("Could not read the resource usage of Core '%s': %s", self.name, exc)
+        finally:
+            self._report.unlink(missing_ok=True)
+            self._report = None
+        self._record()
+
+    def _use_scope(self) -> bool:
+        limits: config.Resources = self.limits
+        if not limits.cgroup:
+            return False
+        if os.geteuid() != 0 or not _has_cgroup_v2() or shutil.which("systemd-run") is None:
+            logger.warning(
+                "Cannot run Core '%s' in a cgroup scope: it needs root, cgroup v2, systemd-run.",
+                self.name,
+            )
+            return False
+        return True
+
+    def command(self, argv: list[str]) -> list[str]:
+        """Wrap the command to run it within the limits, reporting its resource usage."""
+        if self._report is None:
+            raise RuntimeError("The governor has to be entered first.")
+
+        limits: config.Resources = self.limits
+        scope: bool = self._use_scope()
+        wrapped: list[str] = [sys.executable, "-c", _WRAPPER, str(self._report), str(int(scope))]
+        wrapped += [str(limits.nice), str(limits.memory_limit), str(limits.cpu_time_limit)]
+        wrapped += argv
+
+        if scope:
+            properties: list[str] = []
+            if limits.cpu_quota:
+                properties += ["-p", f"CPUQuota={limits.cpu_quota}%"]
+            if limits.memory_max:
+                properties += ["-p", f"MemoryMax={limits.memory_max}"]
+            if limits.io_weight:
+                properties += ["-p", f"IOWeight={limits.io_weight}"]
+            wrapped = [
+                "systemd-run",
+                "--scope",
+                "--quiet",
+                "--collect",
+                f"--description=insights-nest {self.name}",
+                *properties,
+                "--",
+                *wrapped,
+            ]
+
+        if limits.io_class:
+            if shutil.which("ionice") is None:
+                logger.warning("Cannot set the IO priority of Core, 'ionice' is missing.")
+            elif limits.io_class not in IO_CLASSES:
+                logger.warning("Unknown IO class '%s', not setting it.", limits.io_class)
+            else:
+                io_class: int = IO_CLASSES[limits.io_class]
+                level: list[str] = ["-n", str(limits.io_level)] if io_class != 3 else []
+                wrapped = ["ionice", "-c", str(io_class), *level, "--", *wrapped]
+
+        return wrapped
+
+    def _record(self) -> None:
+        if not self.usage:
+            return
+
+        number: Optional[float] = self.usage.get("signal", None)
+        if number is not None:
+            reason: str = {
+                signal.SIGXCPU: "it exceeded the CPU time limit",
+                signal.SIGKILL: "it was killed, e.g. for exceeding the memory or CPU time limit",
+            }.get(signal.Signals(int(number)), "it received a signal")
+            logger.error("Core '%s' was terminated by signal %d: %s.", self.name, number, reason)
+
+        cpu: float = self.usage.get("cpu_seconds", 0.0)
+        peak: float = max(
+            self.usage.get("max_rss_bytes", 0), self.usage.get("memory_peak_bytes", 0)
+        )
+        logger.debug(
+            "Core '%s' used %.1f s of CPU time and %.1f MiB of memory, throttled for %.1f s.",
+            self.name,
+            cpu,
+            peak / 1024 / 1024,
+            self.usage.get("throttled_seconds", 0.0),
+        )
+        metrics.set_gauge("core_cpu_seconds", cpu, command=self.name)
+        metrics.set_gauge("core_peak_memory_bytes", peak, command=self.name)
+        if "throttled_seconds" in self.usage:
+            metrics.set_gauge(
+                "core_cpu_throttled_seconds", self.usage["throttled_seconds"], command=self.name
+            )
@@ -0,0 +1,158 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import random
+import tempfile
+import time
+from typing import Callable, Optional
+
+from insights_nest import config
+from insights_nest.api import connection
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH: pathlib.Path = config.get().egg.egg_directory / "scheduler.json"
+
+COMMANDS: dict[str, list[str]] = {
+    "checkin": ["checkin"],
+    "advisor": ["scan-advisor"],
+    "compliance": ["scan-compliance"],
+    "prefetch": ["egg", "prefetch"],
+}
+"""Mapping between scheduled tasks and the commands they run."""
+
+MINIMAL_BACKOFF: float = 60.0
+"""Delay after the first failure of a task, in seconds. It doubles with every next failure."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Task:
+    name: str
+    argv: list[str]
+    interval: int
+    """Interval between two runs, in seconds."""
+    jitter: float
+    """Random delay added to each run, as a fraction of the interval."""
+
+
+def get_tasks() -> list[Task]:
+    """Create the enabled tasks from the configuration."""
+    cfg: config.Scheduler = config.get().scheduler
+    return [
+        Task(name=name, argv=COMMANDS[name], interval=interval, jitter=cfg.jitter)
+        for name, interval in cfg.intervals.items()
+        if interval > 0
+    ]
+
+
+def splay(seed: str, task: Task) -> float:
+    """Get a deterministic offset of the task within its interval.
+
+    Different hosts get different offsets, so their requests are spread across the interval.
+
+    :param seed: Identifier of the host, e.g. its machine-id.
+    """
+    digest: bytes = hashlib.sha256(f"{seed}:{task.name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * task.interval
+
+
+class Scheduler:
+    """Run tasks periodically, at per-host offsets, persisting their next run times.
+
+    :param seed: Identifier of the host the offsets are derived from.
+    :param path: Path to the file with the persistent state.
+    """
+
+    def __init__(self, seed: str, *, path: pathlib.Path = STATE_PATH):
+        self.seed = seed
+        self.path = path
+        self.state: dict = {"tasks": {}, "backoff_until": 0.0}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with self.path.open("r") as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not load scheduler state from %s: %s", self.path, exc)
+
+    def save(self) -> None:
+        """Atomically store the state."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.state, f)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _slot(self, task: Task, after: float) -> float:
+        """Get the first per-host slot of the task after the time, including jitter."""
+        offset: float = splay(self.seed, task)
+        start: float = math.floor(after / task.interval) * task.interval + offset
+        if start <= after:
+            start += task.interval
+        return start + random.uniform(0, task.jitter * task.interval)
+
+    def next_run(self, task: Task, *, now: float) -> float:
+        """Get the time the task should run next."""
+        state: Optional[dict] = self.state["tasks"].get(task.name)
+        if state is None or state.get("interval") != task.interval:
+            state = {"interval": task.interval, "failures": 0, "next_run": self._slot(task, now)}
+            self.state["tasks"][task.name] = state
+        return max(state["next_run"], self.state.get("backoff_until", 0.0))
+
+    def record(self, task: Task, *, success: bool, now: float, backoff_until: float) -> None:
+        """Plan the next run of the task after it finished.
+
+        Failed tasks are retried with exponential backoff, and if the server asked us to slow
+        down with `Retry-After`, no task runs before that.
+        """
+        state: dict = self.state["tasks"][task.name]
+        state["last_run"] = now
+        self.state["backoff_until"] = max(self.state.get("backoff_until", 0.0), backoff_until)
+
+        if success:
+            state["failures"] = 0
+            state["next_run"] = self._slot(task, now)
+            return
+
+        state["failures"] += 1
+        delay: float = min(MINIMAL_BACKOFF * 2 ** (state["failures"] - 1), task.interval)
+        state["next_run"] = now + random.uniform(delay / 2, delay)
+        logger.info(
+            "Task '%s' failed %d times in a row, retrying in %.0f seconds.",
+            task.name,
+            state["failures"],
+            state["next_run"] - now,
+        )
+
+    def run_pending(self, tasks: list[Task], runner: Callable[[Task], bool]) -> float:
+        """Run the tasks that are due.
+
+        :param runner: Function running a task, returning `True` on success.
+        :returns: Time of the next run of any task.
+        """
+        for task in tasks:
+            if self.next_run(task, now=time.time()) > time.time():
+                continue
+            logger.info("Running scheduled task '%s'.", task.name)
+            success: bool = runner(task)
+            self.record(
+                task,
+                success=success,
+                now=time.time(),
+                backoff_until=connection.backoff_until(),
+            )
+            self.save()
+
+        self.save()
+        return min((self.next_run(task, now=time.time()) for task in tasks), default=math.inf)
@@ -1,24 +1,37 @@
 import os.path
 import logging
+import pathlib
 from typing import Optional
 
+from insights_nest import config
 from insights_nest.api import inventory
 
 
 logger = logging.getLogger(__name__)
 
 
+def get_machine_id() -> Optional[str]:
+    """Get the Insights Client UUID.
+
+    :returns: The UUID if the host has one; None otherwise.
+    """
+    path: pathlib.Path = config.get().egg.metadata_directory / "machine-id"
+    if not os.path.isfile(path):
+        return None
+
+    with open(path) as f:
+        return f.read()
+
+
 def get_inventory_host() -> Optional[inventory.Host]:
     """Request host information from Inventory.
 
     :returns: Host object if it exists in Inventory; None otherwise.
     """
     logger.debug("Requesting the host from Inventory.")
-    if not os.path.isfile("/etc/insights-client/machine-id"):
+    machine_id: Optional[str] = get_machine_id()
+    if machine_id is None:
         logger.debug("machine-id does not exist, host is definitely not registered.")
         return None
 
-    with open("/etc/insights-client/machine-id") as f:
-        machine_id = f.read()
-
     return inventory.Inventory().get_host(machine_id)
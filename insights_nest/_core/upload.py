@@ -0,0 +1,190 @@
+"""Uploads of archives, skipping those identical to the last accepted one.
+
+Archives of consecutive runs often only differ in timestamps. Each archive is described by a
+digest of its normalized content: names and contents of the members, without their times and
+owners, without the top-level directory (which is named after the time of the collection), and
+without members which differ on every run. Together with the canonical facts, the digest is
+compared with the one of the last accepted upload of the same content type.
+
+An identical archive is not uploaded, unless the last upload is older than the configured
+maximal age; the host checks in instead, so Inventory still sees it as fresh.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tarfile
+import tempfile
+import time
+from typing import IO, Optional
+
+from insights_nest import config
+from insights_nest import metrics
+from insights_nest.api import ingress
+from insights_nest.api import inventory
+
+logger = logging.getLogger(__name__)
+
+LAST_UPLOAD_PATH: pathlib.Path = config.get().egg.egg_directory / ".last-upload.json"
+
+VOLATILE_MEMBERS: tuple[str, ...] = (
+    "insights_commands/date",
+    "insights_commands/date_utc",
+    "insights_commands/uptime",
+    "proc/uptime",
+    "proc/interrupts",
+    "proc/stat",
+    "blacklist_report",
+)
+"""Members which differ on every run, relative to the `data/` directory of archives collected
+by Core (or to the top-level directory of archives without it)."""
+VOLATILE_METADATA_KEYS: frozenset[str] = frozenset({"exec_time", "ser_time"})
+"""Keys of the `meta_data/*.json` records which hold the durations of the collection."""
+
+_CHUNK_SIZE: int = 64 * 1024
+
+
+@dataclasses.dataclass
+class LastUpload:
+    digest: str
+    request_id: str
+    timestamp: float
+
+
+def _is_volatile(name: str) -> bool:
+    return name.removeprefix("data/") in VOLATILE_MEMBERS
+
+
+def _without_timings(value: object) -> object:
+    """Drop the durations from a metadata record, recursively."""
+    if isinstance(value, dict):
+        return {
+            k: _without_timings(v) for k, v in value.items() if k not in VOLATILE_METADATA_KEYS
+        }
+    if isinstance(value, list):
+        return [_without_timings(v) for v in value]
+    return value
+
+
+def _update_metadata(hasher: "hashlib._Hash", content: IO[bytes]) -> None:
+    """Hash a `meta_data/*.json` record without its durations."""
+    data: bytes = content.read()
+    try:
+        record: object = _without_timings(json.loads(data))
+    except ValueError:
+        hasher.update(data)
+        return
+    hasher.update(json.dumps(record, sort_keys=True).encode("utf-8"))
+
+
+def digest(archive: pathlib.Path, content_type: str, facts: dict) -> Optional[str]:
+    """Compute the normalized digest of the archive.
+
+    :returns: The digest, or None if the archive cannot be read as a tarball.
+    """
+    members: list[tuple[str, tarfile.TarInfo]] = []
+    try:
+        with tarfile.open(archive, "r:*") as tar:
+            for member in tar.getmembers():
+                # The top-level directory carries the host name and the time of the collection
+                name: str = member.name.lstrip("./").partition("/")[2]
+                if name and not _is_volatile(name):
+                    members.append((name, member))
+
+            hasher = hashlib.sha256()
+            hasher.update(content_type.encode("utf-8") + b"\0")
+            hasher.update(json.dumps(facts, sort_keys=True).encode("utf-8") + b"\0")
+            for name, member in sorted(members, key=lambda m: m[0]):
+                hasher.update(f"{name}\0{member.type!r}\0{member.linkname}\0".encode("utf-8"))
+                if not member.isfile():
+                    continue
+                content = tar.extractfile(member)
+                if content is None:
+                    continue
+                if name.startswith("meta_data/") and name.endswith(".json"):
+                    _update_metadata(hasher, content)
+                    hasher.update(b"\0")
+                    continue
+                for chunk in iter(lambda: content.read(_CHUNK_SIZE), b""):  # type: ignore
+                    hasher.update(chunk)
+                hasher.update(b"\0")
+    except (OSError, tarfile.TarError) as exc:
+        logger.debug("Could not compute the digest of %s: %s", archive, exc)
+        return None
+    return hasher.hexdigest()
+
+
+def _load() -> dict[str, LastUpload]:
+    try:
+        with LAST_UPLOAD_PATH.open("r") as f:
+            return {k: LastUpload(**v) for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, TypeError) as exc:
+        logger.debug("Ignoring unreadable %s: %s", LAST_UPLOAD_PATH, exc)
+        return {}
+
+
+def _save(uploads: dict[str, LastUpload]) -> None:
+    try:
+        LAST_UPLOAD_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=LAST_UPLOAD_PATH.parent, prefix=".last-upload.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({k: dataclasses.asdict(v) for k, v in uploads.items()}, f)
+            os.replace(temporary, LAST_UPLOAD_PATH)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError as exc:
+        logger.debug("Could not save %s: %s", LAST_UPLOAD_PATH, exc)
+
+
+def upload(
+    archive: pathlib.Path, content_type: str, facts: dict
+) -> Optional[ingress.UploadResponse]:
+    """Upload the archive, unless it is identical to the last accepted upload.
+
+    :returns: Response of Ingress, or None if the upload was skipped and the host checked in.
+    """
+    skip_age: float = config.get().network.upload_skip_age
+    current: Optional[str] = digest(archive, content_type, facts) if skip_age else None
+
+    uploads: dict[str, LastUpload] = _load()
+    last: Optional[LastUpload] = uploads.get(content_type, None)
+    if current is not None and last is not None and last.digest == current:
+        age: float = time.time() - last.timestamp
+        if 0 <= age < skip_age:
+            logger.info(
+                "The archive is identical to the upload '%s' from %.0f seconds ago, "
+                "checking in instead.",
+                last.request_id,
+                age,
+            )
+            try:
+                inventory.Inventory().checkin(facts)
+            except LookupError as exc:
+                logger.info("Could not check in (%s), uploading the archive instead.", exc)
+            else:
+                metrics.inc("uploads_total", content_type=content_type, result="skipped")
+                return None
+        else:
+            logger.debug(
+                "The identical upload '%s' is too old, uploading again.", last.request_id
+            )
+
+    response: ingress.UploadResponse = ingress.Ingress().upload(
+        archive=archive, content_type=content_type, facts=facts
+    )
+    metrics.inc("uploads_total", content_type=content_type, result="uploaded")
+    logger.debug("The archive was accepted as '%s'.", response.request_id)
+
+    if current is not None:
+        uploads[content_type] = LastUpload(
+            digest=current, request_id=response.request_id, timestamp=time.time()
+        )
+        _save(uploads)
+    return response
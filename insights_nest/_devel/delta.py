@@ -0,0 +1,84 @@
+"""Create, apply and inspect egg deltas (see `insights_nest._core.delta`).
+
+    python3 -m insights_nest._devel.delta create old.egg new.egg --output new.delta
+    python3 -m insights_nest._devel.delta apply old.egg new.delta --output new.egg
+    python3 -m insights_nest._devel.delta info new.delta
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import zipfile
+
+from insights_nest._core import delta
+
+
+def _create(args: argparse.Namespace) -> None:
+    try:
+        content: bytes = delta.create(args.source.read_bytes(), args.target.read_bytes())
+    except zipfile.BadZipFile as exc:
+        print(f"Could not read the eggs: {exc}", file=sys.stderr)
+        sys.exit(1)
+    args.output.write_bytes(content)
+    size: int = args.target.stat().st_size
+    print(f"{args.output}: {len(content)} bytes, {len(content) / size:.1%} of {args.target}")
+
+
+def _apply(args: argparse.Namespace) -> None:
+    try:
+        content: bytes = delta.apply(args.source.read_bytes(), args.delta.read_bytes())
+    except delta.DeltaError as exc:
+        print(f"Could not apply the delta: {exc}", file=sys.stderr)
+        sys.exit(1)
+    args.output.write_bytes(content)
+    print(f"{args.output}: {len(content)} bytes")
+
+
+def _info(args: argparse.Namespace) -> None:
+    content: bytes = args.delta.read_bytes()
+    try:
+        header: dict = delta.read_header(content)
+    except delta.DeltaError as exc:
+        print(f"Could not read the delta: {exc}", file=sys.stderr)
+        sys.exit(1)
+    spans: list[list[int]] = header["spans"]
+    literal: int = sum(length for offset, length in spans if offset == -1)
+    summary: dict = {
+        "source": header["source"],
+        "target": header["target"],
+        "size": header["size"],
+        "delta_size": len(content),
+        "spans": len(spans),
+        "copied_bytes": header["size"] - literal,
+        "literal_bytes": literal,
+    }
+    print(json.dumps(summary, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create = subparsers.add_parser("create", help="create a delta from one egg to another")
+    create.add_argument("source", type=pathlib.Path, help="old egg")
+    create.add_argument("target", type=pathlib.Path, help="new egg")
+    create.add_argument("--output", "-o", type=pathlib.Path, required=True)
+    create.set_defaults(function=_create)
+
+    apply = subparsers.add_parser("apply", help="rebuild the new egg from the old one")
+    apply.add_argument("source", type=pathlib.Path, help="old egg")
+    apply.add_argument("delta", type=pathlib.Path)
+    apply.add_argument("--output", "-o", type=pathlib.Path, required=True)
+    apply.set_defaults(function=_apply)
+
+    info = subparsers.add_parser("info", help="describe a delta")
+    info.add_argument("delta", type=pathlib.Path)
+    info.set_defaults(function=_info)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
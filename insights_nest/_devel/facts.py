@@ -0,0 +1,50 @@
+"""Check the natively collected canonical facts against the output of Core.
+
+    python3 -m insights_nest._devel.facts
+    python3 -m insights_nest._devel.facts --compare core-checkin.json
+    python3 -m insights_nest._devel.facts --core
+
+Without arguments, the native facts are printed. `--compare` takes output of Core's checkin
+command recorded on the same host (`python3 -m insights.client.phase.v2 checkin`), `--core`
+runs the active egg. The exit code is 1 if the outputs differ, and 2 if the facts cannot be
+collected natively on this host, so Core would be used.
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+from typing import Optional
+
+from insights_nest._core import egg
+from insights_nest._core import facts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python3 -m insights_nest._devel.facts")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--compare", type=pathlib.Path, help="recorded output of Core's checkin command"
+    )
+    source.add_argument("--core", action="store_true", help="run Core and compare its output")
+    args = parser.parse_args()
+
+    native: Optional[dict] = facts.collect()
+    if native is None:
+        print("The canonical facts cannot be collected natively, Core would be used.")
+        sys.exit(2)
+    print(json.dumps(native))
+
+    if args.compare is None and not args.core:
+        return
+    core: dict = json.loads(args.compare.read_text()) if args.compare else egg.Egg().run("checkin")
+    differences: list[str] = facts.compare(native, core)
+    for difference in differences:
+        print(difference, file=sys.stderr)
+    if differences:
+        sys.exit(1)
+    print("The facts are identical to the output of Core.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""Local HTTPS stand-in for the Insights API.
+
+Implements the endpoints used by the client, keeping the Inventory in memory, with configurable
+latency, bandwidth and injected errors. It is meant for offline development, benchmarks and CI,
+not as a faithful copy of the real services.
+
+    python3 -m insights_nest._devel.server --directory /tmp/nest --hosts 1000 --latency-ms 50
+
+With `--previous-egg`, the server also offers deltas from the previous eggs to `--egg`.
+
+The directory is populated with a server certificate, a client identity, a machine-id
+registered in the Inventory, and configuration files. The printed environment variables point
+the client to them.
+"""
+
+import argparse
+import dataclasses
+import gzip
+import hashlib
+import http.server
+import json
+import logging
+import pathlib
+import random
+import ssl
+import subprocess
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Optional
+
+from insights_nest._core import delta
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT = 1234567
+ORG_ID = 7654321
+
+
+@dataclasses.dataclass
+class Behavior:
+    latency: float = 0.0
+    """Seconds before each response is sent."""
+    bandwidth: float = 0.0
+    """Bytes per second of response bodies. Zero is unlimited."""
+    error_rate: float = 0.0
+    """Probability of answering with 503."""
+    retry_after: float = 1.0
+    """Value of `Retry-After` of injected errors."""
+    rate_limit: float = 0.0
+    """Requests per second; more are answered with 429. Zero is unlimited."""
+
+
+class State:
+    """Hosts of the Inventory and files of the egg release."""
+
+    def __init__(
+        self,
+        *,
+        egg: Optional[pathlib.Path],
+        signature: Optional[pathlib.Path],
+        previous_eggs: tuple[pathlib.Path, ...] = (),
+    ):
+        self.lock = threading.Lock()
+        self.hosts: dict[str, dict] = {}
+        self.static: dict[str, bytes] = {}
+        self.egg_digest: Optional[str] = None
+        content: bytes = egg.read_bytes() if egg is not None else b""
+        for route in ("release", "testing"):
+            if egg is not None:
+                self.static[f"/{route}/insights-core.egg"] = content
+            if signature is not None:
+                self.static[f"/{route}/insights-core.egg.asc"] = signature.read_bytes()
+        if egg is not None:
+            self.egg_digest = hashlib.sha256(content).hexdigest()
+            for previous in previous_eggs:
+                source: bytes = previous.read_bytes()
+                digest: str = hashlib.sha256(source).hexdigest()
+                for route in ("release", "testing"):
+                    self.static[f"/{route}/deltas/{digest}.delta"] = delta.create(source, content)
+
+    def add_host(self, insights_id: str, facts: Optional[dict] = None) -> dict:
+        now: str = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        facts = facts or {}
+        host: dict = {
+            "insights_id": insights_id,
+            "subscription_manager_id": facts.get("subscription_manager_id"),
+            "satellite_id": None,
+            "bios_uuid": facts.get("bios_uuid"),
+            "ip_addresses": facts.get("ip_addresses", ["192.0.2.1"]),
+            "fqdn": facts.get("fqdn", f"host-{insights_id[:8]}.example.org"),
+            "mac_addresses": facts.get("mac_addresses", ["52:54:00:00:00:01"]),
+            "provider_id": None,
+            "provider_type": None,
+            "id": str(uuid.uuid4()),
+            "account": ACCOUNT,
+            "org_id": ORG_ID,
+            "display_name": facts.get("fqdn", f"host-{insights_id[:8]}.example.org"),
+            "ansible_host": None,
+            "facts": [],
+            "reporter": "puptoo",
+            "per_reporter_staleness": {},
+            "stale_timestamp": now,
+            "stale_warning_timestamp": now,
+            "culled_timestamp": now,
+            "created": now,
+            "updated": now,
+            "groups": [],
+            "tags": [],
+            "system_profile": {
+                "arch": "x86_64",
+                "installed_packages": [f"package-{i}-1.0-1.el9.x86_64" for i in range(200)],
+            },
+        }
+        with self.lock:
+            self.hosts[host["id"]] = host
+        return host
+
+    def find(self, insights_id: str) -> Optional[dict]:
+        with self.lock:
+            return next((h for h in self.hosts.values() if h["insights_id"] == insights_id), None)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "Server"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _body(self) -> bytes:
+        if self.headers.get("Content-Encoding", "") == "gzip":
+            return gzip.decompress(self.data)
+        return self.data
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+        headers = dict(headers or {})
+        compress: bool = "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress and len(body) > 1024 and headers.get("Content-Type") == "application/json":
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        bandwidth: float = self.server.behavior.bandwidth
+        for start in range(0, len(body), 16 * 1024):
+            chunk: bytes = body[start : start + 16 * 1024]
+            self.wfile.write(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+    def _json(self, status: int, data) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"), {"Content-Type": "application/json"})
+
+    def _handle(self, method: str) -> None:
+        # Read the body first, so the connection can be reused even if the request fails
+        self.data: bytes = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        behavior: Behavior = self.server.behavior
+        if behavior.latency:
+            time.sleep(behavior.latency)
+        if random.random() < behavior.error_rate:
+            self._send(503, headers={"Retry-After": f"{behavior.retry_after:g}"})
+            return
+        if behavior.rate_limit and not self.server.admit(behavior.rate_limit):
+            self._send(429, headers={"Retry-After": f"{behavior.retry_after:g}"})
+            return
+
+        url = urllib.parse.urlsplit(self.path)
+        query: dict[str, str] = dict(urllib.parse.parse_qsl(url.query))
+        path: str = url.path
+        try:
+            if path.startswith("/api/inventory/v1/hosts"):
+                self._inventory(method, path.removeprefix("/api/inventory/v1/hosts"), query)
+            elif path == "/api/ingress/v1/upload" and method == "POST":
+                self._json(
+                    202,
+                    {
+                        "request_id": uuid.uuid4().hex,
+                        "upload": {"account": ACCOUNT, "org_id": ORG_ID},
+                    },
+                )
+            elif path == "/api/module-update-router/v1/channel" and method == "GET":
+                self._json(200, {"url": "/release"})
+            elif path.startswith("/api/v1/static/") and method == "GET":
+                self._static(path.removeprefix("/api/v1/static"))
+            else:
+                self._json(404, {"detail": "Not found."})
+        except (ValueError, KeyError) as exc:
+            self._json(400, {"detail": str(exc)})
+
+    def _inventory(self, method: str, path: str, query: dict[str, str]) -> None:
+        state: State = self.server.state
+        if path == "" and method == "GET":
+            with state.lock:
+                hosts: list[dict] = list(state.hosts.values())
+            if "insights_id" in query:
+                hosts = [h for h in hosts if h["insights_id"] == query["insights_id"]]
+            page, per_page = int(query.get("page", 1)), int(query.get("per_page", 50))
+            results: list[dict] = hosts[(page - 1) * per_page : page * per_page]
+            self._json(
+                200,
+                {
+                    "total": len(hosts),
+                    "count": len(results),
+                    "page": page,
+                    "per_page": per_page,
+                    "results": results,
+                },
+            )
+        elif path == "/checkin" and method == "POST":
+            facts: dict = json.loads(self._body())
+            host: Optional[dict] = state.find(facts.get("insights_id", ""))
+            if host is None:
+                self._json(404, {"detail": "No host matches the facts."})
+                return
+            host["updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            self._json(201, host)
+        elif path.startswith("/") and method in ("PATCH", "DELETE"):
+            with state.lock:
+                host = state.hosts.get(path[1:])
+                if host is not None and method == "DELETE":
+                    del state.hosts[path[1:]]
+            if host is None:
+                self._json(404, {"detail": "Host not found."})
+            elif method == "PATCH":
+                update: dict = json.loads(self._body())
+                for field in ("display_name", "ansible_host"):
+                    if field in update:
+                        host[field] = update[field]
+                self._json(200, host)
+            else:
+                self._send(200)
+        else:
+            self._json(404, {"detail": "Not found."})
+
+    def _static(self, path: str) -> None:
+        digest: str = path.rpartition("/deltas/")[2].removesuffix(".delta")
+        if "/deltas/" in path and digest == self.server.state.egg_digest:
+            self._send(304)
+            return
+        content: Optional[bytes] = self.server.state.static.get(path)
+        if content is None:
+            self._json(404, {"detail": "Not found."})
+            return
+        etag: str = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+        self._send(200, content, {"ETag": etag, "Content-Type": "application/octet-stream"})
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+
+class Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], *, state: State, behavior: Behavior):
+        super().__init__(address, Handler)
+        self.state = state
+        self.behavior = behavior
+        self._rate_lock = threading.Lock()
+        self._window: tuple[int, int] = (0, 0)
+
+    def admit(self, rate: float) -> bool:
+        """Count the request in the current second, and check it is within the rate."""
+        second: int = int(time.monotonic())
+        with self._rate_lock:
+            window, count = self._window
+            count = count + 1 if window == second else 1
+            self._window = (second, count)
+        return count <= rate
+
+
+def _create_certificate(cert: pathlib.Path, key: pathlib.Path, subject: str) -> None:
+    if cert.exists() and key.exists():
+        return
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+            "-subj", subject, "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout", str(key), "-out", str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+
+
+def prepare(directory: pathlib.Path, port: int) -> dict[str, str]:
+    """Create certificates and configuration files of the client.
+
+    :returns: Environment variables pointing the client to the files.
+    """
+    for subdirectory in ("identity", "egg", "metadata", "cache", "insights-nest.conf.d"):
+        (directory / subdirectory).mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    _create_certificate(directory / "server.pem", directory / "server-key.pem", "/CN=localhost")
+    _create_certificate(
+        directory / "identity" / "cert.pem",
+        directory / "identity" / "key.pem",
+        f"/O={ORG_ID}/CN={uuid.uuid4()}",
+    )
+    machine_id: pathlib.Path = directory / "metadata" / "machine-id"
+    if not machine_id.exists():
+        machine_id.write_text(str(uuid.uuid4()))
+
+    (directory / "rhsm.conf").write_text(
+        f"[server]\nproxy_hostname =\n\n[rhsm]\nconsumerCertDir = {directory / 'identity'}\n"
+    )
+    (directory / "insights-nest.conf").write_text(
+        f"[api]\nhost = localhost\nport = {port}\n\n"
+        f"[network]\nca_certificates = {directory / 'server.pem'}\n\n"
+        f"[egg]\negg_directory = {directory / 'egg'}\n"
+        f"metadata_directory = {directory / 'metadata'}\n"
+    )
+    return {
+        "NEST_CONFIGURATION_FILE": str(directory / "insights-nest.conf"),
+        "NEST_CONFIGURATION_DIRECTORY": str(directory / "insights-nest.conf.d"),
+        "NEST_RHSM_CONFIGURATION_FILE": str(directory / "rhsm.conf"),
+        "NEST_CACHE_DIRECTORY": str(directory / "cache"),
+    }
+
+
+def start(
+    directory: pathlib.Path,
+    *,
+    port: int = 0,
+    hosts: int = 0,
+    egg: Optional[pathlib.Path] = None,
+    signature: Optional[pathlib.Path] = None,
+    previous_eggs: tuple[pathlib.Path, ...] = (),
+    behavior: Optional[Behavior] = None,
+) -> tuple[Server, dict[str, str]]:
+    """Start the server in a background thread.
+
+    :param port: Port to listen on; zero picks a free one.
+    :param hosts: Number of additional random hosts in the Inventory.
+    :param previous_eggs: Eggs the server offers deltas from.
+    :returns: The server and the environment variables of the client.
+    """
+    state = State(egg=egg, signature=signature, previous_eggs=previous_eggs)
+    server = Server(("localhost", port), state=state, behavior=behavior or Behavior())
+    environment: dict[str, str] = prepare(directory, server.server_address[1])
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(directory / "server.pem", directory / "server-key.pem")
+    context.load_verify_locations(directory / "identity" / "cert.pem")
+    context.verify_mode = ssl.CERT_OPTIONAL
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    state.add_host((directory / "metadata" / "machine-id").read_text().strip())
+    for _ in range(hosts):
+        state.add_host(str(uuid.uuid4()))
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--directory", type=pathlib.Path, required=True)
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--hosts", type=int, default=0, help="number of extra Inventory hosts")
+    parser.add_argument("--egg", type=pathlib.Path, help="egg served by /api/v1/static")
+    parser.add_argument("--signature", type=pathlib.Path, help="signature of the egg")
+    parser.add_argument(
+        "--previous-egg",
+        type=pathlib.Path,
+        action="append",
+        default=[],
+        help="egg to offer a delta from; can be repeated",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="zero is unlimited")
+    parser.add_argument("--error-rate", type=float, default=0, help="probability of 503")
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s, then 429")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    behavior = Behavior(
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_kbps * 1000 / 8,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        rate_limit=args.rate_limit,
+    )
+    server, environment = start(
+        args.directory.resolve(),
+        port=args.port,
+        hosts=args.hosts,
+        egg=args.egg,
+        signature=args.signature,
+        previous_eggs=tuple(args.previous_egg),
+        behavior=behavior,
+    )
+    print(f"Listening on https://localhost:{server.server_address[1]}/")
+    for name, value in environment.items():
+        print(f"export {name}={value}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
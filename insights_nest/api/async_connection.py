@@ -0,0 +1,472 @@
+import asyncio
+import logging
+import socket
+import ssl
+import time
+import urllib.parse
+from typing import Awaitable, Optional
+
+from insights_nest import config
+from insights_nest import metrics
+from insights_nest.api import cache
+from insights_nest.api import connection
+from insights_nest.api import resolver
+from insights_nest.api import throttle
+from insights_nest.api.connection import Response
+
+logger = logging.getLogger(__name__)
+
+_Stream = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+_tls_contexts: dict[type, ssl.SSLContext] = {}
+
+
+def _chunks(data: bytes) -> list[memoryview]:
+    view = memoryview(data)
+    return [view[i : i + throttle.CHUNK_SIZE] for i in range(0, len(data), throttle.CHUNK_SIZE)]
+
+
+class IncompleteResponse(ConnectionError):
+    """The server closed the connection before the whole response was received."""
+
+
+async def _read_response(
+    reader: asyncio.StreamReader, method: str, *, timeout: float
+) -> tuple[Response, bool]:
+    """Read one HTTP/1.1 response, skipping interim responses (e.g. `100 Continue`).
+
+    The body is read in pieces, as the download limit allows; while the reading waits, the
+    server is held back by TCP flow control.
+
+    :param timeout: Seconds each read may take, excluding the waits for the download limit.
+    :returns: The response, and whether the connection can be reused.
+    """
+
+    async def read(awaitable: Awaitable[bytes]) -> bytes:
+        return await asyncio.wait_for(awaitable, timeout)
+
+    async def read_body(size: int) -> None:
+        while size > 0:
+            chunk: bytes = await read(reader.readexactly(min(size, connection.CHUNK_SIZE)))
+            decoder.feed(chunk)
+            await throttle.take_async(throttle.DOWNLOAD, len(chunk))
+            size -= len(chunk)
+
+    while True:
+        try:
+            head: bytes = await read(reader.readuntil(b"\r\n\r\n"))
+        except asyncio.IncompleteReadError as exc:
+            raise IncompleteResponse("Connection closed before the response headers.") from exc
+
+        status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+        version, status, *_ = status_line.split(" ", 2)
+        # Interim responses have no body; the final response follows them
+        if not status.startswith("1") or status == "101":
+            break
+        logger.debug("Skipping interim response %s.", status_line)
+    headers: dict[str, str] = {}
+    for line in header_lines:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        name, value = name.strip(), value.strip()
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    lowercase: dict[str, str] = {k.lower(): v for k, v in headers.items()}
+
+    keep_alive: bool = version == "HTTP/1.1" and lowercase.get("connection", "") != "close"
+    decoder = connection.Decoder(lowercase.get("content-encoding"))
+    try:
+        if method == "HEAD" or status in ("204", "304") or status.startswith("1"):
+            pass
+        elif "chunked" in lowercase.get("transfer-encoding", ""):
+            while True:
+                size = int((await read(reader.readuntil(b"\r\n"))).split(b";")[0], 16)
+                if size == 0:
+                    break
+                await read_body(size)
+                await read(reader.readexactly(2))
+            # Skip the trailers, up to the empty line ending the body
+            while (await read(reader.readuntil(b"\r\n"))) != b"\r\n":
+                pass
+        elif "content-length" in lowercase:
+            await read_body(int(lowercase["content-length"]))
+        else:
+            while chunk := await read(reader.read(connection.CHUNK_SIZE)):
+                decoder.feed(chunk)
+                await throttle.take_async(throttle.DOWNLOAD, len(chunk))
+            keep_alive = False
+    except asyncio.IncompleteReadError as exc:
+        raise IncompleteResponse("Connection closed before the response body.") from exc
+
+    response = Response(
+        status=int(status),
+        headers=headers,
+        data=decoder.finish(),
+        encoded_size=decoder.size if decoder.encoded else None,
+    )
+    return response, keep_alive
+
+
+class AsyncConnection:
+    """Asynchronous counterpart of `Connection`, built on asyncio streams.
+
+    Idle connections are kept for reuse within the event loop, and the number of concurrent
+    requests is bounded. Cancelled requests close their connection.
+
+    :param concurrency: Maximal number of requests in flight at the same time.
+    """
+
+    HOST: str
+    """Hostname. E.g. `example.org`."""
+    PORT: int
+    """Application port. E.g. `443`."""
+    PATH: str
+    """API endpoint root. E.g. `/api/v1`."""
+
+    CONCURRENCY: int = 8
+    """Default maximal number of requests in flight."""
+    COMPRESS_REQUESTS: bool = False
+    """Whether the API accepts gzip-compressed request bodies (`Content-Encoding: gzip`)."""
+    CACHE: bool = True
+    """Whether GET responses are stored in and served from the HTTP cache (see `cache`)."""
+
+    def __init__(self, *, concurrency: Optional[int] = None):
+        self.concurrency: int = concurrency if concurrency is not None else self.CONCURRENCY
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._idle: list[_Stream] = []
+        self._flights: dict[tuple, asyncio.Task] = {}
+
+    async def __aenter__(self) -> "AsyncConnection":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close all idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    def _create_tls_context(self) -> ssl.SSLContext:
+        return connection.create_tls_context()
+
+    def _tls_context(self) -> ssl.SSLContext:
+        cls = type(self)
+        if cls not in _tls_contexts:
+            _tls_contexts[cls] = self._create_tls_context()
+        return _tls_contexts[cls]
+
+    def _bind_loop(self) -> asyncio.Semaphore:
+        """Prepare the per-loop state; streams cannot be shared between event loops."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._semaphore is None:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._idle = []
+            self._flights = {}
+        return self._semaphore
+
+    async def _connect(self, *, timeout: float) -> _Stream:
+        """Open a new connection to the server, tunneled through the proxy if there is one.
+
+        The TCP connection is established by `resolver` in a thread, sharing its cache of
+        addresses with the synchronous connections.
+        """
+        context: ssl.SSLContext = self._tls_context()
+        proxy: Optional[config.Proxy] = connection.get_proxy(self.HOST)
+        timing = resolver.Timing()
+        if proxy is None:
+            sock: socket.socket = await asyncio.wait_for(
+                asyncio.to_thread(
+                    resolver.create_connection, (self.HOST, self.PORT), timeout, timing=timing
+                ),
+                timeout,
+            )
+            sock.setblocking(False)
+        else:
+            logger.debug("Tunneling through proxy %s:%d.", proxy.host, proxy.port)
+            sock = await asyncio.wait_for(
+                asyncio.to_thread(self._open_tunnel, proxy, timeout, timing), timeout
+            )
+
+        started: float = time.monotonic()
+        try:
+            stream: _Stream = await asyncio.wait_for(
+                asyncio.open_connection(sock=sock, ssl=context, server_hostname=self.HOST),
+                timeout,
+            )
+        except BaseException:
+            sock.close()
+            raise
+        connection.record_connect(
+            proxy.host if proxy is not None else self.HOST, timing, time.monotonic() - started
+        )
+        return stream
+
+    def _open_tunnel(
+        self, proxy: config.Proxy, timeout: float, timing: resolver.Timing
+    ) -> socket.socket:
+        """Establish the CONNECT tunnel with a blocking socket."""
+        sock = resolver.create_connection((proxy.host, proxy.port), timeout, timing=timing)
+        try:
+            connection.open_tunnel(sock, self.HOST, self.PORT, proxy)
+        except BaseException:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        return sock
+
+    async def _send(
+        self, method: str, url: str, *, headers: dict[str, str], data: Optional[bytes]
+    ) -> Response:
+        """Send a single request over an idle or a new connection.
+
+        Other transports than `HTTPSTransport` (e.g. replayed sessions) are run in a thread.
+        """
+        transport: connection.Transport = connection.get_transport()
+        if not isinstance(transport, connection.HTTPSTransport):
+            request = connection.Request(method, self.HOST, self.PORT, url, headers, data)
+            # The transport only needs `_tls_context()` of the connection
+            return await asyncio.to_thread(transport.send, self, request)  # type: ignore
+
+        cfg: config.Network = config.get().network
+        remaining: float = connection.remaining_budget()
+        if remaining <= 0:
+            raise TimeoutError("The time budget for HTTP requests has been exhausted.")
+
+        stream: Optional[_Stream] = None
+        while self._idle and stream is None:
+            stream = self._idle.pop()
+            if stream[0].at_eof() or stream[1].is_closing():
+                logger.debug("Idle connection to %s was closed by the server.", self.HOST)
+                stream[1].close()
+                stream = None
+        reused: bool = stream is not None
+        if stream is None:
+            stream = await self._connect(timeout=min(cfg.connect_timeout, remaining))
+        metrics.inc("http_connections_total", reused=str(reused).lower())
+        reader, writer = stream
+
+        host: str = self.HOST if self.PORT == 443 else f"{self.HOST}:{self.PORT}"
+        request_headers: dict[str, str] = {"Host": host, **headers}
+        if data is not None or method in ("POST", "PUT", "PATCH"):
+            request_headers["Content-Length"] = str(len(data) if data else 0)
+        head: str = f"{method} {url} HTTP/1.1\r\n" + "".join(
+            f"{k}: {v}\r\n" for k, v in request_headers.items()
+        )
+
+        logger.debug(
+            "Request %s %s:%s%s (headers=%s)", method, self.HOST, self.PORT, url, headers
+        )
+        try:
+            writer.write(head.encode("iso-8859-1") + b"\r\n")
+            # The body is written in pieces, as the upload limit allows
+            for chunk in _chunks(data or b""):
+                await throttle.take_async(throttle.UPLOAD, len(chunk))
+                writer.write(chunk)
+            await writer.drain()
+            now: float = time.time()
+            response, keep_alive = await _read_response(
+                reader, method, timeout=min(cfg.read_timeout, remaining)
+            )
+            delta: float = time.time() - now
+        except (IncompleteResponse, ConnectionResetError, BrokenPipeError):
+            writer.close()
+            # The server may have processed the request already; `retry_delay` decides then
+            if not reused or method not in connection.IDEMPOTENT_METHODS:
+                raise
+            logger.debug("Reused connection was closed by the server, opening a new one.")
+            return await self._send(method, url, headers=headers, data=data)
+        except BaseException:
+            # Including cancellation: the connection is in an unknown state
+            writer.close()
+            raise
+
+        logger.debug("Response with code %d after %.1f ms", response.status, delta * 1000)
+        if keep_alive:
+            self._idle.append(stream)
+        else:
+            writer.close()
+        return response
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        """Send the request, merging it with identical ones (see `connection.SingleFlight`).
+
+        Identical requests of the connection in flight share one task; recent responses are
+        shared with the whole process.
+        """
+        url = f"{self.PATH}{endpoint}"
+        if params:
+            url += f"?{urllib.parse.urlencode(params)}"
+        labels = {"api": self.PATH, "endpoint": metrics.endpoint_label(endpoint)}
+        headers = {"Accept-Encoding": connection.ACCEPT_ENCODING, **(headers or {})}
+        api: tuple = (self.HOST, self.PORT, self.PATH)
+        self._bind_loop()
+
+        if method not in connection.COALESCED_METHODS or data is not None:
+            try:
+                return await self._perform(method, url, labels, headers=headers, data=data)
+            finally:
+                connection.single_flight.forget(api)
+
+        key: tuple = connection.SingleFlight.key(api, method, url, headers)
+        if "no-cache" not in cache.get_header(headers, "Cache-Control").lower():
+            recent: Optional[Response] = connection.single_flight.recall(key)
+            if recent is not None:
+                metrics.inc("http_coalesced_requests_total", **labels, result="memo")
+                return recent
+
+        task: Optional[asyncio.Task] = self._flights.get(key)
+        if task is not None:
+            metrics.inc("http_coalesced_requests_total", **labels, result="joined")
+        else:
+            task = asyncio.ensure_future(
+                self._perform(method, url, labels, headers=headers, data=data)
+            )
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+
+        # A cancelled caller must not cancel the request shared with others
+        response: Response = await asyncio.shield(task)
+        connection.single_flight.remember(key, response)
+        return response
+
+    async def _perform(
+        self,
+        method: str,
+        url: str,
+        labels: dict[str, str],
+        *,
+        headers: dict[str, str],
+        data: Optional[bytes],
+    ) -> Response:
+        """Send the request, retrying it on transient failures (see `connection.retry_delay`).
+
+        Unlike `Connection`, concurrent requests do not consume the time budget; it only limits
+        their timeouts.
+        """
+
+        http_cache: Optional[cache.Cache] = None
+        entry: Optional[cache.Entry] = None
+        if self.CACHE and method == "GET":
+            http_cache = cache.get()
+        if http_cache is not None:
+            cached, entry, headers = http_cache.lookup(self._cache_key(url), headers, labels)
+            if cached is not None:
+                return cached
+
+        body_headers, body = connection.compress_request(type(self), headers, data)
+
+        semaphore: asyncio.Semaphore = self._bind_loop()
+        attempt: int = 0
+        while True:
+            try:
+                # The slot is held while the request is in flight, not during the backoff
+                async with semaphore:
+                    started: float = time.monotonic()
+                    response: Response = await self._send(
+                        method, url, headers=body_headers, data=body
+                    )
+            except (OSError, asyncio.TimeoutError) as exc:
+                logger.debug("Request %s %s failed: %r", method, url, exc)
+                delay: Optional[float] = connection.retry_delay(method, attempt, error=exc)
+                if delay is None:
+                    raise
+                reason: str = type(exc).__name__
+            else:
+                connection.record_response(
+                    labels,
+                    method,
+                    response,
+                    seconds=time.monotonic() - started,
+                    sent=len(body) if body else 0,
+                    saved=len(data) - len(body) if data and body else 0,
+                )
+                if response.status == 415 and body is not data:
+                    connection.reject_compression(type(self))
+                    body_headers, body = headers, data
+                    continue
+                delay = connection.retry_delay(method, attempt, response=response)
+                if delay is None:
+                    break
+                reason = str(response.status)
+
+            attempt += 1
+            logger.debug(
+                "Retrying %s %s (attempt %d, reason %s) in %.1f s.",
+                method,
+                url,
+                attempt,
+                reason,
+                delay,
+            )
+            metrics.inc("http_retries_total", **labels, reason=reason)
+            metrics.inc("http_retry_seconds_total", delay, **labels)
+            await asyncio.sleep(delay)
+
+        if http_cache is not None:
+            return http_cache.store(self._cache_key(url), entry, headers, response, labels)
+        return response
+
+    def _cache_key(self, url: str) -> str:
+        return f"{self.HOST}:{self.PORT}{url}"
+
+    async def get(
+        self,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        return await self._request("GET", endpoint, params=params, headers=headers, data=data)
+
+    async def put(
+        self,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        return await self._request("PUT", endpoint, params=params, headers=headers, data=data)
+
+    async def post(
+        self,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        return await self._request("POST", endpoint, params=params, headers=headers, data=data)
+
+    async def patch(
+        self,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        return await self._request("PATCH", endpoint, params=params, headers=headers, data=data)
+
+    async def delete(
+        self,
+        endpoint: str,
+        *,
+        params: Optional[dict[str, str]] = None,
+        headers: Optional[dict[str, str]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        return await self._request("DELETE", endpoint, params=params, headers=headers, data=data)
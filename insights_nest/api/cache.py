@@ -0,0 +1,324 @@
+"""On-disk cache of HTTP GET responses.
+
+Responses are stored according to their `Cache-Control`, `Expires`, `ETag` and `Last-Modified`
+headers. Fresh responses are served without contacting the server; stale ones are revalidated
+with `If-None-Match`/`If-Modified-Since`, so the server can answer with a body-less 304.
+
+Bodies larger than a fraction of the cache size are not stored, only their validators are. For
+such entries, a 304 response is passed to the caller, which keeps the body elsewhere (e.g. the
+egg, which is stored as a staged version).
+
+The cache is bounded by size; the least recently used entries are evicted first.
+"""
+
+import dataclasses
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from insights_nest import config
+from insights_nest import metrics
+from insights_nest.api import connection
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRECTORY: pathlib.Path = config.CACHE_DIRECTORY_PATH / "http"
+
+MAXIMAL_BODY_FRACTION: int = 8
+"""Bodies larger than 1/N of the cache size are not stored, only their validators."""
+
+
+def get_header(headers: dict[str, str], name: str) -> str:
+    """Get a request header value, ignoring the case of its name. Missing headers are empty."""
+    return next((v for k, v in headers.items() if k.lower() == name.lower()), "")
+
+
+def _parse_cache_control(value: Optional[str]) -> dict[str, Optional[str]]:
+    directives: dict[str, Optional[str]] = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _parse_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _freshness(response: "connection.Response", *, now: float) -> float:
+    """Get the time until which the response is fresh."""
+    directives = _parse_cache_control(response.header("Cache-Control"))
+    if "no-cache" in directives:
+        return 0.0
+
+    age: float = 0.0
+    try:
+        age = float(response.header("Age") or 0)
+    except ValueError:
+        pass
+
+    if directives.get("max-age") is not None:
+        try:
+            return now + float(directives["max-age"]) - age  # type: ignore[arg-type]
+        except ValueError:
+            return 0.0
+
+    expires: Optional[float] = _parse_date(response.header("Expires"))
+    if expires is not None:
+        date: float = _parse_date(response.header("Date")) or now
+        return now + (expires - date) - age
+    return 0.0
+
+
+@dataclasses.dataclass
+class Entry:
+    key: str
+    status: int
+    headers: dict[str, str]
+    stored: float
+    """Time the response was stored or last revalidated."""
+    expires: float
+    """Time until which the response can be used without revalidation."""
+    has_body: bool
+    """Whether the body is stored, or only the validators."""
+
+    def header(self, name: str) -> Optional[str]:
+        for k, v in self.headers.items():
+            if k.lower() == name.lower():
+                return v
+        return None
+
+    def is_fresh(self, *, now: float) -> bool:
+        return self.has_body and now < self.expires
+
+    def validators(self) -> dict[str, str]:
+        """Create headers of a conditional request revalidating the entry."""
+        headers: dict[str, str] = {}
+        etag: Optional[str] = self.header("ETag")
+        if etag:
+            headers["If-None-Match"] = etag
+        last_modified: Optional[str] = self.header("Last-Modified")
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+
+class Cache:
+    """HTTP cache stored in a directory.
+
+    Each entry is a JSON file with the response metadata, named by the digest of the request
+    key, and a file with the body. The modification time of the metadata file is the time of
+    the last use of the entry.
+
+    :param directory: Directory with the entries.
+    :param size: Maximal size of the stored entries in bytes.
+    """
+
+    def __init__(self, directory: pathlib.Path, *, size: int):
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+
+    def _paths(self, key: str) -> tuple[pathlib.Path, pathlib.Path]:
+        digest: str = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json", self.directory / f"{digest}.body"
+
+    def get(self, key: str) -> Optional[Entry]:
+        meta, _ = self._paths(key)
+        try:
+            with meta.open("r") as f:
+                entry = Entry(**json.load(f))
+            os.utime(meta)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as exc:
+            logger.debug("Ignoring unreadable cache entry %s: %s", meta, exc)
+            return None
+        if entry.key != key:
+            return None
+        return entry
+
+    def body(self, entry: Entry) -> Optional[bytes]:
+        _, body = self._paths(entry.key)
+        try:
+            with body.open("rb") as f:
+                return f.read()
+        except OSError as exc:
+            logger.debug("Could not read cached body %s: %s", body, exc)
+            return None
+
+    def _write(self, path: pathlib.Path, content: bytes) -> None:
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def put(self, entry: Entry, body: Optional[bytes]) -> None:
+        """Store the entry. The body is kept if `body` is not `None`."""
+        meta, body_path = self._paths(entry.key)
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            with self._lock:
+                if body is not None:
+                    self._write(body_path, body)
+                else:
+                    body_path.unlink(missing_ok=True)
+                self._write(meta, json.dumps(dataclasses.asdict(entry)).encode("utf-8"))
+                self._evict()
+        except OSError as exc:
+            logger.debug("Could not store cache entry %s: %s", meta, exc)
+
+    def delete(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as exc:
+                logger.debug("Could not remove cache entry %s: %s", path, exc)
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits into its size."""
+        entries: list[tuple[float, int, pathlib.Path]] = []
+        total: int = 0
+        for meta in self.directory.glob("*.json"):
+            try:
+                size: int = meta.stat().st_size
+                used: float = meta.stat().st_mtime
+                body: pathlib.Path = meta.with_suffix(".body")
+                if body.exists():
+                    size += body.stat().st_size
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, meta))
+            total += size
+
+        for used, size, meta in sorted(entries):
+            if total <= self.size:
+                break
+            logger.debug("Evicting cache entry %s.", meta)
+            meta.unlink(missing_ok=True)
+            meta.with_suffix(".body").unlink(missing_ok=True)
+            total -= size
+
+    def lookup(
+        self, key: str, headers: dict[str, str], labels: dict[str, str]
+    ) -> tuple[Optional["connection.Response"], Optional[Entry], dict[str, str]]:
+        """Look the request up before sending it.
+
+        A request with `Cache-Control: no-cache` or `no-store` is always sent unconditionally.
+
+        :returns: The cached response if it is fresh, the entry to revalidate, and headers of
+            the request, including validators of the entry.
+        """
+        directives = _parse_cache_control(get_header(headers, "Cache-Control"))
+        conditional: bool = any(
+            k.lower() in ("if-none-match", "if-modified-since") for k in headers
+        )
+        if "no-cache" in directives or "no-store" in directives or conditional:
+            metrics.inc("cache_requests_total", cache="http", **labels, result="bypass")
+            return None, None, headers
+
+        entry: Optional[Entry] = self.get(key)
+        if entry is None:
+            metrics.inc("cache_requests_total", cache="http", **labels, result="miss")
+            return None, None, headers
+
+        if entry.is_fresh(now=time.time()):
+            body: Optional[bytes] = self.body(entry)
+            if body is not None:
+                logger.debug("Using fresh cached response for %s.", key)
+                metrics.inc("cache_requests_total", cache="http", **labels, result="hit")
+                response = connection.Response(
+                    status=entry.status, headers=entry.headers, data=body
+                )
+                return response, None, headers
+
+        return None, entry, {**headers, **entry.validators()}
+
+    def store(
+        self,
+        key: str,
+        entry: Optional[Entry],
+        request_headers: dict[str, str],
+        response: "connection.Response",
+        labels: dict[str, str],
+    ) -> "connection.Response":
+        """Store the response, or refresh the revalidated entry.
+
+        :param entry: The entry the request revalidated.
+        :returns: The response for the caller; for a 304 response to a revalidation of an entry
+            with a body, the cached response.
+        """
+        now: float = time.time()
+        if entry is not None and response.status == 304:
+            entry.headers = {**entry.headers, **response.headers}
+            entry.stored, entry.expires = now, _freshness(response, now=now)
+            body: Optional[bytes] = self.body(entry) if entry.has_body else None
+            self.put(entry, body)
+            metrics.inc("cache_requests_total", cache="http", **labels, result="revalidated")
+            if body is None:
+                return response
+            return connection.Response(status=entry.status, headers=entry.headers, data=body)
+
+        if entry is not None:
+            metrics.inc("cache_requests_total", cache="http", **labels, result="stale")
+
+        request_directives = _parse_cache_control(get_header(request_headers, "Cache-Control"))
+        directives = _parse_cache_control(response.header("Cache-Control"))
+        vary: str = (response.header("Vary") or "").lower()
+        cacheable: bool = (
+            response.status == 200
+            and "no-store" not in directives
+            and "no-store" not in request_directives
+            and vary.replace("accept-encoding", "").strip(" ,") == ""
+        )
+        expires: float = _freshness(response, now=now)
+        validated: bool = bool(response.header("ETag") or response.header("Last-Modified"))
+        if not cacheable or (expires <= now and not validated):
+            if entry is not None:
+                self.delete(key)
+            return response
+
+        has_body: bool = len(response.data) <= self.size // MAXIMAL_BODY_FRACTION
+        self.put(
+            Entry(
+                key=key,
+                status=response.status,
+                headers=response.headers,
+                stored=now,
+                expires=expires,
+                has_body=has_body,
+            ),
+            response.data if has_body else None,
+        )
+        return response
+
+
+_cache: Optional[Cache] = None
+
+
+def get() -> Optional[Cache]:
+    """Get the shared cache, or `None` if it is disabled."""
+    global _cache
+    size: int = config.get().network.cache_size
+    if not size:
+        return None
+    if _cache is None or _cache.size != size:
+        _cache = Cache(CACHE_DIRECTORY, size=size)
+    return _cache
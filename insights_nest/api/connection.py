@@ -1,20 +1,461 @@
+import base64
 import dataclasses
+import email.utils
+import functools
+import gzip
 import http.client
 import json
 import logging
+import math
 import os
+import random
+import select
+import socket
 import ssl
+import threading
 import time
 import urllib.request
 import urllib.parse
-from typing import Optional
+import zlib
+from typing import Callable, Optional
 
 from insights_nest import config
+from insights_nest import metrics
+from insights_nest.api import cache
+from insights_nest.api import resolver
+from insights_nest.api import throttle
 
 logger = logging.getLogger(__name__)
 
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+"""Statuses of responses to idempotent requests that are retried."""
+UNPROCESSED_STATUSES = frozenset({429, 503})
+"""Statuses of responses that guarantee the request was not processed."""
+COALESCED_METHODS = frozenset({"GET", "HEAD"})
+"""Methods of requests which are merged with identical ones (see `SingleFlight`)."""
 
-# TODO Create Request dataclass and add it as a field to the Response?
+ACCEPT_ENCODING = "gzip, deflate"
+"""Content codings of responses the client can decode."""
+CHUNK_SIZE: int = 64 * 1024
+
+_backoff_until: float = 0.0
+_too_many_requests: int = 0
+
+_budget_lock = threading.Lock()
+_budget: float = math.inf
+
+
+def set_budget(seconds: Optional[float]) -> None:
+    """Limit the total time spent in HTTP requests, including waiting for retries.
+
+    :param seconds: The limit. `None` or zero removes it.
+    """
+    global _budget
+    with _budget_lock:
+        _budget = seconds if seconds else math.inf
+
+
+def _spend_budget(seconds: float) -> None:
+    global _budget
+    with _budget_lock:
+        _budget -= seconds
+
+
+def remaining_budget() -> float:
+    """Get the number of seconds left for HTTP requests."""
+    return _budget
+
+
+def backoff_until() -> float:
+    """Get the time until which the server asked us not to send more requests."""
+    return _backoff_until
+
+
+def too_many_requests() -> int:
+    """Get the number of 429 responses received so far, e.g. to adapt the request rate."""
+    return _too_many_requests
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Parse the `Retry-After` header into a number of seconds.
+
+    :param value: Either a number of seconds or an HTTP date.
+    """
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(
+    method: str,
+    attempt: int,
+    *,
+    response: Optional["Response"] = None,
+    error: Optional[BaseException] = None,
+) -> Optional[float]:
+    """Decide whether a failed attempt should be retried.
+
+    Requests with idempotent methods are retried on network errors and on 429/502/503/504
+    responses; other requests only on 429/503 responses, which guarantee the request was not
+    processed. The delay grows exponentially with full jitter, unless the server asks for a
+    specific one with `Retry-After`. No retry is planned if it would exceed the time budget.
+
+    :param attempt: Number of the failed attempt, starting at zero.
+    :returns: Seconds to wait before the next attempt, or `None` if it should not be retried.
+    """
+    cfg: config.Network = config.get().network
+    if attempt >= cfg.retries:
+        return None
+
+    delay: float = random.uniform(0, min(cfg.backoff_max, cfg.backoff * 2**attempt))
+    if error is not None:
+        if isinstance(error, ssl.SSLCertVerificationError) or method not in IDEMPOTENT_METHODS:
+            return None
+    elif response is not None:
+        statuses = RETRY_STATUSES if method in IDEMPOTENT_METHODS else UNPROCESSED_STATUSES
+        if response.status not in statuses:
+            return None
+        header: Optional[str] = response.header("Retry-After")
+        retry_after: Optional[float] = parse_retry_after(header) if header is not None else None
+        if retry_after is not None:
+            delay = retry_after
+
+    if delay >= remaining_budget():
+        logger.debug("Not retrying, the time budget would be exceeded.")
+        return None
+    return delay
+
+
+def record_response(
+    labels: dict[str, str],
+    method: str,
+    response: "Response",
+    *,
+    seconds: float,
+    sent: int,
+    saved: int = 0,
+) -> None:
+    """Account a received response in metrics and remember requests to slow down.
+
+    :param sent: Size of the request body as sent.
+    :param saved: Number of bytes the compression of the request body saved.
+    """
+    global _backoff_until, _too_many_requests
+
+    received: int = len(response.data)
+    if response.encoded_size is not None:
+        metrics.inc(
+            "http_compression_saved_bytes_total",
+            received - response.encoded_size,
+            **labels,
+            direction="received",
+        )
+        received = response.encoded_size
+    if saved:
+        metrics.inc("http_compression_saved_bytes_total", saved, **labels, direction="sent")
+
+    metrics.inc("http_requests_total", **labels, method=method, code=str(response.status))
+    metrics.inc("http_request_seconds_total", seconds, **labels)
+    metrics.inc("http_sent_bytes_total", sent, **labels)
+    metrics.inc("http_received_bytes_total", received, **labels)
+
+    if response.status == 429:
+        _too_many_requests += 1
+    if response.status in UNPROCESSED_STATUSES:
+        header: Optional[str] = response.header("Retry-After")
+        delay: Optional[float] = parse_retry_after(header) if header is not None else None
+        if delay is not None:
+            logger.debug("Server asked to retry after %.1f seconds.", delay)
+            _backoff_until = max(_backoff_until, time.time() + delay)
+
+    if os.environ.get("NEST_DEBUG_HTTP", None) is not None:
+        print("NEST_DEBUG_HTTP", response)
+
+
+_uncompressed_apis: set[type] = set()
+
+
+def compress_request(
+    cls: type, headers: dict[str, str], data: Optional[bytes]
+) -> tuple[dict[str, str], Optional[bytes]]:
+    """Gzip the request body, if the API accepts it and the body is large enough.
+
+    :param cls: Class of the connection. The API accepts compressed requests if its
+        `COMPRESS_REQUESTS` is set, or its root is listed in `[network] compress_apis`.
+    :returns: Headers and the body to send.
+    """
+    cfg: config.Network = config.get().network
+    threshold: int = cfg.compress_threshold
+    accepted: bool = getattr(cls, "COMPRESS_REQUESTS", False) or cls.PATH in cfg.compress_apis
+    if (
+        data is None
+        or not threshold
+        or len(data) < threshold
+        or not accepted
+        or cls in _uncompressed_apis
+        or any(k.lower() == "content-encoding" for k in headers)
+    ):
+        return headers, data
+
+    compressed: bytes = gzip.compress(data, mtime=0)
+    if len(compressed) >= len(data):
+        return headers, data
+    return {**headers, "Content-Encoding": "gzip"}, compressed
+
+
+def reject_compression(cls: type) -> None:
+    """Stop compressing requests to the API after it refused a compressed one."""
+    logger.info("API %s does not accept compressed requests, not compressing them.", cls.PATH)
+    _uncompressed_apis.add(cls)
+
+
+class Decoder:
+    """Decode a response body incrementally, according to its `Content-Encoding`.
+
+    :param encoding: Value of the `Content-Encoding` header.
+    """
+
+    def __init__(self, encoding: Optional[str]):
+        self.encoding: str = (encoding or "identity").strip().lower()
+        self.size: int = 0
+        """Number of encoded bytes fed in."""
+        self._chunks: list[bytes] = []
+        self._zlib = None
+        if self.encoding in ("gzip", "x-gzip"):
+            self._zlib = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        elif self.encoding != "identity":
+            logger.warning("Unknown content coding '%s', keeping the body as is.", encoding)
+
+    @property
+    def encoded(self) -> bool:
+        return self._zlib is not None
+
+    def feed(self, chunk: bytes) -> None:
+        if self._zlib is None:
+            self._chunks.append(chunk)
+        elif self.encoding == "deflate" and self.size == 0:
+            # Some servers send raw deflate streams without the zlib wrapper
+            try:
+                self._chunks.append(self._zlib.decompress(chunk))
+            except zlib.error:
+                self._zlib = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+                self._chunks.append(self._zlib.decompress(chunk))
+        else:
+            self._chunks.append(self._zlib.decompress(chunk))
+        self.size += len(chunk)
+
+    def finish(self) -> bytes:
+        if self._zlib is not None:
+            self._chunks.append(self._zlib.flush())
+        return b"".join(self._chunks)
+
+
+def create_tls_context() -> ssl.SSLContext:
+    """Create a TLS context authenticating with the RHSM identity certificate."""
+    cfg: config.Configuration = config.get()
+
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = True
+    ctx.verify_mode = ssl.CERT_REQUIRED
+    ctx.load_cert_chain(
+        certfile=f"{cfg.network.identity_certificate!s}",
+        keyfile=f"{cfg.network.identity_key!s}",
+    )
+    ctx.load_verify_locations(cafile=f"{cfg.network.ca_certificates!s}")
+    return ctx
+
+
+@dataclasses.dataclass(frozen=True)
+class Request:
+    method: str
+    host: str
+    port: int
+    url: str
+    """Path of the request, including the query."""
+    headers: dict[str, str]
+    data: Optional[bytes]
+
+
+def get_proxy(host: str) -> Optional[config.Proxy]:
+    """Get the proxy that should be used to reach the host.
+
+    Hosts listed in the `no_proxy` option of rhsm.conf or the `no_proxy` environment variable
+    are contacted directly.
+    """
+    proxy: config.Proxy = config.get().network.proxy
+    if not proxy.ok:
+        return None
+
+    no_proxy: str = ",".join(
+        value
+        for value in (proxy.no_proxy, os.environ.get("no_proxy"), os.environ.get("NO_PROXY"))
+        if value
+    )
+    if no_proxy and urllib.request.proxy_bypass_environment(host, {"no": no_proxy}):
+        logger.debug("Host %s is excluded from the proxy.", host)
+        return None
+
+    if proxy.scheme != "http":
+        logger.warning("Proxy scheme '%s' is not supported, using 'http'.", proxy.scheme)
+    return proxy
+
+
+def proxy_headers(proxy: config.Proxy) -> dict[str, str]:
+    """Create headers of the CONNECT request."""
+    if not proxy.username:
+        return {}
+    credentials: bytes = f"{proxy.username}:{proxy.password}".encode("utf-8")
+    return {"Proxy-Authorization": f"Basic {base64.b64encode(credentials).decode('ascii')}"}
+
+
+def open_tunnel(sock: socket.socket, host: str, port: int, proxy: config.Proxy) -> None:
+    """Establish a CONNECT tunnel to the host over a blocking socket connected to the proxy.
+
+    :raises OSError: The proxy refused the tunnel or closed the connection.
+    """
+    lines: list[str] = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+    lines += [f"{k}: {v}" for k, v in proxy_headers(proxy).items()]
+    sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1"))
+
+    reply: bytes = b""
+    while b"\r\n\r\n" not in reply:
+        chunk: bytes = sock.recv(4096)
+        if not chunk:
+            raise OSError("Proxy closed the connection.")
+        reply += chunk
+    status: str = reply.split(b" ", 2)[1].decode("iso-8859-1")
+    if status != "200":
+        raise OSError(f"Proxy refused the tunnel with status {status}.")
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection resuming TLS sessions of earlier connections to the same server.
+
+    Resumed sessions skip the certificate exchange and verification, saving a round trip and
+    CPU time for every new connection. The TCP connection is established by `resolver`.
+    """
+
+    _context: ssl.SSLContext
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timing = resolver.Timing()
+        """Durations of establishing the connection (to the proxy, if there is one)."""
+        self.tls_seconds: float = 0.0
+        self._create_connection = functools.partial(
+            resolver.create_connection, timing=self.timing
+        )
+
+    def _session_key(self) -> tuple:
+        return self._tunnel_host or self.host, self._tunnel_port or self.port, self._context
+
+    def connect(self) -> None:
+        # Open the TCP connection and the proxy tunnel, if there is one
+        http.client.HTTPConnection.connect(self)
+
+        with _tls_lock:
+            session: Optional[ssl.SSLSession] = _tls_sessions.get(self._session_key())
+        started: float = time.monotonic()
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=self._tunnel_host or self.host, session=session
+        )
+        self.tls_seconds = time.monotonic() - started
+        logger.debug("TLS session %s.", "resumed" if self.sock.session_reused else "created")
+
+    def store_session(self) -> None:
+        """Remember the TLS session for the following connections.
+
+        With TLS 1.3, the session is only available after some data were received.
+        """
+        if self.sock is None or self.sock.session is None:
+            return
+        with _tls_lock:
+            _tls_sessions[self._session_key()] = self.sock.session
+
+
+def record_connect(host: str, timing: resolver.Timing, tls_seconds: float) -> None:
+    """Report the durations of establishing a new connection to the host (or proxy)."""
+    logger.debug(
+        "Connected to %s (%s): resolve %.1f ms%s, connect %.1f ms, TLS %.1f ms.",
+        host,
+        timing.address,
+        timing.resolve * 1000,
+        " (cached)" if timing.cached else "",
+        timing.connect * 1000,
+        tls_seconds * 1000,
+    )
+    metrics.inc("http_connect_seconds_total", timing.resolve, phase="resolve")
+    metrics.inc("http_connect_seconds_total", timing.connect, phase="connect")
+    metrics.inc("http_connect_seconds_total", tls_seconds, phase="tls")
+
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    """Check whether the server has closed an idle connection.
+
+    An idle connection has nothing to read, unless the server has closed it (or sent something
+    unexpected, which makes it unusable as well).
+    """
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class _Pool:
+    """Idle keep-alive connections, shared by all `Connection` objects of the process."""
+
+    MAXIMAL_IDLE: int = 8
+    """Maximal number of idle connections kept per server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[_HTTPSConnection]] = {}
+
+    def get(self, key: tuple) -> Optional[_HTTPSConnection]:
+        """Get an idle connection, skipping the ones the server has closed in the meantime."""
+        while True:
+            with self._lock:
+                idle: list[_HTTPSConnection] = self._idle.get(key, [])
+                if not idle:
+                    return None
+                conn: _HTTPSConnection = idle.pop()
+            if not _is_dropped(conn):
+                return conn
+            logger.debug("Idle connection to %s was closed by the server.", conn.host)
+            conn.close()
+
+    def put(self, key: tuple, conn: _HTTPSConnection) -> None:
+        with self._lock:
+            idle: list[_HTTPSConnection] = self._idle.setdefault(key, [])
+            if len(idle) < self.MAXIMAL_IDLE:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+_pool = _Pool()
+
+_tls_lock = threading.Lock()
+_tls_contexts: dict[type, ssl.SSLContext] = {}
+_tls_sessions: dict[tuple, ssl.SSLSession] = {}
 
 
 @dataclasses.dataclass(frozen=True)
@@ -22,6 +463,9 @@ class Response:
     status: int
     headers: dict[str, str]
     data: bytes
+    """Body of the response, decoded if it was compressed."""
+    encoded_size: Optional[int] = dataclasses.field(default=None, repr=False, compare=False)
+    """Size of the body as received, if it was compressed."""
 
     def is_json(self) -> bool:
         for k, v in self.headers.items():
@@ -32,6 +476,239 @@ class Response:
     def json(self) -> dict:
         return json.loads(self.data)
 
+    def header(self, name: str) -> Optional[str]:
+        """Get a header value, ignoring the case of its name."""
+        for k, v in self.headers.items():
+            if k.lower() == name.lower():
+                return v
+        return None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Identical requests in flight, and recent responses to them.
+
+    Identical GET requests sent by several threads at the same time share one network call,
+    and successful responses are reused for `[network] memo_window` seconds afterwards. Any
+    other request to the same API forgets the reused responses, as it may have changed them.
+
+    Keys start with the host, port and path of the API, followed by the request itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[tuple, _Call] = {}
+        self._memo: dict[tuple, tuple[float, Response]] = {}
+
+    @staticmethod
+    def key(api: tuple, method: str, url: str, headers: dict[str, str]) -> tuple:
+        return (*api, method, url, tuple(sorted((k.lower(), v) for k, v in headers.items())))
+
+    def recall(self, key: tuple) -> Optional[Response]:
+        with self._lock:
+            item: Optional[tuple[float, Response]] = self._memo.get(key)
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    def remember(self, key: tuple, response: Response) -> None:
+        window: float = config.get().network.memo_window
+        if window <= 0 or response.status >= 400:
+            return
+        now: float = time.monotonic()
+        with self._lock:
+            self._memo = {k: v for k, v in self._memo.items() if v[0] > now}
+            self._memo[key] = (now + window, response)
+
+    def forget(self, api: tuple) -> None:
+        """Forget the responses of the API, e.g. after it was sent a modifying request."""
+        with self._lock:
+            self._memo = {k: v for k, v in self._memo.items() if k[: len(api)] != api}
+
+    def do(
+        self, key: tuple, labels: dict[str, str], send: Callable[[], Response], *, recall: bool
+    ) -> Response:
+        """Send the request, unless an identical one is in flight or was sent recently.
+
+        :param send: Function sending the request.
+        :param recall: Whether a recent response may be reused.
+        """
+        if recall:
+            response: Optional[Response] = self.recall(key)
+            if response is not None:
+                metrics.inc("http_coalesced_requests_total", **labels, result="memo")
+                return response
+
+        with self._lock:
+            call: Optional[_Call] = self._calls.get(key)
+            leader: bool = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.inc("http_coalesced_requests_total", **labels, result="joined")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response  # type: ignore[return-value]
+
+        try:
+            call.response = send()
+            self.remember(key, call.response)
+            return call.response
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+single_flight = SingleFlight()
+
+
+class Transport:
+    """Sends single requests to the server.
+
+    Retries, caching, compression and metrics are handled by `Connection`, transports only move
+    the requests and responses. They can be replaced, e.g. by recorded sessions (see `replay`).
+    """
+
+    def send(self, connection: "Connection", request: Request) -> Response:
+        """Send the request.
+
+        :param connection: Connection sending the request, e.g. for its TLS context.
+        """
+        raise NotImplementedError
+
+
+class HTTPSTransport(Transport):
+    """Transport over HTTPS, tunneled through the proxy if there is one.
+
+    Idle connections (and proxy tunnels) are reused. If a reused connection turns out to be
+    closed by the server, a request with an idempotent method is sent again over a new one.
+    """
+
+    def _connect(
+        self, host: str, port: int, context: ssl.SSLContext, *, timeout: float
+    ) -> _HTTPSConnection:
+        """Open a new connection to the server, tunneled through the proxy if there is one."""
+        proxy: Optional[config.Proxy] = get_proxy(host)
+        if proxy is None:
+            conn = _HTTPSConnection(host, port, context=context, timeout=timeout)
+        else:
+            logger.debug("Tunneling through proxy %s:%d.", proxy.host, proxy.port)
+            conn = _HTTPSConnection(proxy.host, proxy.port, context=context, timeout=timeout)
+            conn.set_tunnel(host, port, headers=proxy_headers(proxy))
+        conn.connect()
+        return conn
+
+    def send(self, connection: "Connection", request: Request) -> Response:
+        cfg: config.Network = config.get().network
+        remaining: float = remaining_budget()
+        if remaining <= 0:
+            raise TimeoutError("The time budget for HTTP requests has been exhausted.")
+
+        context: ssl.SSLContext = connection._tls_context()
+        key: tuple = (request.host, request.port, context)
+        conn: Optional[_HTTPSConnection] = _pool.get(key)
+        reused: bool = conn is not None
+        if conn is None:
+            conn = self._connect(
+                request.host,
+                request.port,
+                context,
+                timeout=min(cfg.connect_timeout, remaining),
+            )
+            record_connect(conn.host, conn.timing, conn.tls_seconds)
+        metrics.inc("http_connections_total", reused=str(reused).lower())
+
+        try:
+            conn.sock.settimeout(min(cfg.read_timeout, remaining))
+
+            logger.debug(
+                "Request %s %s:%s%s (headers=%s)",
+                request.method,
+                request.host,
+                request.port,
+                request.url,
+                request.headers,
+            )
+            if request.data is None:
+                conn.request(method=request.method, url=request.url, headers=request.headers)
+            else:
+                # The body is sent in pieces, as the upload limit allows
+                conn.request(
+                    method=request.method,
+                    url=request.url,
+                    headers={**request.headers, "Content-Length": str(len(request.data))},
+                    body=throttle.chunks(request.data),
+                )
+
+            now: float = time.time()
+            raw: http.client.HTTPResponse = conn.getresponse()
+            delta: float = time.time() - now
+            logger.debug("Response with code %d after %.1f ms", raw.status, delta * 1000)
+
+            decoder = Decoder(raw.getheader("Content-Encoding"))
+            while chunk := raw.read(CHUNK_SIZE):
+                decoder.feed(chunk)
+                throttle.take(throttle.DOWNLOAD, len(chunk))
+            rich = Response(
+                status=raw.status,
+                headers=dict(raw.headers.items()),
+                data=decoder.finish(),
+                encoded_size=decoder.size if decoder.encoded else None,
+            )
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            # The server may have processed the request already; `retry_delay` decides then
+            if not reused or request.method not in IDEMPOTENT_METHODS:
+                raise
+            logger.debug("Reused connection was closed by the server, opening a new one.")
+            return self.send(connection, request)
+        except BaseException:
+            conn.close()
+            raise
+
+        conn.store_session()
+        if raw.will_close:
+            conn.close()
+        else:
+            _pool.put(key, conn)
+
+        return rich
+
+
+_transport: Optional[Transport] = None
+
+
+def set_transport(transport: Optional[Transport]) -> None:
+    """Replace the transport of all connections. `None` restores the default one."""
+    global _transport
+    _transport = transport
+
+
+def get_transport() -> Transport:
+    """Get the transport of all connections.
+
+    It is `HTTPSTransport`, unless a session is recorded or replayed (see `replay`).
+    """
+    global _transport
+    if _transport is None:
+        # The module depends on this one
+        from insights_nest.api import replay
+
+        _transport = replay.from_environment(HTTPSTransport())
+    return _transport
+
 
 class Connection:
     HOST: str
@@ -41,23 +718,17 @@ class Connection:
     PATH: str
     """API endpoint root. E.g. `/api/v1`."""
 
-    # TODO Add support for proxy
+    COMPRESS_REQUESTS: bool = False
+    """Whether the API accepts gzip-compressed request bodies (`Content-Encoding: gzip`)."""
+    CACHE: bool = True
+    """Whether GET responses are stored in and served from the HTTP cache (see `cache`)."""
+    TRANSPORT: Optional[Transport] = None
+    """Transport of the connections of the class. If `None`, the shared one is used."""
+
     # TODO Add support for insecure communication
-    # TODO Add support for timeouts
-    # TODO Add support for connection reuse
 
     def _create_tls_context(self) -> ssl.SSLContext:
-        cfg: config.Configuration = config.get()
-
-        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        ctx.check_hostname = True
-        ctx.verify_mode = ssl.CERT_REQUIRED
-        ctx.load_cert_chain(
-            certfile=f"{cfg.network.identity_certificate!s}",
-            keyfile=f"{cfg.network.identity_key!s}",
-        )
-        ctx.load_verify_locations(cafile=f"{cfg.network.ca_certificates!s}")
-        return ctx
+        return create_tls_context()
 
     def _request(
         self,
@@ -68,33 +739,124 @@ class Connection:
         headers: Optional[dict[str, str]] = None,
         data: Optional[bytes] = None,
     ) -> Response:
-        url = f"{self.PATH}{endpoint}"
-        if params:
-            url += f"?{urllib.parse.urlencode(params)}"
-        if headers is None:
-            headers = {}
+        """Send the request, merging it with identical ones (see `SingleFlight`)."""
+        url: str = self._url(endpoint, params)
+        labels = {"api": self.PATH, "endpoint": metrics.endpoint_label(endpoint)}
+        headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+        api: tuple = (self.HOST, self.PORT, self.PATH)
 
-        context: ssl.SSLContext = self._create_tls_context()
-        conn = http.client.HTTPSConnection(host=self.HOST, port=self.PORT, context=context)
+        if method not in COALESCED_METHODS or data is not None:
+            try:
+                return self._perform(method, url, labels, headers=headers, data=data)
+            finally:
+                single_flight.forget(api)
 
-        logger.debug(f"Request {method} {self.HOST}:{self.PORT}{url} (headers={headers})")
-        conn.request(method=method, url=url, headers=headers, body=data)
+        return single_flight.do(
+            SingleFlight.key(api, method, url, headers),
+            labels,
+            lambda: self._perform(method, url, labels, headers=headers, data=data),
+            recall="no-cache" not in cache.get_header(headers, "Cache-Control").lower(),
+        )
 
-        now: float = time.time()
-        raw: http.client.HTTPResponse = conn.getresponse()
-        delta: float = time.time() - now
-        logger.debug(f"Response with code {raw.status} after {delta * 100:.1f} ms")
+    def _perform(
+        self,
+        method: str,
+        url: str,
+        labels: dict[str, str],
+        *,
+        headers: dict[str, str],
+        data: Optional[bytes],
+    ) -> Response:
+        """Send the request, retrying it on transient failures (see `retry_delay`).
 
-        rich = Response(
-            status=raw.status,
-            headers=dict(raw.headers.items()),
-            data=raw.read(),
-        )
+        GET requests go through the HTTP cache.
+        """
+        http_cache: Optional[cache.Cache] = None
+        entry: Optional[cache.Entry] = None
+        if self.CACHE and method == "GET":
+            http_cache = cache.get()
+        if http_cache is not None:
+            cached, entry, headers = http_cache.lookup(self._cache_key(url), headers, labels)
+            if cached is not None:
+                return cached
 
-        if os.environ.get("NEST_DEBUG_HTTP", None) is not None:
-            print("NEST_DEBUG_HTTP", rich)
+        body_headers, body = compress_request(type(self), headers, data)
+        transport: Transport = self.TRANSPORT if self.TRANSPORT is not None else get_transport()
 
-        return rich
+        attempt: int = 0
+        while True:
+            started: float = time.monotonic()
+            try:
+                response: Response = transport.send(
+                    self, Request(method, self.HOST, self.PORT, url, body_headers, body)
+                )
+            except (OSError, http.client.HTTPException) as exc:
+                _spend_budget(time.monotonic() - started)
+                logger.debug("Request %s %s failed: %s", method, url, exc)
+                delay: Optional[float] = retry_delay(method, attempt, error=exc)
+                if delay is None:
+                    raise
+                reason: str = type(exc).__name__
+            else:
+                _spend_budget(time.monotonic() - started)
+                record_response(
+                    labels,
+                    method,
+                    response,
+                    seconds=time.monotonic() - started,
+                    sent=len(body) if body else 0,
+                    saved=len(data) - len(body) if data and body else 0,
+                )
+                if response.status == 415 and body is not data:
+                    reject_compression(type(self))
+                    body_headers, body = headers, data
+                    continue
+                delay = retry_delay(method, attempt, response=response)
+                if delay is None:
+                    break
+                reason = str(response.status)
+
+            attempt += 1
+            logger.debug(
+                "Retrying %s %s (attempt %d, reason %s) in %.1f s.",
+                method,
+                url,
+                attempt,
+                reason,
+                delay,
+            )
+            metrics.inc("http_retries_total", **labels, reason=reason)
+            metrics.inc("http_retry_seconds_total", delay, **labels)
+            time.sleep(delay)
+            _spend_budget(delay)
+
+        if http_cache is not None:
+            return http_cache.store(self._cache_key(url), entry, headers, response, labels)
+        return response
+
+    def _url(self, endpoint: str, params: Optional[dict[str, str]] = None) -> str:
+        url = f"{self.PATH}{endpoint}"
+        if params:
+            url += f"?{urllib.parse.urlencode(params)}"
+        return url
+
+    def _cache_key(self, url: str) -> str:
+        return f"{self.HOST}:{self.PORT}{url}"
+
+    def invalidate(self, endpoint: str, *, params: Optional[dict[str, str]] = None) -> None:
+        """Remove the cached response of the endpoint."""
+        single_flight.forget((self.HOST, self.PORT, self.PATH))
+        http_cache: Optional[cache.Cache] = cache.get()
+        if http_cache is not None:
+            http_cache.delete(self._cache_key(self._url(endpoint, params)))
+
+    def _tls_context(self) -> ssl.SSLContext:
+        """Get the TLS context, shared by all connections of the class."""
+        cls = type(self)
+        with _tls_lock:
+            if cls not in _tls_contexts:
+                _tls_contexts[cls] = self._create_tls_context()
+            return _tls_contexts[cls]
 
     def get(
         self,
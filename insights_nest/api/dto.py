@@ -17,5 +17,5 @@ def from_json(cls: dataclasses.dataclass, data: dict):
     for k in missing:
         data[k] = dataclasses.MISSING
     if omitted:
-        logger.debug(f"{omitted} fields were omitted from {cls.__name__}")
+        logger.debug("%d fields were omitted from %s", omitted, cls.__name__)
     return cls(**data)
@@ -5,6 +5,7 @@ from typing import Optional
 
 from insights_nest import config
 from insights_nest.api import form, dto
+from insights_nest.api.async_connection import AsyncConnection
 from insights_nest.api.connection import Connection, Response
 
 
@@ -35,6 +36,29 @@ class IngressConnection(Connection):
     PATH = "/api/ingress/v1"
 
 
+class AsyncIngressConnection(AsyncConnection):
+    HOST = config.get().api.host
+    PORT = config.get().api.port
+    PATH = "/api/ingress/v1"
+
+
+def _create_payload(archive: pathlib.Path, content_type: str, facts: dict) -> form.Form:
+    payload = form.Form()
+    payload.add_file(
+        field="file",
+        filename=archive.name,
+        content_type=content_type,
+        content=archive.open("rb").read(),
+    )
+    payload.add_file(
+        field="metadata",
+        filename="metadata",
+        content_type=None,
+        content=json.dumps(facts).encode("utf-8"),
+    )
+    return payload
+
+
 class Ingress:
     def __init__(self, connection: Optional[IngressConnection] = None):
         self.connection = connection if connection is not None else IngressConnection()
@@ -46,21 +70,23 @@ class Ingress:
         :param content_type: Content type of the payload file.
         :param facts: Canonical facts.
         """
-        payload = form.Form()
-        payload.add_file(
-            field="file",
-            filename=archive.name,
-            content_type=content_type,
-            content=archive.open("rb").read(),
-        )
-        payload.add_file(
-            field="metadata",
-            filename="metadata",
-            content_type=None,
-            content=json.dumps(facts).encode("utf-8"),
+        payload: form.Form = _create_payload(archive, content_type, facts)
+        raw: Response = self.connection.post(
+            "/upload",
+            headers={"Content-Type": payload.content_type},
+            data=payload.build(),
         )
+        return UploadResponse.from_json(raw.json())
 
-        raw: Response = self.connection.post(
+
+class AsyncIngress:
+    def __init__(self, connection: Optional[AsyncIngressConnection] = None):
+        self.connection = connection if connection is not None else AsyncIngressConnection()
+
+    async def upload(self, archive: pathlib.Path, content_type: str, facts: dict):
+        """Upload an archive to Insights. See `Ingress.upload`."""
+        payload: form.Form = _create_payload(archive, content_type, facts)
+        raw: Response = await self.connection.post(
             "/upload",
             headers={"Content-Type": payload.content_type},
             data=payload.build(),
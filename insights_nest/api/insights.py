@@ -1,6 +1,7 @@
 from typing import Optional
 
 from insights_nest import config
+from insights_nest.api.async_connection import AsyncConnection
 from insights_nest.api.connection import Connection, Response
 from insights_nest.api.module_update_router import Route
 
@@ -11,26 +12,80 @@ class InsightsConnection(Connection):
     PATH = "/api/v1"
 
 
+class AsyncInsightsConnection(AsyncConnection):
+    HOST = config.get().api.host
+    PORT = config.get().api.port
+    PATH = "/api/v1"
+
+
+def _egg_endpoint(route: Route) -> str:
+    return f"/static{route.url}/insights-core.egg"
+
+
+def _egg_delta_endpoint(route: Route, digest: str) -> str:
+    return f"/static{route.url}/deltas/{digest}.delta"
+
+
+def _egg_headers(revalidate: bool, etag: Optional[str] = None) -> dict:
+    # The egg is too large for the HTTP cache to store it, only its validators are kept
+    if not revalidate:
+        return {"Cache-Control": "no-cache"}
+    return {"If-None-Match": etag} if etag else {}
+
+
 class Insights:
     def __init__(self, connection: Optional[InsightsConnection] = None):
         self.connection = connection if connection is not None else InsightsConnection()
 
-    def get_egg(self, route: Route, *, etag: Optional[str] = None) -> Response:
+    def get_egg(
+        self, route: Route, *, revalidate: bool = True, etag: Optional[str] = None
+    ) -> Response:
         """Download the egg.
 
         :param route: Route (e.g. `/release`, `/testing`) to the release of the egg.
-        :param etag: Timestamp of local egg.
+        :param revalidate: Send the validators of the previously downloaded egg; the response
+            is then 304 if the egg has not changed. Otherwise, the egg is always downloaded.
+        :param etag: ETag of an egg that was not downloaded through the HTTP cache, e.g. by an
+            older version of the client. It is revalidated instead of the cached validators.
         :returns: Binary content (the egg, if present) and headers from the response.
         """
-        headers: dict = {}
-        if etag is not None:
-            headers["If-None-Match"] = etag
+        raw: Response = self.connection.get(
+            _egg_endpoint(route), headers=_egg_headers(revalidate, etag)
+        )
+        return raw
+
+    def get_egg_delta(self, route: Route, *, digest: str) -> Response:
+        """Download the delta from an egg to the latest one (see `insights_nest._core.delta`).
 
+        :param route: Route (e.g. `/release`, `/testing`) to the release of the egg.
+        :param digest: SHA-256 digest of the egg the delta starts from.
+        :returns: The delta; 304 if the egg is the latest one, 404 if there is no delta for it.
+        """
         raw: Response = self.connection.get(
-            f"/static{route.url}/insights-core.egg", headers=headers
+            _egg_delta_endpoint(route, digest), headers={"Cache-Control": "no-store"}
         )
         return raw
 
+    def forget_egg(self, route: Route) -> None:
+        """Forget the validators of the downloaded egg, e.g. because it was not activated."""
+        self.connection.invalidate(_egg_endpoint(route))
+
     def get_egg_signature(self, route: Route) -> Response:
         raw: Response = self.connection.get(f"/static{route.url}/insights-core.egg.asc")
         return raw
+
+
+class AsyncInsights:
+    def __init__(self, connection: Optional[AsyncInsightsConnection] = None):
+        self.connection = connection if connection is not None else AsyncInsightsConnection()
+
+    async def get_egg(self, route: Route, *, revalidate: bool = True) -> Response:
+        """Download the egg. See `Insights.get_egg`."""
+        raw: Response = await self.connection.get(
+            _egg_endpoint(route), headers=_egg_headers(revalidate)
+        )
+        return raw
+
+    async def get_egg_signature(self, route: Route) -> Response:
+        raw: Response = await self.connection.get(f"/static{route.url}/insights-core.egg.asc")
+        return raw
@@ -1,14 +1,23 @@
+import concurrent.futures
 import dataclasses
+import http.client
 import json
 import logging
-from typing import List, Optional
+import math
+import time
+from typing import Iterator, List, Optional
 
 from insights_nest import config
+from insights_nest import metrics
 from insights_nest.api import dto
-from insights_nest.api.connection import Connection, Response
+from insights_nest.api.async_connection import AsyncConnection
+from insights_nest.api.connection import Connection, Response, retry_delay
 
 logger = logging.getLogger(__name__)
 
+MAXIMAL_PER_PAGE: int = 100
+"""Maximal number of hosts on one page the Inventory API returns."""
+
 
 @dataclasses.dataclass(frozen=True)
 class Host:
@@ -63,6 +72,45 @@ class InventoryConnection(Connection):
     PATH = "/api/inventory/v1"
 
 
+class AsyncInventoryConnection(AsyncConnection):
+    HOST = config.get().api.host
+    PORT = config.get().api.port
+    PATH = "/api/inventory/v1"
+
+
+def _parse_host(raw: Response, machine_id: str) -> Optional[Host]:
+    hosts: Hosts = Hosts.from_json(raw.json())
+    if len(hosts.results) == 0:
+        logger.debug("Host with Client UUID '%s' not found.", machine_id)
+        return None
+    if len(hosts.results) > 1:
+        logger.warning("Inventory returned more than one host. Using the first one.")
+    return hosts.results[0]
+
+
+def _host_update(display_name: Optional[str], ansible_name: Optional[str]) -> bytes:
+    # FIXME Should we prevent zero-length display-name from reaching the API?
+    #  Or should we 'reset' it ourselves by passing in the FQDN?
+    data = {}
+    if display_name is not None:
+        data["display_name"] = display_name
+    if ansible_name is not None:
+        data["ansible_host"] = ansible_name
+    return json.dumps(data).encode("utf-8")
+
+
+def _parse_checkin(raw: Response) -> Host:
+    if raw.status == 201:
+        return Host.from_json(raw.json())
+
+    logging.debug(
+        "API returned unexpected status code %d. Response: %s.",
+        raw.status,
+        raw.data.decode("utf-8"),
+    )
+    raise LookupError(f"Facts were rejected by the server with status code {raw.status}.")
+
+
 class Inventory:
     def __init__(self, connection: Optional[InventoryConnection] = None):
         self.connection = connection if connection is not None else InventoryConnection()
@@ -78,13 +126,117 @@ class Inventory:
         # https://developers.redhat.com/api-catalog/api/inventory#operation-get-/hosts.
         logging.debug("Querying hosts by machine-id.")
         raw: Response = self.connection.get("/hosts", params={"insights_id": machine_id})
-        hosts: Hosts = Hosts.from_json(raw.json())
-        if len(hosts.results) == 0:
-            logger.debug(f"Host with Client UUID '{machine_id}' not found.")
-            return None
-        if len(hosts.results) > 1:
-            logger.warning("Inventory returned more than one host. Using the first one.")
-        return hosts.results[0]
+        return _parse_host(raw, machine_id)
+
+    def get_hosts(self, filters: dict[str, str], *, page: int, per_page: int) -> Hosts:
+        """Get one page of hosts.
+
+        Pages are not stored in the HTTP cache, walking the whole Inventory would evict
+        everything else from it. Failures are retried again on top of the retries of the
+        connection, so one bad page does not abort a long walk.
+
+        :param filters: Query parameters of the API, e.g. `{"staleness": "fresh"}`.
+        :raises LookupError: The server kept rejecting the request.
+        """
+        params: dict[str, str] = {**filters, "page": str(page), "per_page": str(per_page)}
+        attempt: int = 0
+        while True:
+            raw: Optional[Response] = None
+            error: Optional[Exception] = None
+            try:
+                raw = self.connection.get(
+                    "/hosts", params=params, headers={"Cache-Control": "no-store"}
+                )
+                if raw.status == 200:
+                    return Hosts.from_json(raw.json())
+            except (OSError, http.client.HTTPException) as exc:
+                error = exc
+            except (ValueError, TypeError, KeyError) as exc:
+                # The body is malformed, e.g. truncated by a proxy
+                error = exc
+
+            delay: Optional[float] = retry_delay(
+                "GET", attempt, response=raw if error is None else None, error=error
+            )
+            if delay is None:
+                if error is not None:
+                    raise error
+                assert raw is not None
+                raise LookupError(f"Page {page} of hosts failed with status {raw.status}.")
+            attempt += 1
+            logger.debug("Retrying hosts page %d (attempt %d) in %.1f s.", page, attempt, delay)
+            time.sleep(delay)
+
+    def iter_hosts(
+        self,
+        filters: Optional[dict[str, str]] = None,
+        *,
+        per_page: int = MAXIMAL_PER_PAGE,
+        prefetch: int = 1,
+    ) -> Iterator[Host]:
+        """Iterate over the hosts, page by page.
+
+        The following pages are downloaded in the background while the hosts of the current
+        one are processed. At most `prefetch + 1` pages are held in memory at once.
+
+        Hosts added or removed during the iteration may shift the pages, so some hosts may be
+        skipped or returned twice; order the hosts (e.g. `{"order_by": "display_name"}`) by a
+        field which does not change while iterating.
+
+        :param filters: Query parameters of the API, e.g. `{"staleness": "fresh"}`.
+        :param per_page: Number of hosts on a page, at most `MAXIMAL_PER_PAGE`.
+        :param prefetch: Number of pages downloaded ahead.
+        :raises LookupError: A page could not be downloaded.
+        """
+        filters = filters or {}
+        per_page = max(1, min(per_page, MAXIMAL_PER_PAGE))
+        prefetch = max(prefetch, 0)
+
+        started: float = time.monotonic()
+        count: int = 0
+        pool = concurrent.futures.ThreadPoolExecutor(
+            max(prefetch, 1), thread_name_prefix="inventory-pages"
+        )
+        pending: dict[int, concurrent.futures.Future] = {}
+        try:
+            pages: int = 1
+            page: int = 1
+            while page <= pages:
+                if page not in pending:
+                    pending[page] = pool.submit(
+                        self.get_hosts, filters, page=page, per_page=per_page
+                    )
+                hosts: Hosts = pending.pop(page).result()
+                # The total may change while iterating
+                pages = math.ceil(hosts.total / per_page)
+                for ahead in range(page + 1, min(page + prefetch, pages) + 1):
+                    if ahead not in pending:
+                        pending[ahead] = pool.submit(
+                            self.get_hosts, filters, page=ahead, per_page=per_page
+                        )
+
+                logger.debug(
+                    "Page %d of %d: %d hosts, %.0f hosts/s so far.",
+                    page,
+                    pages,
+                    len(hosts.results),
+                    count / max(time.monotonic() - started, 1e-9),
+                )
+                if not hosts.results:
+                    break
+                for host in hosts.results:
+                    count += 1
+                    yield host
+                page += 1
+        finally:
+            for future in pending.values():
+                future.cancel()
+            pool.shutdown(wait=False)
+
+            seconds: float = time.monotonic() - started
+            rate: float = count / seconds if seconds > 0 else 0.0
+            logger.info("Iterated over %d hosts in %.1f s, %.0f hosts/s.", count, seconds, rate)
+            metrics.set_gauge("inventory_hosts_per_second", rate)
 
     def update_host(
         self,
@@ -100,19 +252,10 @@ class Inventory:
         :param ansible_name: Set custom ansible name. Pass an empty string to reset.
         """
         logging.debug("Updating the host.")
-        # FIXME Should we prevent zero-length display-name from reaching the API?
-        #  Or should we 'reset' it ourselves by passing in the FQDN?
-
-        data = {}
-        if display_name is not None:
-            data["display_name"] = display_name
-        if ansible_name is not None:
-            data["ansible_host"] = ansible_name
-
         _: Response = self.connection.patch(
             f"/hosts/{insights_id}",
             headers={"Content-Type": "application/json"},
-            data=json.dumps(data).encode("utf-8"),
+            data=_host_update(display_name, ansible_name),
         )
         return None
 
@@ -136,12 +279,53 @@ class Inventory:
             headers={"Content-Type": "application/json"},
             data=json.dumps(facts).encode("utf-8"),
         )
+        return _parse_checkin(raw)
+
+
+class AsyncInventory:
+    """Asynchronous variant of `Inventory`, for querying many hosts concurrently."""
+
+    def __init__(self, connection: Optional[AsyncInventoryConnection] = None):
+        self.connection = connection if connection is not None else AsyncInventoryConnection()
+
+    async def get_host(self, machine_id: str) -> Optional[Host]:
+        logging.debug("Querying hosts by machine-id.")
+        raw: Response = await self.connection.get("/hosts", params={"insights_id": machine_id})
+        return _parse_host(raw, machine_id)
+
+    async def update_host(
+        self,
+        insights_id: str,
+        *,
+        display_name: Optional[str] = None,
+        ansible_name: Optional[str] = None,
+    ) -> Response:
+        """Update the inventory host. See `Inventory.update_host`.
+
+        :returns: The response, e.g. to check whether the host was found.
+        """
+        logging.debug("Updating the host.")
+        raw: Response = await self.connection.patch(
+            f"/hosts/{insights_id}",
+            headers={"Content-Type": "application/json"},
+            data=_host_update(display_name, ansible_name),
+        )
+        return raw
 
-        if raw.status == 201:
-            return Host.from_json(raw.json())
+    async def delete_host(self, insights_id: str) -> Response:
+        """Delete the Inventory host. See `Inventory.delete_host`.
 
-        logging.debug(
-            f"API returned unexpected status code {raw.status}. "
-            f"Response: {raw.data.decode('utf-8')}."
+        :returns: The response, e.g. to check whether the host was found.
+        """
+        logging.debug("Deleting host.")
+        raw: Response = await self.connection.delete(f"/hosts/{insights_id}")
+        return raw
+
+    async def checkin(self, facts: dict) -> Host:
+        logging.debug("Uploading canonical facts.")
+        raw: Response = await self.connection.post(
+            "/hosts/checkin",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(facts).encode("utf-8"),
         )
-        raise LookupError(f"Facts were rejected by the server with status code {raw.status}.")
+        return _parse_checkin(raw)
@@ -3,6 +3,7 @@ from typing import Optional
 
 from insights_nest import config
 from insights_nest.api import dto
+from insights_nest.api.async_connection import AsyncConnection
 from insights_nest.api.connection import Connection, Response
 
 
@@ -28,3 +29,20 @@ class ModuleUpdateRouter:
     def get_module_route(self, module: str) -> Route:
         raw: Response = self.connection.get("/channel", params={"module": module})
         return Route.from_json(raw.json())
+
+
+class AsyncModuleUpdateRouterConnection(AsyncConnection):
+    HOST = config.get().api.host
+    PORT = config.get().api.port
+    PATH = "/api/module-update-router/v1"
+
+
+class AsyncModuleUpdateRouter:
+    def __init__(self, connection: Optional[AsyncModuleUpdateRouterConnection] = None):
+        self.connection = (
+            connection if connection is not None else AsyncModuleUpdateRouterConnection()
+        )
+
+    async def get_module_route(self, module: str) -> Route:
+        raw: Response = await self.connection.get("/channel", params={"module": module})
+        return Route.from_json(raw.json())
@@ -0,0 +1,159 @@
+"""Step-by-step requests measuring each phase of reaching an API, for diagnosis.
+
+Unlike `Connection`, probes do not retry, cache, reuse connections or resume TLS sessions, so
+every phase (name resolution, TCP connection, proxy tunnel, TLS handshake, first byte of the
+response) is measured in full, and a failure is attributed to the phase it happened in.
+"""
+
+import dataclasses
+import email.utils
+import http.client
+import logging
+import socket
+import ssl
+import time
+from typing import Optional
+
+from insights_nest.api import connection
+from insights_nest.api import resolver
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Certificate:
+    subject: str
+    issuer: str
+    not_before: str
+    not_after: str
+    days_left: float
+    """Days until the certificate expires, negative if it has already expired."""
+
+
+@dataclasses.dataclass
+class Probe:
+    url: str
+    proxy: Optional[str] = None
+    """The proxy the request was tunneled through, as `host:port`."""
+    addresses: list[str] = dataclasses.field(default_factory=list)
+    """Resolved addresses of the server (or of the proxy)."""
+    address: Optional[str] = None
+    """The address the connection was established to."""
+    timings: dict[str, float] = dataclasses.field(default_factory=dict)
+    """Seconds each finished phase took: `dns`, `tcp`, `proxy`, `tls` and `ttfb`."""
+    tls_version: Optional[str] = None
+    certificate: Optional[Certificate] = None
+    status: Optional[int] = None
+    clock_skew: Optional[float] = None
+    """Seconds the clock of the server is ahead of the local one, from its `Date` header."""
+    failed_phase: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _name(parts: tuple) -> str:
+    """Format the subject or the issuer of a certificate, as returned by `getpeercert`."""
+    return ", ".join(f"{key}={value}" for rdn in parts for key, value in rdn)
+
+
+def _certificate(sock: ssl.SSLSocket) -> Optional[Certificate]:
+    peer: dict = sock.getpeercert()
+    if not peer:
+        # The certificate was not verified, so it is not decoded
+        return None
+    expires: float = ssl.cert_time_to_seconds(peer["notAfter"])
+    return Certificate(
+        subject=_name(peer.get("subject", ())),
+        issuer=_name(peer.get("issuer", ())),
+        not_before=peer["notBefore"],
+        not_after=peer["notAfter"],
+        days_left=round((expires - time.time()) / 86400, 1),
+    )
+
+
+def _elapsed(started: float) -> float:
+    return round(time.monotonic() - started, 4)
+
+
+def probe(
+    host: str,
+    port: int,
+    url: str,
+    *,
+    method: str = "GET",
+    context: ssl.SSLContext,
+    timeout: float,
+) -> Probe:
+    """Send one request, measuring its phases. Failures are recorded, not raised.
+
+    :param url: Path of the request, including the query.
+    :param context: TLS context, e.g. one authenticating with the identity certificate.
+    :param timeout: Seconds each phase may take.
+    """
+    result = Probe(url=f"https://{host}:{port}{url}")
+    proxy = connection.get_proxy(host)
+    target: tuple[str, int] = (host, port)
+    if proxy is not None:
+        result.proxy = f"{proxy.host}:{proxy.port}"
+        target = (proxy.host, proxy.port)
+
+    phase: str = "dns"
+    sock: Optional[socket.socket] = None
+    try:
+        started: float = time.monotonic()
+        # Not through `resolver`, which falls back to cached addresses if the resolution fails
+        infos = socket.getaddrinfo(*target, 0, socket.SOCK_STREAM)
+        result.timings["dns"] = _elapsed(started)
+        result.addresses = list(dict.fromkeys(info[4][0] for info in infos))
+
+        phase = "tcp"
+        timing = resolver.Timing()
+        sock = resolver.create_connection(target, timeout, timing=timing)
+        result.timings["tcp"] = round(timing.connect, 4)
+        result.address = timing.address
+
+        if proxy is not None:
+            phase = "proxy"
+            started = time.monotonic()
+            connection.open_tunnel(sock, host, port, proxy)
+            result.timings["proxy"] = _elapsed(started)
+
+        phase = "tls"
+        started = time.monotonic()
+        sock = context.wrap_socket(sock, server_hostname=host)
+        result.timings["tls"] = _elapsed(started)
+        result.tls_version = sock.version()
+        result.certificate = _certificate(sock)
+
+        phase = "ttfb"
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        conn.sock = sock
+        sent: float = time.time()
+        started = time.monotonic()
+        conn.request(method, url, headers={"Connection": "close"})
+        response: http.client.HTTPResponse = conn.getresponse()
+        result.timings["ttfb"] = _elapsed(started)
+        received: float = time.time()
+        result.status = response.status
+        response.close()
+
+        date: Optional[str] = response.getheader("Date")
+        if date is not None:
+            try:
+                server: float = email.utils.parsedate_to_datetime(date).timestamp()
+            except (TypeError, ValueError):
+                logger.debug("Unparsable Date header %r from %s.", date, host)
+            else:
+                # The header has a resolution of one second
+                result.clock_skew = round(server - (sent + received) / 2, 1)
+    except (OSError, http.client.HTTPException, ValueError) as exc:
+        result.failed_phase = phase
+        result.error = str(exc) or type(exc).__name__
+        logger.debug("Probe of %s failed in phase %s: %s", result.url, phase, result.error)
+    finally:
+        if sock is not None:
+            sock.close()
+    return result
@@ -0,0 +1,129 @@
+"""Recording and replaying of HTTP sessions.
+
+A recorded session is a JSON lines file with one request and its response per line. Replaying
+it answers the requests without any network access, so the client can be run offline, e.g. in
+benchmarks or in CI.
+
+The environment variables select the transport of the whole process:
+
+- `NEST_RECORD_HTTP=path`: Send requests to the server and append them to the file.
+- `NEST_REPLAY_HTTP=path`: Answer requests from the file.
+"""
+
+import base64
+import json
+import logging
+import os
+import pathlib
+import threading
+from typing import Optional
+
+from insights_nest.api import connection
+from insights_nest.api.connection import Request, Response, Transport
+
+logger = logging.getLogger(__name__)
+
+REDACTED_HEADERS = frozenset({"authorization", "cookie", "proxy-authorization", "set-cookie"})
+
+
+class ReplayMismatch(LookupError):
+    """The replayed session contains no response to the request."""
+
+
+def _encode(data: Optional[bytes]) -> Optional[str]:
+    return base64.b64encode(data).decode("ascii") if data is not None else None
+
+
+def _decode(data: Optional[str]) -> Optional[bytes]:
+    return base64.b64decode(data) if data is not None else None
+
+
+def _redact(headers: dict[str, str]) -> dict[str, str]:
+    return {k: "REDACTED" if k.lower() in REDACTED_HEADERS else v for k, v in headers.items()}
+
+
+class RecordingTransport(Transport):
+    """Send requests with another transport, appending them to a session file.
+
+    :param transport: Transport sending the requests.
+    :param path: Path to the session file.
+    """
+
+    def __init__(self, transport: Transport, path: pathlib.Path):
+        self.transport = transport
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, connection: "connection.Connection", request: Request) -> Response:
+        response: Response = self.transport.send(connection, request)
+        record: dict = {
+            "request": {
+                "method": request.method,
+                "url": request.url,
+                "headers": _redact(request.headers),
+                "data": _encode(request.data),
+            },
+            "response": {
+                "status": response.status,
+                "headers": _redact(response.headers),
+                "data": _encode(response.data),
+                "encoded_size": response.encoded_size,
+            },
+        }
+        with self._lock, self.path.open("a") as f:
+            f.write(json.dumps(record) + "\n")
+        return response
+
+
+class ReplayTransport(Transport):
+    """Answer requests from a session file.
+
+    Requests are matched by their method and URL; responses to repeated requests are replayed
+    in the recorded order, and the last one is repeated once they run out.
+
+    :param path: Path to the session file.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._responses: dict[tuple[str, str], list[Response]] = {}
+        with path.open("r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record: dict = json.loads(line)
+                key = (record["request"]["method"], record["request"]["url"])
+                self._responses.setdefault(key, []).append(
+                    Response(
+                        status=record["response"]["status"],
+                        headers=record["response"]["headers"],
+                        data=_decode(record["response"]["data"]) or b"",
+                        encoded_size=record["response"].get("encoded_size"),
+                    )
+                )
+
+    def send(self, connection: "connection.Connection", request: Request) -> Response:
+        logger.debug("Replaying %s %s.", request.method, request.url)
+        with self._lock:
+            responses: Optional[list[Response]] = self._responses.get(
+                (request.method, request.url)
+            )
+            if not responses:
+                raise ReplayMismatch(f"No recorded response to {request.method} {request.url}.")
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+def from_environment(transport: Transport) -> Transport:
+    """Wrap or replace the transport as requested by the environment variables."""
+    replay: Optional[str] = os.environ.get("NEST_REPLAY_HTTP", None)
+    if replay:
+        logger.info("Replaying HTTP session from %s.", replay)
+        return ReplayTransport(pathlib.Path(replay))
+
+    record: Optional[str] = os.environ.get("NEST_RECORD_HTTP", None)
+    if record:
+        logger.info("Recording HTTP session into %s.", record)
+        return RecordingTransport(transport, pathlib.Path(record))
+
+    return transport
@@ -0,0 +1,265 @@
+"""Resolution of host names and establishment of TCP connections.
+
+Resolved addresses are cached for `[network] dns_cache_ttl` seconds, also across runs of the
+client (the system resolver does not tell the TTL of the records). If the resolution fails, the
+expired addresses are used instead, e.g. during a short outage of the DNS server.
+
+Connections are established as described by RFC 8305 (Happy Eyeballs v2): the addresses are
+ordered alternating between IPv6 and IPv4, and a connection attempt to the next address starts
+when the previous one fails, or has not succeeded for `[network] happy_eyeballs_delay` seconds.
+The first established connection wins, so a broken IPv6 route costs a fraction of a second
+instead of the whole connect timeout. The address that won is tried first next time.
+"""
+
+import dataclasses
+import errno
+import itertools
+import json
+import logging
+import os
+import pathlib
+import selectors
+import socket
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from insights_nest import config
+from insights_nest import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH: pathlib.Path = config.CACHE_DIRECTORY_PATH / "dns.json"
+
+_Address = tuple[int, int, int, tuple]
+"""Family, socket type, protocol and socket address, as returned by `getaddrinfo`."""
+
+
+@dataclasses.dataclass
+class Timing:
+    """Durations of establishing one connection, in seconds."""
+
+    resolve: float = 0.0
+    connect: float = 0.0
+    cached: bool = False
+    """Whether the addresses were taken from the cache."""
+    address: Optional[str] = None
+    """The address the connection was established to."""
+
+
+@dataclasses.dataclass
+class _Entry:
+    addresses: list[_Address]
+    expires: float
+
+
+_lock = threading.Lock()
+_cache: Optional[dict[str, _Entry]] = None
+
+
+def _key(host: str, port: int) -> str:
+    return f"{host}:{port}"
+
+
+def _load() -> dict[str, _Entry]:
+    """Get the cache, loading it from the disk on the first use. Call with the lock held."""
+    global _cache
+    if _cache is not None:
+        return _cache
+
+    _cache = {}
+    try:
+        with CACHE_PATH.open("r") as f:
+            for key, value in json.load(f).items():
+                addresses = [(a[0], a[1], a[2], tuple(a[3])) for a in value["addresses"]]
+                _cache[key] = _Entry(addresses=addresses, expires=value["expires"])
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError, IndexError) as exc:
+        logger.debug("Ignoring unreadable %s: %s", CACHE_PATH, exc)
+    return _cache
+
+
+def _save(cache: dict[str, _Entry]) -> None:
+    try:
+        CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=CACHE_PATH.parent, prefix=".dns.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({k: dataclasses.asdict(v) for k, v in cache.items()}, f)
+            os.replace(temporary, CACHE_PATH)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError as exc:
+        logger.debug("Could not save %s: %s", CACHE_PATH, exc)
+
+
+def _order(addresses: list[_Address]) -> list[_Address]:
+    """Interleave the address families, starting with the family of the first address."""
+    if not addresses:
+        return []
+    first: int = addresses[0][0]
+    preferred = [a for a in addresses if a[0] == first]
+    other = [a for a in addresses if a[0] != first]
+    return [a for pair in itertools.zip_longest(preferred, other) for a in pair if a is not None]
+
+
+def resolve(host: str, port: int, *, refresh: bool = False) -> tuple[list[_Address], bool]:
+    """Resolve the host, using the cache.
+
+    :param refresh: Ignore the cached addresses, e.g. because none of them can be connected to.
+    :returns: The addresses in the order they should be tried, and whether they were cached.
+    :raises OSError: The host cannot be resolved and there are no cached addresses.
+    """
+    ttl: float = config.get().network.dns_cache_ttl
+    key: str = _key(host, port)
+    now: float = time.time()
+    with _lock:
+        entry: Optional[_Entry] = _load().get(key) if ttl else None
+    if entry is not None and not refresh and now < entry.expires:
+        metrics.inc("dns_lookups_total", result="cached")
+        return entry.addresses, True
+
+    try:
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except OSError as exc:
+        if entry is None:
+            metrics.inc("dns_lookups_total", result="failed")
+            raise
+        logger.warning("Could not resolve %s (%s), using expired addresses.", host, exc)
+        metrics.inc("dns_lookups_total", result="stale")
+        return entry.addresses, True
+
+    addresses: list[_Address] = _order([(f, t, p, a) for f, t, p, _, a in infos])
+    metrics.inc("dns_lookups_total", result="resolved")
+    if ttl:
+        with _lock:
+            cache: dict[str, _Entry] = _load()
+            cache[key] = _Entry(addresses=addresses, expires=now + ttl)
+            _save(cache)
+    return addresses, False
+
+
+def _prefer(host: str, port: int, address: _Address) -> None:
+    """Try the address first next time."""
+    with _lock:
+        cache: dict[str, _Entry] = _load()
+        entry: Optional[_Entry] = cache.get(_key(host, port))
+        if entry is None or address not in entry.addresses or entry.addresses[0] == address:
+            return
+        entry.addresses.remove(address)
+        entry.addresses.insert(0, address)
+        _save(cache)
+
+
+def _race(
+    addresses: list[_Address],
+    timeout: Optional[float],
+    source_address: Optional[tuple[str, int]],
+) -> tuple[socket.socket, _Address]:
+    """Connect to the first address that accepts the connection.
+
+    :raises OSError: No connection could be established.
+    """
+    delay: float = config.get().network.happy_eyeballs_delay
+    deadline: Optional[float] = time.monotonic() + timeout if timeout is not None else None
+    pending: list[_Address] = list(addresses)
+    attempts: dict[socket.socket, _Address] = {}
+    errors: list[OSError] = []
+    next_attempt: float = time.monotonic()
+    selector = selectors.DefaultSelector()
+    try:
+        while pending or attempts:
+            now: float = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise TimeoutError(f"Connection timed out after {timeout:.1f} seconds.")
+
+            if pending and (not attempts or now >= next_attempt):
+                address: _Address = pending.pop(0)
+                sock = socket.socket(address[0], address[1], address[2])
+                try:
+                    sock.setblocking(False)
+                    if source_address is not None:
+                        sock.bind(source_address)
+                    code: int = sock.connect_ex(address[3])
+                    if code not in (0, errno.EINPROGRESS):
+                        raise OSError(code, os.strerror(code))
+                except OSError as exc:
+                    sock.close()
+                    logger.debug("Could not connect to %s: %s", address[3][0], exc)
+                    errors.append(exc)
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                attempts[sock] = address
+                next_attempt = now + delay
+                continue
+
+            wait: Optional[float] = next_attempt - now if pending else None
+            if deadline is not None:
+                wait = min(wait, deadline - now) if wait is not None else deadline - now
+            for selected, _ in selector.select(wait):
+                sock = selected.fileobj  # type: ignore[assignment]
+                address = attempts.pop(sock)
+                selector.unregister(sock)
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code == 0:
+                    return sock, address
+                sock.close()
+                logger.debug("Could not connect to %s: %s", address[3][0], os.strerror(code))
+                errors.append(OSError(code, os.strerror(code)))
+                # Do not wait for the delay, the next address can be tried right away
+                next_attempt = time.monotonic()
+    finally:
+        for sock in attempts:
+            sock.close()
+        selector.close()
+
+    if errors:
+        raise errors[-1]
+    raise OSError("No addresses to connect to.")
+
+
+def create_connection(
+    address: tuple[str, int],
+    timeout: Optional[float] = None,
+    source_address: Optional[tuple[str, int]] = None,
+    *,
+    timing: Optional[Timing] = None,
+) -> socket.socket:
+    """Connect to the host, like `socket.create_connection`.
+
+    :param timing: Filled in with the durations of the resolution and the connection.
+    :raises OSError: The host cannot be resolved, or no connection could be established.
+    """
+    host, port = address
+    if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:  # type: ignore[attr-defined]
+        timeout = socket.getdefaulttimeout()
+    timing = timing if timing is not None else Timing()
+
+    started: float = time.monotonic()
+    addresses, timing.cached = resolve(host, port)
+    timing.resolve = time.monotonic() - started
+
+    try:
+        sock, winner = _race(addresses, timeout, source_address)
+    except OSError:
+        if not timing.cached:
+            raise
+        # The host may have moved, try the current addresses
+        logger.debug("Could not connect to cached addresses of %s, resolving again.", host)
+        resolved: float = time.monotonic()
+        addresses, timing.cached = resolve(host, port, refresh=True)
+        timing.resolve += time.monotonic() - resolved
+        remaining: Optional[float] = None
+        if timeout is not None:
+            remaining = max(timeout - (time.monotonic() - started), 0.001)
+        sock, winner = _race(addresses, remaining, source_address)
+    timing.connect = time.monotonic() - started - timing.resolve
+    timing.address = winner[3][0]
+
+    _prefer(host, port, winner)
+    sock.setblocking(True)
+    sock.settimeout(timeout)
+    return sock
@@ -0,0 +1,214 @@
+"""Bandwidth limits of HTTP transfers.
+
+Request bodies and response bodies pass through token buckets, one for each direction: a
+transfer takes as many tokens as it has bytes, the tokens refill at the configured rate up to
+the burst size, and a transfer without enough tokens waits until they are refilled. Bodies are
+sent and received in chunks, so large transfers are spread evenly over time.
+
+The limits can be restricted to times of the day (`[network] rate_limit_schedule`), e.g. to the
+business hours of a branch site.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from insights_nest import config
+from insights_nest import metrics
+
+logger = logging.getLogger(__name__)
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+CHUNK_SIZE: int = 16 * 1024
+"""Size of the pieces of throttled request bodies."""
+
+
+class TokenBucket:
+    """Token bucket, shared by threads.
+
+    Transfers reserve tokens even if there are not enough of them, and wait until the debt is
+    refilled. Concurrent transfers therefore queue up instead of starving each other.
+
+    :param rate: Tokens (bytes) refilled per second.
+    :param burst: Maximal number of tokens.
+    """
+
+    def __init__(self, rate: float, burst: float, *, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens: float = burst
+        self._updated: float = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: int) -> float:
+        """Take the tokens.
+
+        :returns: Seconds to wait before the transfer can proceed.
+        """
+        with self._lock:
+            now: float = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+def parse_schedule(schedule: str) -> list[tuple[datetime.time, datetime.time]]:
+    """Parse comma-separated time ranges, e.g. `08:00-12:00, 13:00-17:00` or `22:00-06:00`.
+
+    :raises ValueError: The schedule is malformed.
+    """
+    ranges: list[tuple[datetime.time, datetime.time]] = []
+    for item in schedule.split(","):
+        if not item.strip():
+            continue
+        start, separator, end = item.partition("-")
+        if not separator:
+            raise ValueError(f"Time range '{item.strip()}' has no end.")
+        ranges.append(
+            (datetime.time.fromisoformat(start.strip()), datetime.time.fromisoformat(end.strip()))
+        )
+    return ranges
+
+
+def is_scheduled(schedule: str, now: datetime.time) -> bool:
+    """Check whether the time falls into the schedule. An empty schedule covers the whole day.
+
+    :raises ValueError: The schedule is malformed.
+    """
+    ranges = parse_schedule(schedule)
+    if not ranges:
+        return True
+    for start, end in ranges:
+        if start <= end and start <= now < end:
+            return True
+        # Ranges over midnight
+        if start > end and (now >= start or now < end):
+            return True
+    return False
+
+
+@dataclasses.dataclass
+class _Statistics:
+    size: int = 0
+    """Number of transferred bytes."""
+    throttled: float = 0.0
+    """Seconds the transfers waited for tokens."""
+    first: Optional[float] = None
+    last: Optional[float] = None
+
+
+_lock = threading.Lock()
+_buckets: dict[str, TokenBucket] = {}
+_statistics: dict[str, _Statistics] = {UPLOAD: _Statistics(), DOWNLOAD: _Statistics()}
+_invalid_schedule: Optional[str] = None
+
+
+def _get_bucket(direction: str) -> Optional[TokenBucket]:
+    """Get the bucket of the direction, or None if its transfers are not limited now."""
+    global _invalid_schedule
+
+    cfg: config.Network = config.get().network
+    rate: int = cfg.upload_rate_limit if direction == UPLOAD else cfg.download_rate_limit
+    if not rate:
+        return None
+
+    try:
+        if not is_scheduled(cfg.rate_limit_schedule, datetime.datetime.now().time()):
+            return None
+    except ValueError as exc:
+        if _invalid_schedule != cfg.rate_limit_schedule:
+            logger.warning("Invalid rate limit schedule, limiting all the time: %s", exc)
+            _invalid_schedule = cfg.rate_limit_schedule
+
+    burst: int = cfg.rate_limit_burst or rate
+    with _lock:
+        bucket: Optional[TokenBucket] = _buckets.get(direction, None)
+        if bucket is None or (bucket.rate, bucket.burst) != (rate, burst):
+            bucket = _buckets[direction] = TokenBucket(rate, burst)
+    return bucket
+
+
+def delay(direction: str, size: int) -> float:
+    """Account a transfer of the size.
+
+    :returns: Seconds the transfer has to wait for.
+    """
+    now: float = time.monotonic()
+    bucket: Optional[TokenBucket] = _get_bucket(direction)
+    seconds: float = bucket.reserve(size) if bucket is not None else 0.0
+
+    with _lock:
+        statistics: _Statistics = _statistics[direction]
+        statistics.size += size
+        statistics.throttled += seconds
+        if statistics.first is None:
+            statistics.first = now
+        statistics.last = now + seconds
+    if seconds:
+        metrics.inc("http_throttled_seconds_total", seconds, direction=direction)
+    return seconds
+
+
+def take(direction: str, size: int) -> None:
+    """Wait until a transfer of the size may proceed."""
+    seconds: float = delay(direction, size)
+    if seconds:
+        time.sleep(seconds)
+
+
+async def take_async(direction: str, size: int) -> None:
+    """Wait until a transfer of the size may proceed. See `take`."""
+    seconds: float = delay(direction, size)
+    if seconds:
+        await asyncio.sleep(seconds)
+
+
+def is_limited(direction: str) -> bool:
+    """Check whether the transfers of the direction are limited now."""
+    return _get_bucket(direction) is not None
+
+
+def chunks(data: bytes) -> Iterator[bytes]:
+    """Split a request body into pieces, each sent once the upload limit allows it."""
+    view = memoryview(data)
+    for offset in range(0, len(data), CHUNK_SIZE):
+        chunk: memoryview = view[offset : offset + CHUNK_SIZE]
+        take(UPLOAD, len(chunk))
+        yield chunk  # type: ignore[misc]
+
+
+def reset() -> None:
+    """Drop the statistics of the transfers, e.g. once a command has logged them."""
+    with _lock:
+        for direction in _statistics:
+            _statistics[direction] = _Statistics()
+
+
+def log_summary() -> None:
+    """Log the amount and throughput of the transfers since `reset`, and their throttled time."""
+    cfg: config.Network = config.get().network
+    limited: bool = bool(cfg.upload_rate_limit or cfg.download_rate_limit)
+    with _lock:
+        for direction, statistics in _statistics.items():
+            if not statistics.size or statistics.first is None or statistics.last is None:
+                continue
+            seconds: float = statistics.last - statistics.first
+            throughput: str = (
+                f"{statistics.size / seconds / 1024:.1f} KiB/s" if seconds > 0 else "in one burst"
+            )
+            logger.log(
+                logging.INFO if limited else logging.DEBUG,
+                "HTTP %s: %.1f KiB, %s, throttled for %.1f s.",
+                direction,
+                statistics.size / 1024,
+                throughput,
+                statistics.throttled,
+            )
@@ -1,12 +1,30 @@
 import configparser
 import dataclasses
-import functools
+import logging
+import os
 import pathlib
+import pickle
+import stat
+import tempfile
+from typing import Optional
 
+logger = logging.getLogger(__name__)
 
-CONFIGURATION_FILE_PATH = pathlib.Path("/etc/insights-client/insights-nest.conf")
-CONFIGURATION_DIRECTORY_PATH = pathlib.Path("/etc/insights-client/insights-nest.conf.d/")
-RHSM_CONFIGURATION_FILE_PATH = pathlib.Path("/etc/rhsm/rhsm.conf")
+
+# The paths can be overridden by environment variables, e.g. to run against a local server
+CONFIGURATION_FILE_PATH = pathlib.Path(
+    os.environ.get("NEST_CONFIGURATION_FILE", "/etc/insights-client/insights-nest.conf")
+)
+CONFIGURATION_DIRECTORY_PATH = pathlib.Path(
+    os.environ.get("NEST_CONFIGURATION_DIRECTORY", "/etc/insights-client/insights-nest.conf.d/")
+)
+RHSM_CONFIGURATION_FILE_PATH = pathlib.Path(
+    os.environ.get("NEST_RHSM_CONFIGURATION_FILE", "/etc/rhsm/rhsm.conf")
+)
+CACHE_DIRECTORY_PATH = pathlib.Path(
+    os.environ.get("NEST_CACHE_DIRECTORY", "/var/cache/insights-nest/")
+)
+SNAPSHOT_PATH = CACHE_DIRECTORY_PATH / "configuration.pickle"
 
 
 @dataclasses.dataclass(frozen=True)
@@ -16,6 +34,8 @@ class Proxy:
     port: int
     username: str
     password: str
+    no_proxy: str
+    """Comma-separated list of hosts that should be contacted directly."""
 
     @property
     def ok(self):
@@ -33,6 +53,40 @@ class Network:
     """TLS certificate bundle."""
     insecure: bool
     """Do not verify TLS certificates."""
+    connect_timeout: float
+    """Seconds to wait for the connection to be established."""
+    read_timeout: float
+    """Seconds to wait for the server to send data."""
+    dns_cache_ttl: float
+    """Seconds resolved addresses are reused, also by later runs. Zero disables the cache."""
+    happy_eyeballs_delay: float
+    """Seconds before connecting to the next address of a host while the previous one is tried."""
+    budget: float
+    """Total seconds a command may spend in HTTP requests, including retries. Zero disables it."""
+    retries: int
+    """Number of retries of failed requests."""
+    backoff: float
+    """Base of the exponential delay between retries, in seconds."""
+    backoff_max: float
+    """Longest delay between retries, in seconds."""
+    compress_threshold: int
+    """Smallest request body compressed for APIs accepting it, in bytes. Zero disables it."""
+    compress_apis: tuple[str, ...]
+    """Roots of the APIs (e.g. `/api/inventory/v1`) known to accept compressed requests."""
+    cache_size: int
+    """Maximal size of the HTTP cache, in bytes. Zero disables it."""
+    memo_window: float
+    """Seconds a response is reused for identical GET requests of the same process."""
+    upload_rate_limit: int
+    """Maximal upload rate in bytes per second. Zero disables the limit."""
+    download_rate_limit: int
+    """Maximal download rate in bytes per second. Zero disables the limit."""
+    rate_limit_burst: int
+    """Bytes transferred at full speed before the limits apply. Zero means one second's worth."""
+    rate_limit_schedule: str
+    """Comma-separated times of the day the limits apply in, e.g. `08:00-18:00`. Empty: always."""
+    upload_skip_age: float
+    """Seconds archives identical to the last accepted upload are not sent. Zero disables it."""
 
     @property
     def identity_certificate(self) -> pathlib.Path:
@@ -61,6 +115,36 @@ class Egg:
     """Path to public GPG key used to verify the eggs."""
     canary: bool
     """Use canary egg instead of production one."""
+    prefetch: bool
+    """Only update the egg with `insights-nest egg prefetch`, never before running a command."""
+    keep_versions: int
+    """Number of staged egg versions kept for rollback, including the active one."""
+    native_facts: bool
+    """Collect canonical facts without Core, unless some of them cannot be collected reliably."""
+    delta: bool
+    """Update the egg from a delta against the active egg, if the server offers one."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Resources:
+    nice: int
+    """Niceness added to Core runs."""
+    io_class: str
+    """IO scheduling class of Core runs: `realtime`, `best-effort` or `idle`. Empty keeps it."""
+    io_level: int
+    """IO priority within the class, from 0 (highest) to 7 (lowest)."""
+    memory_limit: int
+    """Limit of the address space of Core processes (`RLIMIT_AS`), in bytes. Zero disables it."""
+    cpu_time_limit: int
+    """Limit of the CPU time of Core processes (`RLIMIT_CPU`), in seconds. Zero disables it."""
+    cgroup: bool
+    """Run Core in a transient systemd scope, limited by the following cgroup controllers."""
+    cpu_quota: int
+    """CPU bandwidth of the scope in percent of one CPU (`cpu.max`). Zero disables it."""
+    memory_max: int
+    """Memory limit of the scope in bytes (`memory.max`). Zero disables it."""
+    io_weight: int
+    """IO weight of the scope, from 1 to 10000 (`io.weight`). Zero keeps the default."""
 
 
 @dataclasses.dataclass(frozen=True)
@@ -69,21 +153,42 @@ class Logging:
     """Mapping between python modules and requested log levels."""
 
 
+@dataclasses.dataclass(frozen=True)
+class Metrics:
+    textfile: Optional[pathlib.Path]
+    """Prometheus textfile the run metrics are written into. If `None`, they are not written."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Scheduler:
+    intervals: dict[str, int]
+    """Mapping between scheduled tasks and their intervals in seconds. Zero disables the task."""
+    jitter: float
+    """Random delay added to each run, as a fraction of the interval."""
+
+
 @dataclasses.dataclass(frozen=True)
 class Configuration:
     api: API
     network: Network
     egg: Egg
+    resources: Resources
     logging: Logging
+    metrics: Metrics
+    scheduler: Scheduler
 
 
 _RHSM_CONFIGURATION_DEFAULTS: dict = {
+    "rhsm": {
+        "consumerCertDir": "/etc/pki/consumer",
+    },
     "server": {
         "proxy_hostname": "",
         "proxy_scheme": "http",
         "proxy_port": "",
         "proxy_user": "",
         "proxy_password": "",
+        "no_proxy": "",
     },
 }
 
@@ -92,21 +197,196 @@ _CONFIGURATION_DEFAULTS: dict = {
     "network": {
         "ca_certificates": "/etc/pki/ca-trust/extracted/pem/tls-ca-bundle.pem",
         "insecure": False,
+        "connect_timeout": 10,
+        "read_timeout": 60,
+        "dns_cache_ttl": 300,
+        "happy_eyeballs_delay": 0.25,
+        "budget": 300,
+        "retries": 3,
+        "backoff": 1,
+        "backoff_max": 30,
+        "compress_threshold": 1024,
+        "compress_apis": "",
+        "cache_size": 10 * 1024 * 1024,
+        "memo_window": 2,
+        "upload_rate_limit": 0,
+        "download_rate_limit": 0,
+        "rate_limit_burst": 0,
+        "rate_limit_schedule": "",
+        "upload_skip_age": 0,
     },
     "egg": {
         "egg_directory": "/var/lib/insights",
         "metadata_directory": "/etc/insights-client/",
         "gpg_public_key": "/etc/insights-client/redhattools.pub.gpg",
         "canary": False,
+        "prefetch": False,
+        "keep_versions": 3,
+        "native_facts": True,
+        "delta": False,
+    },
+    "resources": {
+        "nice": 10,
+        "io_class": "best-effort",
+        "io_level": 7,
+        "memory_limit": 0,
+        "cpu_time_limit": 0,
+        "cgroup": False,
+        "cpu_quota": 0,
+        "memory_max": 0,
+        "io_weight": 0,
     },
     "logging": {"insights_nest": "INFO", "insights_nest.api": "WARNING"},
+    "metrics": {"textfile": ""},
+    "scheduler": {
+        "checkin": 3600,
+        "advisor": 86400,
+        "compliance": 0,
+        "prefetch": 0,
+        "jitter": 0.1,
+    },
 }
 
 
-@functools.cache
+_Fingerprint = tuple[tuple, ...]
+
+_configuration: Optional[Configuration] = None
+_fingerprint: Optional[_Fingerprint] = None
+
+
 def get() -> Configuration:
-    """Load the configuration."""
+    """Load the configuration.
+
+    The configuration is loaded once per process. The parsed result is also stored as a snapshot
+    in the cache directory, and it is reused by the following processes until any of the input
+    files changes.
+    """
+    global _configuration, _fingerprint
+
+    if _configuration is not None:
+        return _configuration
+
+    fingerprint: _Fingerprint = _get_fingerprint()
+    configuration: Optional[Configuration] = _load_snapshot(fingerprint)
+    if configuration is None:
+        configuration = _parse()
+        _save_snapshot(fingerprint, configuration)
+
+    _configuration, _fingerprint = configuration, fingerprint
+    return configuration
+
+
+def changed() -> bool:
+    """Check whether any of the configuration files changed since they were loaded."""
+    if _fingerprint is None:
+        return False
+    return _get_fingerprint() != _fingerprint
+
+
+def reload() -> Configuration:
+    """Drop the loaded configuration and load it again.
+
+    Options in `RESTART_OPTIONS` keep their old values in the running process.
+    """
+    global _configuration, _fingerprint
 
+    _configuration, _fingerprint = None, None
+    return get()
+
+
+RESTART_OPTIONS: tuple[tuple[str, str], ...] = (
+    ("api", "host"),
+    ("api", "port"),
+    ("network", "ca_certificates"),
+    ("network", "identity_directory"),
+    ("egg", "egg_directory"),
+    ("egg", "metadata_directory"),
+)
+"""Options (section and name) read once, e.g. into paths when the modules are imported.
+
+A reloaded configuration does not apply them to a running process (see `restart_required`).
+"""
+
+
+def restart_required(old: Configuration, new: Configuration) -> list[str]:
+    """List the changed options that only take effect after the process is restarted."""
+    return [
+        f"{section}.{option}"
+        for section, option in RESTART_OPTIONS
+        if getattr(getattr(old, section), option) != getattr(getattr(new, section), option)
+    ]
+
+
+def _get_fingerprint() -> _Fingerprint:
+    """Identify the state of the configuration inputs.
+
+    Every file (and the drop-in directory itself, to notice added and removed files) is
+    described by its path, modification time, size and inode. The module itself is included
+    as well, so snapshots created by other versions of the code are not used.
+    """
+    paths: list[pathlib.Path] = [
+        pathlib.Path(__file__),
+        RHSM_CONFIGURATION_FILE_PATH,
+        CONFIGURATION_FILE_PATH,
+        CONFIGURATION_DIRECTORY_PATH,
+        *sorted(CONFIGURATION_DIRECTORY_PATH.glob("*.conf")),
+    ]
+
+    fingerprint: list[tuple] = []
+    for path in paths:
+        try:
+            st: os.stat_result = path.stat()
+        except OSError:
+            fingerprint.append((f"{path!s}",))
+            continue
+        fingerprint.append((f"{path!s}", st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(fingerprint)
+
+
+def is_trusted(path: pathlib.Path) -> bool:
+    """Check that the path is owned by us and that nobody else can write to it."""
+    st: os.stat_result = path.stat()
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _load_snapshot(fingerprint: _Fingerprint) -> Optional[Configuration]:
+    """Load the configuration snapshot, if it matches the fingerprint."""
+    try:
+        if not is_trusted(SNAPSHOT_PATH.parent) or not is_trusted(SNAPSHOT_PATH):
+            logger.debug("Ignoring configuration snapshot %s with unsafe owner.", SNAPSHOT_PATH)
+            return None
+        with SNAPSHOT_PATH.open("rb") as f:
+            snapshot_fingerprint, configuration = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.debug("Could not load configuration snapshot %s: %s", SNAPSHOT_PATH, exc)
+        return None
+
+    if snapshot_fingerprint != fingerprint or not isinstance(configuration, Configuration):
+        logger.debug("Configuration snapshot is outdated.")
+        return None
+    return configuration
+
+
+def _save_snapshot(fingerprint: _Fingerprint, configuration: Configuration) -> None:
+    """Atomically store the configuration snapshot."""
+    try:
+        SNAPSHOT_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=SNAPSHOT_PATH.parent, prefix=".configuration.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((fingerprint, configuration), f)
+            os.replace(temporary, SNAPSHOT_PATH)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError as exc:
+        logger.debug("Could not save configuration snapshot %s: %s", SNAPSHOT_PATH, exc)
+
+
+def _parse() -> Configuration:
+    """Parse the configuration files."""
     rhsm_cfg = configparser.ConfigParser()
     rhsm_cfg.read_dict(_RHSM_CONFIGURATION_DEFAULTS)
     rhsm_cfg.read(f"{RHSM_CONFIGURATION_FILE_PATH!s}")
@@ -126,12 +406,34 @@ def get() -> Configuration:
         network=Network(
             ca_certificates=pathlib.Path(cfg.get("network", "ca_certificates")),
             insecure=cfg.getboolean("network", "insecure"),
+            connect_timeout=cfg.getfloat("network", "connect_timeout"),
+            read_timeout=cfg.getfloat("network", "read_timeout"),
+            dns_cache_ttl=cfg.getfloat("network", "dns_cache_ttl"),
+            happy_eyeballs_delay=cfg.getfloat("network", "happy_eyeballs_delay"),
+            budget=cfg.getfloat("network", "budget"),
+            retries=cfg.getint("network", "retries"),
+            backoff=cfg.getfloat("network", "backoff"),
+            backoff_max=cfg.getfloat("network", "backoff_max"),
+            compress_threshold=cfg.getint("network", "compress_threshold"),
+            compress_apis=tuple(
+                api.strip()
+                for api in cfg.get("network", "compress_apis").split(",")
+                if api.strip()
+            ),
+            cache_size=cfg.getint("network", "cache_size"),
+            memo_window=cfg.getfloat("network", "memo_window"),
+            upload_rate_limit=cfg.getint("network", "upload_rate_limit"),
+            download_rate_limit=cfg.getint("network", "download_rate_limit"),
+            rate_limit_burst=cfg.getint("network", "rate_limit_burst"),
+            rate_limit_schedule=cfg.get("network", "rate_limit_schedule"),
+            upload_skip_age=cfg.getfloat("network", "upload_skip_age"),
             proxy=Proxy(
                 host=rhsm_cfg.get("server", "proxy_hostname"),
                 scheme=rhsm_cfg.get("server", "proxy_scheme"),
                 port=network_proxy_port,
                 username=rhsm_cfg.get("server", "proxy_user"),
                 password=rhsm_cfg.get("server", "proxy_password"),
+                no_proxy=rhsm_cfg.get("server", "no_proxy"),
             ),
             identity_directory=pathlib.Path(rhsm_cfg.get("rhsm", "consumerCertDir")),
         ),
@@ -144,8 +446,35 @@ def get() -> Configuration:
             metadata_directory=pathlib.Path(cfg.get("egg", "metadata_directory")),
             gpg_public_key=pathlib.Path(cfg.get("egg", "gpg_public_key")),
             canary=cfg.getboolean("egg", "canary"),
+            prefetch=cfg.getboolean("egg", "prefetch"),
+            keep_versions=cfg.getint("egg", "keep_versions"),
+            native_facts=cfg.getboolean("egg", "native_facts"),
+            delta=cfg.getboolean("egg", "delta"),
+        ),
+        resources=Resources(
+            nice=cfg.getint("resources", "nice"),
+            io_class=cfg.get("resources", "io_class"),
+            io_level=cfg.getint("resources", "io_level"),
+            memory_limit=cfg.getint("resources", "memory_limit"),
+            cpu_time_limit=cfg.getint("resources", "cpu_time_limit"),
+            cgroup=cfg.getboolean("resources", "cgroup"),
+            cpu_quota=cfg.getint("resources", "cpu_quota"),
+            memory_max=cfg.getint("resources", "memory_max"),
+            io_weight=cfg.getint("resources", "io_weight"),
         ),
         logging=Logging(
             levels=dict([s for s in cfg.items() if s[0] == "logging"][0][1]),
         ),
+        metrics=Metrics(
+            textfile=pathlib.Path(cfg.get("metrics", "textfile"))
+            if cfg.get("metrics", "textfile")
+            else None,
+        ),
+        scheduler=Scheduler(
+            intervals={
+                task: cfg.getint("scheduler", task)
+                for task in ("checkin", "advisor", "compliance", "prefetch")
+            },
+            jitter=cfg.getfloat("scheduler", "jitter"),
+        ),
     )
@@ -0,0 +1,80 @@
+"""Logging setup.
+
+Records are put into an in-memory queue by the calling thread and written out by a background
+listener thread, so slow log destinations (journald, disks) do not block the command itself.
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+FORMAT = "[{levelname:<7}] {module}:{lineno} {message}\033[0m"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configured: set[str] = set()
+"""Loggers with a configured level, reset when they are no longer configured."""
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves the formatting of records to the listener thread.
+
+    Only the message is merged with its arguments before the record is enqueued, since the
+    arguments (e.g. dictionaries of headers) may be changed by the caller in the meantime.
+    Timestamps, levels and tracebacks are formatted by the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure(levels: dict[str, str], *, handler: Optional[logging.Handler] = None) -> None:
+    """Apply the log levels and start the background listener.
+
+    It can be called again, e.g. after the configuration was reloaded; loggers missing from the
+    new levels are reset to their default level.
+
+    :param levels: Mapping between python modules and requested log levels.
+    :param handler: Handler the records are written into. Defaults to standard error.
+    """
+    global _listener, _configured
+
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(FORMAT, style="{"))
+
+    shutdown()
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(_QueueHandler(records))
+
+    for module in _configured - set(levels):
+        logging.getLogger(module).setLevel(logging.NOTSET)
+    for module, level in levels.items():
+        logging.getLogger(module).setLevel(level.upper())
+    _configured = set(levels)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown() -> None:
+    """Stop the listener, flushing all queued records."""
+    global _listener
+
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+atexit.register(shutdown)
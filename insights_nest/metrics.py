@@ -0,0 +1,233 @@
+"""Run metrics in the Prometheus textfile format.
+
+Metrics are collected in memory during the run and written to a `.prom` file once the command
+finishes, so they can be picked up by node_exporter's textfile collector. Counters are
+accumulated across runs by merging them with the values of the previous file; gauges describe
+the latest observation.
+"""
+
+import contextlib
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+from typing import Iterator, Optional
+
+from insights_nest import config
+
+logger = logging.getLogger(__name__)
+
+
+PREFIX = "insights_nest_"
+
+FAMILIES: dict[str, tuple[str, str]] = {
+    "phase_duration_seconds": ("gauge", "Duration of a phase of the latest run."),
+    "command_duration_seconds": ("gauge", "Duration of the latest run of a command."),
+    "command_exit_status": ("gauge", "Exit status of the latest run of a command."),
+    "command_runs_total": ("counter", "Number of command runs by their result."),
+    "last_success_timestamp_seconds": ("gauge", "Time of the latest successful run."),
+    "egg_update_result": ("gauge", "Result of the latest egg update (1 for the active state)."),
+    "egg_downloads_total": ("counter", "Number of egg downloads, whole or as a delta."),
+    "egg_download_saved_bytes_total": (
+        "counter",
+        "Number of bytes saved by downloading deltas instead of whole eggs.",
+    ),
+    "core_exit_status": ("gauge", "Exit status of the latest Core run."),
+    "core_cpu_seconds": ("gauge", "CPU time used by the latest Core run."),
+    "core_peak_memory_bytes": ("gauge", "Peak memory of the latest Core run."),
+    "core_cpu_throttled_seconds": ("gauge", "Time the latest Core run was throttled by cgroup."),
+    "canonical_facts_total": ("counter", "Number of canonical fact collections by their source."),
+    "http_requests_total": ("counter", "Number of HTTP requests by endpoint and status code."),
+    "http_request_seconds_total": ("counter", "Time spent waiting for HTTP responses."),
+    "http_sent_bytes_total": ("counter", "Number of bytes sent in HTTP request bodies."),
+    "http_received_bytes_total": ("counter", "Number of bytes received in HTTP bodies."),
+    "http_compression_saved_bytes_total": (
+        "counter",
+        "Number of HTTP body bytes saved by compression, by direction.",
+    ),
+    "http_connections_total": ("counter", "Number of HTTP connections by their reuse."),
+    "http_connect_seconds_total": (
+        "counter",
+        "Time spent establishing new HTTP connections, by phase (resolve, connect, TLS).",
+    ),
+    "dns_lookups_total": ("counter", "Number of host name resolutions by their result."),
+    "http_retries_total": ("counter", "Number of retried HTTP requests by the reason."),
+    "http_retry_seconds_total": ("counter", "Time spent waiting before retrying HTTP requests."),
+    "http_throttled_seconds_total": (
+        "counter",
+        "Time HTTP transfers waited for the bandwidth limits, by direction.",
+    ),
+    "http_coalesced_requests_total": (
+        "counter",
+        "Number of HTTP requests answered by an identical one, in flight or recent.",
+    ),
+    "inventory_hosts_per_second": (
+        "gauge",
+        "Throughput of the latest iteration over Inventory hosts.",
+    ),
+    "fleet_changes_total": ("counter", "Number of bulk changes of hosts by their result."),
+    "uploads_total": ("counter", "Number of archive uploads by their result."),
+    "cache_requests_total": ("counter", "Number of cache lookups by their result."),
+    "lock_wait_seconds": ("gauge", "Time the latest run waited for a lock held by others."),
+}
+"""Known metric families: name (without the prefix) -> (type, help)."""
+
+_Labels = tuple[tuple[str, str], ...]
+
+_lock = threading.Lock()
+_values: dict[tuple[str, _Labels], float] = {}
+
+_UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}")
+_SAMPLE_PATTERN = re.compile(
+    r"^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$"
+)
+_LABEL_PATTERN = re.compile(r'(?P<key>[a-zA-Z_][a-zA-Z0-9_]*)="(?P<value>(?:[^"\\]|\\.)*)"')
+
+
+def _key(name: str, labels: dict[str, str]) -> tuple[str, _Labels]:
+    if name not in FAMILIES:
+        raise KeyError(f"Unknown metric '{name}'.")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    """Increase a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    """Set a gauge to a value."""
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = value
+
+
+def set_state(name: str, state: str, states: list[str], *, label: str = "state") -> None:
+    """Set a state-set gauge: the active state is `1`, all the other ones are `0`."""
+    for candidate in states:
+        set_gauge(name, 1.0 if candidate == state else 0.0, **{label: candidate})
+
+
+@contextlib.contextmanager
+def timer(name: str = "phase_duration_seconds", **labels: str) -> Iterator[None]:
+    """Measure the duration of the block into a gauge."""
+    now: float = time.monotonic()
+    try:
+        yield
+    finally:
+        set_gauge(name, time.monotonic() - now, **labels)
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Turn an API endpoint into a low-cardinality label by replacing UUIDs."""
+    return _UUID_PATTERN.sub(":id", endpoint.split("?", 1)[0])
+
+
+def reset() -> None:
+    """Drop all collected values."""
+    with _lock:
+        _values.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def _parse(text: str) -> dict[tuple[str, _Labels], float]:
+    """Parse samples of known families from a previously written file."""
+    samples: dict[tuple[str, _Labels], float] = {}
+    for line in text.splitlines():
+        match = _SAMPLE_PATTERN.match(line)
+        if match is None or not match.group("name").startswith(PREFIX):
+            continue
+        name: str = match.group("name")[len(PREFIX) :]
+        if name not in FAMILIES:
+            continue
+        labels: _Labels = tuple(
+            sorted(
+                (m.group("key"), _unescape(m.group("value")))
+                for m in _LABEL_PATTERN.finditer(match.group("labels") or "")
+            )
+        )
+        try:
+            samples[(name, labels)] = float(match.group("value"))
+        except ValueError:
+            continue
+    return samples
+
+
+def render(previous: Optional[str] = None) -> str:
+    """Render the collected values in the Prometheus text format.
+
+    :param previous: Content of the previously written file. Its counters are added to the
+        current values, and its gauges are kept unless they were set during this run.
+    """
+    with _lock:
+        samples: dict[tuple[str, _Labels], float] = dict(_values)
+
+    if previous:
+        for key, value in _parse(previous).items():
+            if FAMILIES[key[0]][0] == "counter":
+                samples[key] = samples.get(key, 0.0) + value
+            else:
+                samples.setdefault(key, value)
+
+    lines: list[str] = []
+    for family, (kind, description) in FAMILIES.items():
+        family_samples = sorted((k[1], v) for k, v in samples.items() if k[0] == family)
+        if not family_samples:
+            continue
+        lines.append(f"# HELP {PREFIX}{family} {description}")
+        lines.append(f"# TYPE {PREFIX}{family} {kind}")
+        for labels, value in family_samples:
+            rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            selector = f"{{{rendered}}}" if labels else ""
+            lines.append(f"{PREFIX}{family}{selector} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path: Optional[pathlib.Path] = None) -> None:
+    """Atomically write the metrics into the textfile.
+
+    :param path: Target file. If `None`, the configured one is used; if that is not set either,
+        nothing is written.
+    """
+    if path is None:
+        path = config.get().metrics.textfile
+    if path is None:
+        return
+
+    try:
+        previous: Optional[str] = path.read_text()
+    except FileNotFoundError:
+        previous = None
+    except OSError as exc:
+        logger.debug("Could not read previous metrics from %s: %s", path, exc)
+        previous = None
+
+    try:
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(render(previous))
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError as exc:
+        logger.warning("Could not write metrics to %s: %s", path, exc)
+        return
+
+    # The values are part of the file now, keeping them would count them twice on next write
+    reset()
+    logger.debug("Metrics written to %s.", path)
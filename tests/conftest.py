@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# The configuration is loaded when the modules are imported, point it away from the system
+_directory = tempfile.mkdtemp(prefix="insights-nest-tests-")
+os.environ.setdefault("NEST_CONFIGURATION_FILE", os.path.join(_directory, "insights-nest.conf"))
+os.environ.setdefault("NEST_CONFIGURATION_DIRECTORY", os.path.join(_directory, "conf.d"))
+os.environ.setdefault("NEST_RHSM_CONFIGURATION_FILE", os.path.join(_directory, "rhsm.conf"))
+os.environ.setdefault("NEST_CACHE_DIRECTORY", os.path.join(_directory, "cache"))
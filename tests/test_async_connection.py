@@ -0,0 +1,100 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+from insights_nest.api import async_connection
+from insights_nest.api import connection
+from insights_nest.api import throttle
+from insights_nest.api.connection import Response
+
+
+def _reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def test_interim_responses_are_skipped() -> None:
+    async def read() -> tuple[Response, bool]:
+        reader = _reader(
+            b"HTTP/1.1 100 Continue\r\n\r\n"
+            b"HTTP/1.1 103 Early Hints\r\nLink: </style.css>\r\n\r\n"
+            b"HTTP/1.1 201 Created\r\nContent-Length: 2\r\n\r\nok"
+        )
+        return await async_connection._read_response(reader, "POST", timeout=1.0)
+
+    response, keep_alive = asyncio.run(read())
+    assert (response.status, response.headers, response.data) == (
+        201,
+        {"Content-Length": "2"},
+        b"ok",
+    )
+    assert keep_alive
+
+
+class _Connection(async_connection.AsyncConnection):
+    HOST = "example.com"
+    PORT = 443
+    PATH = "/api"
+
+
+def test_backoff_releases_the_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A request waiting to be retried does not block other requests."""
+    finished: list[str] = []
+    failures: dict[str, int] = {"/api/flaky": 1}
+
+    async def send(self, method: str, url: str, **kwargs) -> Response:
+        await asyncio.sleep(0)
+        if failures.get(url, 0) > 0:
+            failures[url] -= 1
+            return Response(status=503, headers={}, data=b"")
+        return Response(status=200, headers={}, data=b"")
+
+    def retry_delay(method: str, attempt: int, *, response=None, error=None) -> Optional[float]:
+        return 0.2 if response is not None and response.status == 503 else None
+
+    monkeypatch.setattr(_Connection, "_send", send)
+    monkeypatch.setattr(connection, "retry_delay", retry_delay)
+
+    async def run() -> None:
+        api = _Connection(concurrency=1)
+
+        async def post(endpoint: str) -> None:
+            await api.post(endpoint)
+            finished.append(endpoint)
+
+        flaky = asyncio.ensure_future(post("/flaky"))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(post("/stable"), 0.1)
+        await flaky
+
+    asyncio.run(run())
+    assert finished == ["/stable", "/flaky"]
+
+
+def test_download_is_throttled_while_reading(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The body is throttled in pieces; the waits do not count against the read timeout."""
+    taken: list[int] = []
+
+    async def take_async(direction: str, size: int) -> None:
+        assert direction == throttle.DOWNLOAD
+        taken.append(size)
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(throttle, "take_async", take_async)
+    body: bytes = b"x" * (2 * connection.CHUNK_SIZE + 10)
+
+    async def read() -> tuple[Response, bool]:
+        reader = _reader(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + f"{len(body):x}\r\n".encode()
+            + body
+            + b"\r\n0\r\n\r\n"
+        )
+        return await async_connection._read_response(reader, "GET", timeout=0.04)
+
+    response, _ = asyncio.run(read())
+    assert response.data == body
+    assert taken == [connection.CHUNK_SIZE, connection.CHUNK_SIZE, 10]
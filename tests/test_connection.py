@@ -0,0 +1,80 @@
+import socket
+from collections.abc import Iterator
+
+import pytest
+
+from insights_nest.api import connection
+
+
+class _ClosedConnection:
+    """Pooled connection the server closes while the request is sent."""
+
+    host = "example.com"
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.closed = False
+
+    def request(self, **kwargs) -> None:
+        raise BrokenPipeError()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _Connected(Exception):
+    """A new connection was opened."""
+
+
+@pytest.fixture
+def pair() -> Iterator[tuple[socket.socket, socket.socket]]:
+    local, remote = socket.socketpair()
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+def _send(method: str, local: socket.socket, monkeypatch: pytest.MonkeyPatch) -> None:
+    transport = connection.HTTPSTransport()
+
+    def connect(*args, **kwargs):
+        raise _Connected()
+
+    monkeypatch.setattr(transport, "_connect", connect)
+    monkeypatch.setattr(connection, "_pool", connection._Pool())
+
+    class Api:
+        def _tls_context(self) -> object:
+            return "context"
+
+    connection._pool.put(("example.com", 443, "context"), _ClosedConnection(local))
+    request = connection.Request(method, "example.com", 443, "/upload", {}, b"archive")
+    transport.send(Api(), request)  # type: ignore[arg-type]
+
+
+def test_post_is_not_sent_again(
+    pair: tuple[socket.socket, socket.socket], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with pytest.raises(BrokenPipeError):
+        _send("POST", pair[0], monkeypatch)
+
+
+def test_put_is_sent_again(
+    pair: tuple[socket.socket, socket.socket], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with pytest.raises(_Connected):
+        _send("PUT", pair[0], monkeypatch)
+
+
+def test_pool_skips_connections_closed_by_the_server(
+    pair: tuple[socket.socket, socket.socket],
+) -> None:
+    local, remote = pair
+    pool = connection._Pool()
+    conn = _ClosedConnection(local)
+    pool.put(("example.com", 443), conn)  # type: ignore[arg-type]
+
+    remote.close()
+
+    assert pool.get(("example.com", 443)) is None
+    assert conn.closed
@@ -0,0 +1,49 @@
+import pathlib
+
+import pytest
+
+from insights_nest._core import egg
+
+
+@pytest.fixture
+def legacy(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    """Lay out the egg directory the way older versions of the client left it."""
+    current: pathlib.Path = tmp_path / "current"
+    monkeypatch.setattr(egg, "VERSIONS_DIRECTORY", tmp_path / "versions")
+    monkeypatch.setattr(egg, "CURRENT_LINK", current)
+    monkeypatch.setattr(egg, "TRUSTED_EGG_PATH", current / egg.EGG_FILENAME)
+    monkeypatch.setattr(egg, "TRUSTED_SIG_PATH", current / egg.SIG_FILENAME)
+    monkeypatch.setattr(egg, "LEGACY_EGG_PATH", tmp_path / "current.egg")
+    monkeypatch.setattr(egg, "LEGACY_SIG_PATH", tmp_path / "current.egg.asc")
+    monkeypatch.delenv("EGG", raising=False)
+
+    (tmp_path / "current.egg").write_bytes(b"egg")
+    (tmp_path / "current.egg.asc").write_bytes(b"signature")
+    return tmp_path
+
+
+def test_legacy_egg_is_migrated(legacy: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(egg, "verify_signature", lambda path, signature: True)
+    assert egg.Egg.discover_path() == legacy / "current.egg"
+
+    egg._migrate_legacy()
+
+    version = egg.current_version()
+    assert version is not None and egg.versions() == [version]
+    assert (version / egg.EGG_FILENAME).read_bytes() == b"egg"
+    assert (version / egg.SIG_FILENAME).read_bytes() == b"signature"
+    assert not (legacy / "current.egg").exists()
+    assert not (legacy / "current.egg.asc").exists()
+    assert egg.Egg.discover_path() == version / egg.EGG_FILENAME
+
+
+def test_unsigned_legacy_egg_is_not_migrated(
+    legacy: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(egg, "verify_signature", lambda path, signature: False)
+
+    egg._migrate_legacy()
+
+    assert egg.current_version() is None
+    assert egg.versions() == []
+    assert (legacy / "current.egg").exists()
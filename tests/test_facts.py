@@ -0,0 +1,103 @@
+import dataclasses
+import json
+import pathlib
+import subprocess
+
+import pytest
+
+from insights_nest import config
+from insights_nest._core import facts
+
+CORE_CHECKIN = pathlib.Path(__file__).parent / "data" / "core-checkin.json"
+"""Output of Core's checkin command, recorded on the host the fixtures below describe."""
+
+
+def _write(path: pathlib.Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+@pytest.fixture
+def host(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    """Point the collection to files of a registered bare-metal host."""
+    core: dict = json.loads(CORE_CHECKIN.read_text())
+
+    identity: pathlib.Path = tmp_path / "consumer"
+    identity.mkdir()
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+        + ["-keyout", f"{identity / 'key.pem'!s}", "-out", f"{identity / 'cert.pem'!s}"]
+        + ["-subj", f"/O=1234567/CN={core['subscription_manager_id']}"],
+        check=True,
+        capture_output=True,
+    )
+    metadata: pathlib.Path = tmp_path / "metadata"
+    _write(metadata / "machine-id", core["insights_id"] + "\n")
+    rhsm: pathlib.Path = tmp_path / "rhsm.conf"
+    _write(rhsm, "[server]\nhostname = subscription.rhsm.redhat.com\nport = 443\n")
+
+    dmi: pathlib.Path = tmp_path / "dmi"
+    _write(dmi / "product_uuid", core["bios_uuid"].lower() + "\n")
+    _write(dmi / "sys_vendor", "Dell Inc.\n")
+    _write(dmi / "bios_vendor", "Dell Inc.\n")
+    net: pathlib.Path = tmp_path / "net"
+    _write(net / "lo" / "flags", "0x9\n")
+    _write(net / "lo" / "address", "00:00:00:00:00:00\n")
+    # No such interface exists, so it has no IPv4 address
+    _write(net / "nest0" / "flags", "0x1003\n")
+    _write(net / "nest0" / "address", "52:54:00:12:34:56\n")
+    proc: pathlib.Path = tmp_path / "proc"
+    _write(
+        proc / "if_inet6",
+        "00000000000000000000000000000001 01 80 10 80       lo\n"
+        "20010db8000100000000000000000025 02 40 00 80    nest0\n"
+        "fe800000000000005054fffe00123456 02 40 20 80    nest0\n",
+    )
+    _write(
+        proc / "fib_trie",
+        "Local:\n  +-- 127.0.0.0/8 2 0 2\n     |-- 127.0.0.1\n        /32 host LOCAL\n",
+    )
+
+    cfg: config.Configuration = config.get()
+    monkeypatch.setattr(
+        config,
+        "_configuration",
+        dataclasses.replace(
+            cfg,
+            network=dataclasses.replace(cfg.network, identity_directory=identity),
+            egg=dataclasses.replace(cfg.egg, metadata_directory=metadata),
+        ),
+    )
+    monkeypatch.setattr(config, "RHSM_CONFIGURATION_FILE_PATH", rhsm)
+    monkeypatch.setattr(facts, "DMI_DIRECTORY", dmi)
+    monkeypatch.setattr(facts, "NET_DIRECTORY", net)
+    monkeypatch.setattr(facts, "PROC_NET_DIRECTORY", proc)
+    monkeypatch.setattr(facts, "_interfaces", lambda: ["lo", "nest0"])
+    monkeypatch.setattr(facts, "_fqdn", lambda: core["fqdn"])
+    return tmp_path
+
+
+def test_collect_matches_core(host: pathlib.Path) -> None:
+    native = facts.collect()
+    assert native is not None
+    assert facts.compare(native, json.loads(CORE_CHECKIN.read_text())) == []
+
+
+def test_satellite_falls_back_to_core(host: pathlib.Path) -> None:
+    _write(host / "rhsm.conf", "[server]\nhostname = satellite.example.com\n")
+    assert facts.collect() is None
+
+
+def test_cloud_instance_falls_back_to_core(host: pathlib.Path) -> None:
+    _write(host / "dmi" / "sys_vendor", "Amazon EC2\n")
+    assert facts.collect() is None
+
+
+def test_compare_reports_differences() -> None:
+    core: dict = json.loads(CORE_CHECKIN.read_text())
+    native: dict = dict(core, fqdn="host")
+    assert facts.compare(native, core) == ["fqdn: native 'host', Core 'host.example.com'"]
+    reordered: dict = dict(reversed(list(core.items())))
+    assert facts.compare(reordered, core) == [
+        f"order: native {list(reordered)}, Core {list(core)}"
+    ]
@@ -0,0 +1,16 @@
+import pathlib
+
+import pytest
+
+from insights_nest._core import lock
+
+
+def test_lock_is_skipped_if_it_cannot_be_created(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A file in place of the directory fails like a read-only file system, not with EACCES
+    (tmp_path / "locks").write_text("")
+    monkeypatch.setattr(lock, "LOCK_DIRECTORY", tmp_path / "locks" / "directory")
+
+    with lock.Lock("egg-update") as acquired:
+        assert not acquired.contended
@@ -0,0 +1,25 @@
+import io
+import logging
+
+from insights_nest import log
+
+
+def test_arguments_are_formatted_when_logged() -> None:
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    root = logging.getLogger()
+    handlers: list[logging.Handler] = root.handlers[:]
+    log.configure({"tests": "DEBUG"}, handler=handler)
+    try:
+        headers: dict[str, str] = {"Accept": "application/json"}
+        logging.getLogger("tests.log").debug("Request (headers=%s)", headers)
+        # The caller changes the arguments before the listener thread writes the record
+        headers["Authorization"] = "secret"
+    finally:
+        log.shutdown()
+        log.configure({}, handler=handler)
+        log.shutdown()
+        root.handlers[:] = handlers
+
+    assert stream.getvalue() == "Request (headers={'Accept': 'application/json'})\n"
@@ -0,0 +1,28 @@
+import socket
+import ssl
+
+import pytest
+
+from insights_nest.api import probe
+from insights_nest.api import resolver
+
+
+def test_failed_resolution_is_reported(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Expired cached addresses, which requests would fall back to, do not hide the failure."""
+    address = (socket.AF_INET, socket.SOCK_STREAM, 6, ("192.0.2.1", 443))
+    monkeypatch.setattr(
+        resolver, "_cache", {"example.com:443": resolver._Entry([address], expires=0.0)}
+    )
+
+    def getaddrinfo(*args, **kwargs):
+        raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+    result = probe.probe(
+        "example.com", 443, "/", context=ssl.create_default_context(), timeout=1.0
+    )
+
+    assert result.failed_phase == "dns"
+    assert "name resolution" in (result.error or "")
+    assert "dns" not in result.timings
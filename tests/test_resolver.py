@@ -0,0 +1,32 @@
+import pathlib
+import socket
+
+import pytest
+
+from insights_nest.api import resolver
+
+IPV6 = (socket.AF_INET6, socket.SOCK_STREAM, 6, ("2001:db8::1", 443, 0, 0))
+IPV4 = (socket.AF_INET, socket.SOCK_STREAM, 6, ("192.0.2.1", 443))
+
+
+@pytest.fixture
+def cache(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    path: pathlib.Path = tmp_path / "dns.json"
+    monkeypatch.setattr(resolver, "CACHE_PATH", path)
+    monkeypatch.setattr(resolver, "_cache", None)
+    monkeypatch.setattr(
+        socket,
+        "getaddrinfo",
+        lambda *args, **kwargs: [(f, t, p, "", a) for f, t, p, a in (IPV6, IPV4)],
+    )
+    return path
+
+
+def test_preferred_address_is_saved(cache: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert resolver.resolve("example.com", 443) == ([IPV6, IPV4], False)
+
+    resolver._prefer("example.com", 443, IPV4)
+
+    # A new run loads the cache from the disk
+    monkeypatch.setattr(resolver, "_cache", None)
+    assert resolver.resolve("example.com", 443) == ([IPV4, IPV6], True)
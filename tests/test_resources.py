@@ -0,0 +1,41 @@
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+
+from insights_nest._core import resources
+
+SCRIPT = """\
+import json, os, resource
+print(json.dumps({
+    "nice": os.nice(0),
+    "memory": resource.getrlimit(resource.RLIMIT_AS)[0],
+    "cpu": resource.getrlimit(resource.RLIMIT_CPU)[0],
+}))
+"""
+
+
+def test_limits_apply_to_core() -> None:
+    with resources.Governor("test") as governor:
+        governor.limits = dataclasses.replace(
+            governor.limits,
+            nice=5,
+            memory_limit=4 * 1024**3,
+            cpu_time_limit=60,
+            io_class="",
+            cgroup=False,
+        )
+        process = subprocess.run(
+            governor.command([sys.executable, "-c", SCRIPT]),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    assert json.loads(process.stdout) == {
+        "nice": os.nice(0) + 5,
+        "memory": 4 * 1024**3,
+        "cpu": 60,
+    }
+    assert governor.usage["cpu_seconds"] > 0
@@ -0,0 +1,19 @@
+import logging
+
+import pytest
+
+from insights_nest.api import throttle
+
+
+def test_summary_covers_transfers_since_reset(caplog: pytest.LogCaptureFixture) -> None:
+    throttle.reset()
+    throttle.delay(throttle.DOWNLOAD, 4096)
+    throttle.reset()
+    throttle.delay(throttle.DOWNLOAD, 2048)
+
+    with caplog.at_level(logging.DEBUG, logger=throttle.__name__):
+        throttle.log_summary()
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "HTTP download: 2.0 KiB, in one burst, throttled for 0.0 s."
+    ]
@@ -0,0 +1,85 @@
+import io
+import json
+import pathlib
+import tarfile
+
+from insights_nest._core import upload
+
+FACTS = {"insights_id": "d2b8a1d0-6a0a-4b9f-9b8e-2f1c7d7e5a11", "fqdn": "host.example.com"}
+
+
+def _metadata(spec: str, path: str, exec_time: float, ser_time: float) -> bytes:
+    record = {
+        "name": f"insights.specs.Specs.{spec}",
+        "exec_time": exec_time,
+        "errors": [],
+        "results": {
+            "type": "insights.core.spec_factory.CommandOutputProvider",
+            "object": {"relative_path": path, "rc": None, "save_as": False},
+        },
+        "ser_time": ser_time,
+    }
+    return json.dumps(record).encode("utf-8")
+
+
+def _archive(path: pathlib.Path, top: str, files: dict[str, bytes]) -> pathlib.Path:
+    with tarfile.open(path, "w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"{top}/{name}")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return path
+
+
+def _collection(time: str, exec_time: float, hostname: bytes = b"host.example.com\n") -> dict:
+    """Files of an archive collected by Core, as of a run at the time."""
+    return {
+        "data/insights_commands/date": f"Mon Jan  5 {time} UTC 2026\n".encode(),
+        "data/insights_commands/date_utc": f"Mon Jan  5 {time} UTC 2026\n".encode(),
+        "data/insights_commands/uptime": f" {time} up 3 days,  1 user\n".encode(),
+        "data/proc/uptime": f"{exec_time * 1000:.2f} 1000.00\n".encode(),
+        "data/etc/hostname": hostname,
+        "meta_data/insights.specs.Specs.date.json": _metadata(
+            "date", "insights_commands/date", exec_time, exec_time / 10
+        ),
+        "meta_data/insights.specs.Specs.hostname.json": _metadata(
+            "hostname", "etc/hostname", exec_time * 2, exec_time / 20
+        ),
+    }
+
+
+def test_digest_ignores_volatile_content(tmp_path: pathlib.Path):
+    first = _archive(
+        tmp_path / "first.tar.gz",
+        "insights-host-20260105120000",
+        _collection("12:00:00", 0.0123),
+    )
+    second = _archive(
+        tmp_path / "second.tar.gz",
+        "insights-host-20260105130000",
+        _collection("13:00:01", 0.0456),
+    )
+
+    digest = upload.digest(first, "application/vnd.redhat.advisor.collection+tgz", FACTS)
+    assert digest is not None
+    assert digest == upload.digest(
+        second, "application/vnd.redhat.advisor.collection+tgz", FACTS
+    )
+
+
+def test_digest_changes_with_content(tmp_path: pathlib.Path):
+    first = _archive(
+        tmp_path / "first.tar.gz",
+        "insights-host-20260105120000",
+        _collection("12:00:00", 0.0123),
+    )
+    second = _archive(
+        tmp_path / "second.tar.gz",
+        "insights-host-20260105130000",
+        _collection("13:00:01", 0.0456, hostname=b"renamed.example.com\n"),
+    )
+
+    content_type = "application/vnd.redhat.advisor.collection+tgz"
+    assert upload.digest(first, content_type, FACTS) != upload.digest(
+        second, content_type, FACTS
+    )